@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("carts", "0002_alter_cart_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="cart",
+            index=models.Index(
+                fields=["session_key", "status"], name="carts_cart_session_0441fb_idx"
+            ),
+        ),
+    ]
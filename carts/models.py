@@ -17,6 +17,11 @@ class Cart(TimestampedModel):
     )
     session_key = models.CharField(max_length=255, db_index=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["session_key", "status"]),
+        ]
+
     @property
     def total_price(self):
         return sum(item.total_price for item in self.items.all())
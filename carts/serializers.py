@@ -1,6 +1,7 @@
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
+from orders.bought_together import get_companions
 from products.models import ProductVariant
 
 from .models import Cart, CartItem
@@ -93,8 +94,20 @@ class CartSerializer(serializers.ModelSerializer):
         max_digits=10, decimal_places=2, read_only=True
     )
     total_items = serializers.IntegerField(read_only=True)
+    bought_together = serializers.SerializerMethodField()
 
     class Meta:
         model = Cart
-        fields = ["id", "session_key", "status", "items", "total_price", "total_items"]
+        fields = [
+            "id",
+            "session_key",
+            "status",
+            "items",
+            "total_price",
+            "total_items",
+            "bought_together",
+        ]
         read_only_fields = ["status", "session_key"]
+
+    def get_bought_together(self, obj):
+        return get_companions(item.product_variant_id for item in obj.items.all())
@@ -0,0 +1,185 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+from django.db import connection
+from django.utils import timezone
+
+from common.models import JobCheckpoint
+
+
+class CheckpointMismatch(Exception):
+    """The stored checkpoint was made for different job parameters."""
+
+
+def iter_batches(items, batch_size, start=0):
+    """
+    Splits a stream into batches of (ordinal, item) pairs, skipping the first
+    `start` items. Yields (items consumed after the batch, batch).
+    """
+    numbered = islice(enumerate(items), start, None)
+    while True:
+        batch = list(islice(numbered, batch_size))
+        if not batch:
+            return
+        yield batch[-1][0] + 1, batch
+
+
+def iter_keyset_batches(queryset, batch_size, after=0):
+    """
+    Yields (last pk, objects) batches of `queryset` in primary key order,
+    starting after pk `after`.
+
+    Every batch is one `pk > last` query on the primary key index, so memory
+    and query cost stay flat however far the job gets, unlike OFFSET paging.
+    """
+    queryset = queryset.order_by("pk")
+    while True:
+        batch = list(queryset.filter(pk__gt=after)[:batch_size])
+        if not batch:
+            return
+        after = batch[-1].pk
+        yield after, batch
+
+
+class CheckpointedJob:
+    """
+    A batch job that can be interrupted and resumed.
+
+    `run()` records the position of the last batch that completed, together
+    with every batch before it, in the `JobCheckpoint` row named `name`. When
+    a failed, interrupted or paused job is started again, `position` tells
+    the caller where to continue. A completed job, or any job with
+    `restart`, starts over.
+
+    The checkpoint is written after each batch is processed, so a crash can
+    replay the batches that were in flight; `process_batch` must be
+    idempotent.
+
+    With `persist=False` (e.g. dry runs) progress is only tracked in memory.
+    """
+
+    def __init__(self, name, params=None, restart=False, persist=True):
+        self.name = name
+        self.params = params or {}
+        self.persist = persist
+        self.checkpoint = self._load(restart)
+        self.resumed = self.checkpoint.position > 0
+        self.processed = 0
+        self.started = time.monotonic()
+
+    def _load(self, restart):
+        if not self.persist:
+            return JobCheckpoint(name=self.name, params=self.params)
+
+        checkpoint, created = JobCheckpoint.objects.get_or_create(
+            name=self.name, defaults={"params": self.params}
+        )
+        if created or restart or checkpoint.status == JobCheckpoint.Status.COMPLETED:
+            checkpoint.params = self.params
+            checkpoint.position = 0
+            checkpoint.processed = 0
+        elif checkpoint.params != self.params:
+            raise CheckpointMismatch(
+                f"Job {self.name} was interrupted at {checkpoint.position} "
+                f"with {checkpoint.params}. Run it again with the same "
+                f"options, or restart it."
+            )
+
+        checkpoint.status = JobCheckpoint.Status.RUNNING
+        checkpoint.last_error = ""
+        checkpoint.finished_at = None
+        checkpoint.save()
+        return checkpoint
+
+    @property
+    def position(self):
+        return self.checkpoint.position
+
+    def _save(self, **fields):
+        for field, value in fields.items():
+            setattr(self.checkpoint, field, value)
+        if self.persist:
+            self.checkpoint.save(update_fields=[*fields, "updated_at"])
+
+    @staticmethod
+    def _call(process_batch, batch):
+        try:
+            return process_batch(batch)
+        finally:
+            connection.close()
+
+    def _complete(self, position, size, future):
+        result = future.result()
+        self.processed += size
+        self._save(position=position, processed=self.checkpoint.processed + size)
+        return result
+
+    def run(self, batches, process_batch, workers=1, complete=True):
+        """
+        Calls `process_batch(batch)` for every (position, batch) of `batches`
+        in `workers` threads and yields the results in batch order, each once
+        the checkpoint has moved past its batch.
+
+        Running out of batches completes the job, so the next run starts
+        over. Pass `complete=False` when `batches` stops before the end of
+        the job (e.g. a `--limit`), to pause it instead: the next run then
+        continues after the last batch.
+
+        At most two batches per worker are in flight, so memory stays bounded
+        whatever the size of the job. The first exception stops the job,
+        which can then be resumed from the last contiguous completed batch.
+        """
+        window = deque()
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for position, batch in batches:
+                    future = executor.submit(self._call, process_batch, batch)
+                    window.append((position, len(batch), future))
+
+                    while window and (
+                        len(window) >= 2 * workers or window[0][2].done()
+                    ):
+                        yield self._complete(*window.popleft())
+
+                while window:
+                    yield self._complete(*window.popleft())
+        except BaseException as e:
+            for _, _, future in window:
+                future.cancel()
+            self._save(
+                status=JobCheckpoint.Status.FAILED,
+                last_error=str(e) or type(e).__name__,
+            )
+            raise
+
+        if complete:
+            self._save(
+                status=JobCheckpoint.Status.COMPLETED, finished_at=timezone.now()
+            )
+        else:
+            self._save(status=JobCheckpoint.Status.PAUSED)
+
+    def progress(self, total=None):
+        """
+        e.g. "1200/5000 (24.0%), 85.3 items/s, ETA 0:00:44" for this run,
+        where `total` is the number of items the run set out to process.
+        """
+        elapsed = time.monotonic() - self.started
+        rate = self.processed / elapsed if elapsed else 0.0
+
+        if not total:
+            text = f"{self.processed} items, {rate:.1f} items/s"
+            if self.resumed:
+                text += f" ({self.checkpoint.processed} including earlier runs)"
+            return text
+
+        remaining = max(total - self.processed, 0)
+        eta = timedelta(seconds=round(remaining / rate)) if rate else "?"
+        return (
+            f"{self.processed}/{total} ({self.processed / total:.1%}), "
+            f"{rate:.1f} items/s, ETA {eta}"
+        )
@@ -0,0 +1,91 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from common.storage import (
+    CONTENT_NAME_RE,
+    content_addressed_storage,
+    delete_unreferenced,
+    get_referenced_names,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes content-addressed media files that no row references any "
+        "more (e.g. replaced product images)."
+    )
+
+    BATCH_SIZE = 1000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-hours",
+            type=float,
+            default=24,
+            help="Keep unreferenced files younger than this (uploads in flight)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would be deleted",
+        )
+
+    def iter_content_names(self, location):
+        """Yields the names of files laid out as "<root>/ab/cd/<sha256>.<ext>"."""
+        if not os.path.isdir(location):
+            return
+
+        for root in os.scandir(location):
+            if not root.is_dir():
+                continue
+            for first in os.scandir(root.path):
+                if not first.is_dir() or len(first.name) != 2:
+                    continue
+                for second in os.scandir(first.path):
+                    if not second.is_dir() or len(second.name) != 2:
+                        continue
+                    for entry in os.scandir(second.path):
+                        name = f"{root.name}/{first.name}/{second.name}/{entry.name}"
+                        if entry.is_file() and CONTENT_NAME_RE.match(name):
+                            yield name
+
+    def handle(self, *args, **options):
+        referenced = get_referenced_names()
+        cutoff = time.time() - options["grace_hours"] * 3600
+        location = content_addressed_storage.location
+
+        sizes = {}
+        for name in self.iter_content_names(location):
+            if name in referenced:
+                continue
+
+            stat = os.stat(content_addressed_storage.path(name))
+            if stat.st_mtime > cutoff:
+                continue
+            sizes[name] = stat.st_size
+
+        candidates = list(sizes)
+        if not options["dry_run"]:
+            # Checked again under the locks, as rows may have reused the files
+            # since the scan.
+            candidates = [
+                name
+                for start in range(0, len(candidates), self.BATCH_SIZE)
+                for name in delete_unreferenced(
+                    candidates[start : start + self.BATCH_SIZE],
+                    grace_seconds=options["grace_hours"] * 3600,
+                )
+            ]
+        deleted = len(candidates)
+        freed = sum(sizes[name] for name in candidates)
+
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {deleted} unreferenced files "
+                f"({freed / (1024 * 1024):.2f} MB), "
+                f"{len(referenced)} files referenced."
+            )
+        )
@@ -0,0 +1,76 @@
+from functools import partial
+
+from django.core.management.base import BaseCommand
+
+from common.renditions import (
+    RENDITION_FIELDS,
+    get_field,
+    process_rendition_batch,
+    queue_renditions,
+)
+from common.workers import run_process_pool
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates the responsive renditions (sizes and formats) of uploaded "
+        "images with a pool of workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Worker processes")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10,
+            help="Images claimed by a worker at a time",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=3,
+            help="Attempts before an image is dead-lettered",
+        )
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="Queue every existing image first (e.g. after changing the specs)",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is drained instead of polling forever",
+        )
+
+    def handle(self, *args, **options):
+        if options["backfill"]:
+            for field_label in RENDITION_FIELDS:
+                field = get_field(field_label)
+                names = (
+                    field.model.objects.exclude(**{field.name: ""})
+                    .exclude(**{f"{field.name}__isnull": True})
+                    .values_list(field.name, flat=True)
+                )
+                queue_renditions(field_label, names.iterator())
+                self.stdout.write(f"Queued images of {field_label}.")
+
+        batch_size = options["batch_size"]
+        max_attempts = options["max_attempts"]
+
+        self.stdout.write(f"Rendering images with {options['workers']} workers...")
+
+        # Encoding is CPU-bound, so each worker is a process.
+        processed = run_process_pool(
+            partial(process_rendition_batch, batch_size, max_attempts),
+            workers=options["workers"],
+            poll_interval=options["poll_interval"],
+            run_once=options["once"],
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered {processed} images."))
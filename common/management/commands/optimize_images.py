@@ -1,19 +1,164 @@
 import concurrent.futures
+import hashlib
+import json
+import os
+import tempfile
+import time
 from pathlib import Path
 
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from PIL import Image
 
+VALID_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp"}
+MANIFEST_NAME = ".manifest.json"
+
+# Directories that never hold originals worth optimizing.
+SKIPPED_DIRS = {"CACHE", "feeds"}
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def atomic_save(img, output_path, save_format, **params):
+    """
+    Saves next to `output_path` and renames into place, so an interrupted run
+    never leaves a truncated image behind.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=output_path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            img.save(f, save_format, **params)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def process_image(file_path, output_path, options, previous):
+    """
+    Optimizes one image. Module level so it can run in a process pool.
+
+    `previous` is the file's manifest entry from the last run, if any. The
+    file is skipped when its size and mtime are unchanged, or when its
+    content hash still matches, and the output is still there.
+    """
+    try:
+        path_obj = Path(file_path)
+        output_path = Path(output_path)
+        stat = path_obj.stat()
+        original_size = stat.st_size
+
+        entry = {
+            "size": original_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "profile": options["profile"],
+            "output": str(output_path),
+        }
+
+        unchanged = (
+            previous is not None
+            and previous.get("profile") == entry["profile"]
+            and previous.get("output") == entry["output"]
+            and output_path.exists()
+        )
+        if (
+            unchanged
+            and previous.get("size") == original_size
+            and previous.get("mtime_ns") == stat.st_mtime_ns
+        ):
+            return {"status": "skipped", "file": file_path, "entry": previous}
+
+        entry["sha256"] = file_sha256(path_obj)
+        if unchanged and previous.get("sha256") == entry["sha256"]:
+            return {"status": "skipped", "file": file_path, "entry": entry}
+
+        ext = path_obj.suffix.lower()
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Determine Output Format
+        if options["webp"]:
+            save_format = "WEBP"
+        elif ext in [".jpg", ".jpeg"]:
+            save_format = "JPEG"
+        elif ext == ".png":
+            save_format = "PNG"
+        else:
+            save_format = "WEBP"
+
+        with Image.open(path_obj) as img:
+            # --- SAVING LOGIC ---
+
+            # 1. WebP Conversion (or optimization if already WebP)
+            if save_format == "WEBP":
+                # method=6 is slowest compression but best size
+                atomic_save(img, output_path, "WEBP", quality=85, method=6)
+
+            # 2. PNG Optimization
+            elif save_format == "PNG":
+                if options["lossy"]:
+                    # Quantize to 256 colors (TinyPNG style)
+                    img = img.convert("P", palette=Image.ADAPTIVE, colors=256)
+                    atomic_save(img, output_path, "PNG", optimize=True)
+                else:
+                    # Lossless optimization
+                    atomic_save(
+                        img, output_path, "PNG", optimize=True, compress_level=9
+                    )
+
+            # 3. JPEG Optimization
+            else:
+                # Convert RGBA to RGB if necessary (JPEGs don't support alpha)
+                if img.mode in ("RGBA", "LA"):
+                    img = img.convert("RGB")
+
+                atomic_save(img, output_path, "JPEG", optimize=True, quality=85)
+
+        return {
+            "status": "optimized",
+            "file": file_path,
+            "entry": entry,
+            "original_size": original_size,
+            "new_size": output_path.stat().st_size,
+        }
+
+    except Exception as e:
+        return {"status": "error", "file": file_path, "error": str(e)}
+
 
 class Command(BaseCommand):
     help = (
-        "Optimizes images (PNG, JPG, WEBP). "
-        "Options for WebP conversion or lossy PNG quantization."
+        "Optimizes images (PNG, JPG, WEBP) in a directory tree, MEDIA_ROOT by "
+        "default. Options for WebP conversion or lossy PNG quantization. "
+        "Files unchanged since the last run are skipped."
     )
 
     def add_arguments(self, parser):
-        parser.add_argument("path", type=str, help="Absolute path to the directory")
-        parser.add_argument("--workers", type=int, default=4, help="Number of threads")
+        parser.add_argument(
+            "path",
+            type=str,
+            nargs="?",
+            help="Absolute path to the directory (default: MEDIA_ROOT)",
+        )
+        parser.add_argument(
+            "--output",
+            type=str,
+            help="Output directory (default: <path>/optimized)",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 4, help="Pool size"
+        )
+        parser.add_argument(
+            "--threads",
+            action="store_true",
+            help="Use a thread pool instead of a process pool",
+        )
         parser.add_argument(
             "--lossy",
             action="store_true",
@@ -24,137 +169,151 @@ class Command(BaseCommand):
             action="store_true",
             help="Convert all images to WebP format",
         )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Ignore the manifest and reprocess every image",
+        )
 
-    def process_image(self, file_path, output_dir, options):
-        try:
-            path_obj = Path(file_path)
-            ext = path_obj.suffix.lower()
-
-            # Determine Output Format and Filename
-            if options["webp"]:
-                new_filename = path_obj.stem + ".webp"
-                save_format = "WEBP"
-            else:
-                new_filename = path_obj.name
-                # Map extension to PIL format
-                if ext in [".jpg", ".jpeg"]:
-                    save_format = "JPEG"
-                elif ext == ".png":
-                    save_format = "PNG"
-                elif ext == ".webp":
-                    save_format = "WEBP"
-                else:
-                    # Fallback for unforeseen types supported by PIL
-                    save_format = None
-
-            output_path = output_dir / new_filename
-
-            with Image.open(path_obj) as img:
-                original_size = path_obj.stat().st_size
-
-                # --- SAVING LOGIC ---
-
-                # 1. WebP Conversion (or optimization if already WebP)
-                if save_format == "WEBP":
-                    # method=6 is slowest compression but best size
-                    img.save(output_path, "WEBP", quality=85, method=6)
-
-                # 2. PNG Optimization
-                elif save_format == "PNG":
-                    if options["lossy"]:
-                        # Quantize to 256 colors (TinyPNG style)
-                        img = img.convert("P", palette=Image.ADAPTIVE, colors=256)
-                        img.save(output_path, "PNG", optimize=True)
-                    else:
-                        # Lossless optimization
-                        img.save(output_path, "PNG", optimize=True, compress_level=9)
-
-                # 3. JPEG Optimization
-                elif save_format == "JPEG":
-                    # Convert RGBA to RGB if necessary (JPEGs don't support alpha)
-                    if img.mode in ("RGBA", "LA"):
-                        img = img.convert("RGB")
+    def find_images(self, directory, output_dir):
+        for root, dirs, files in os.walk(directory):
+            root = Path(root)
+            dirs[:] = [
+                d
+                for d in dirs
+                if d not in SKIPPED_DIRS and (root / d).resolve() != output_dir
+            ]
+            for name in files:
+                if Path(name).suffix.lower() in VALID_EXTENSIONS:
+                    yield root / name
 
-                    img.save(output_path, "JPEG", optimize=True, quality=85)
+    def load_manifest(self, manifest_path):
+        try:
+            with open(manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            self.stdout.write(self.style.WARNING("Manifest is corrupt, ignoring it."))
+            return {}
 
-                # 4. Fallback
-                else:
-                    img.save(output_path, optimize=True)
-
-                new_size = output_path.stat().st_size
-
-                return {
-                    "success": True,
-                    "filename": new_filename,
-                    "original_size": original_size,
-                    "new_size": new_size,
-                }
-
-        except Exception as e:
-            return {
-                "success": False,
-                "filename": Path(file_path).name,
-                "error": str(e),
-            }
+    def save_manifest(self, manifest_path, manifest):
+        fd, tmp_path = tempfile.mkstemp(dir=manifest_path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
 
     def handle(self, *args, **options):
-        directory = Path(options["path"])
+        directory = Path(options["path"] or settings.MEDIA_ROOT).resolve()
         workers = options["workers"]
 
         if not directory.is_dir():
             raise CommandError(f'Directory "{directory}" does not exist.')
 
-        output_dir = directory / "optimized"
+        output_dir = Path(options["output"] or directory / "optimized").resolve()
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        # Updated filter for multiple extensions
-        valid_extensions = {".png", ".jpg", ".jpeg", ".webp"}
-        tasks = [
-            f
-            for f in directory.iterdir()
-            if f.is_file() and f.suffix.lower() in valid_extensions
-        ]
+        manifest_path = output_dir / MANIFEST_NAME
+        manifest = {} if options["force"] else self.load_manifest(manifest_path)
+
+        worker_options = {
+            "webp": options["webp"],
+            "lossy": options["lossy"],
+            "profile": f"webp={options['webp']},lossy={options['lossy']}",
+        }
 
-        self.stdout.write(f"Processing {len(tasks)} images with {workers} workers...")
+        tasks = []
+        for file_path in self.find_images(directory, output_dir):
+            relative = file_path.relative_to(directory)
+            output_path = output_dir / relative
+            if options["webp"]:
+                output_path = output_path.with_suffix(".webp")
+            tasks.append((str(relative), str(file_path), str(output_path)))
+
+        pool = "threads" if options["threads"] else "processes"
+        self.stdout.write(
+            f"Processing {len(tasks)} images with {workers} {pool} "
+            f"(manifest: {len(manifest)} entries)..."
+        )
 
+        if options["threads"]:
+            executor_class = concurrent.futures.ThreadPoolExecutor
+        else:
+            executor_class = concurrent.futures.ProcessPoolExecutor
+
+        counts = {"optimized": 0, "skipped": 0, "error": 0}
         total_orig = 0
         total_new = 0
+        bytes_scanned = 0
+        started = time.monotonic()
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            future_to_file = {
-                executor.submit(self.process_image, f, output_dir, options): f
-                for f in tasks
+        with executor_class(max_workers=workers) as executor:
+            future_to_relative = {
+                executor.submit(
+                    process_image,
+                    file_path,
+                    output_path,
+                    worker_options,
+                    manifest.get(relative),
+                ): relative
+                for relative, file_path, output_path in tasks
             }
 
-            for future in concurrent.futures.as_completed(future_to_file):
+            for future in concurrent.futures.as_completed(future_to_relative):
+                relative = future_to_relative[future]
                 res = future.result()
+                counts[res["status"]] += 1
 
-                if res["success"]:
-                    total_orig += res["original_size"]
-                    total_new += res["new_size"]
+                if res["status"] == "error":
+                    manifest.pop(relative, None)
+                    self.stdout.write(
+                        self.style.ERROR(f"Error {relative}: {res['error']}")
+                    )
+                    continue
 
-                    saved = res["original_size"] - res["new_size"]
-                    if res["original_size"] > 0:
-                        percent = (saved / res["original_size"]) * 100
-                    else:
-                        percent = 0
+                manifest[relative] = res["entry"]
+                bytes_scanned += res["entry"]["size"]
+                if res["status"] == "skipped":
+                    continue
 
-                    # Green if > 20% savings, otherwise yellow/white
-                    color = self.style.SUCCESS if percent > 20 else self.style.WARNING
+                total_orig += res["original_size"]
+                total_new += res["new_size"]
 
-                    self.stdout.write(
-                        f"{res['filename']}: {res['original_size']/1024:.0f}KB -> "
-                        f"{res['new_size']/1024:.0f}KB "
-                        f"({color(f'-{percent:.1f}%')})"
-                    )
+                saved = res["original_size"] - res["new_size"]
+                if res["original_size"] > 0:
+                    percent = (saved / res["original_size"]) * 100
                 else:
-                    self.stdout.write(
-                        self.style.ERROR(f"Error {res['filename']}: {res['error']}")
-                    )
+                    percent = 0
+
+                # Green if > 20% savings, otherwise yellow/white
+                color = self.style.SUCCESS if percent > 20 else self.style.WARNING
+
+                self.stdout.write(
+                    f"{relative}: {res['original_size']/1024:.0f}KB -> "
+                    f"{res['new_size']/1024:.0f}KB "
+                    f"({color(f'-{percent:.1f}%')})"
+                )
+
+        elapsed = time.monotonic() - started
 
+        # Drop entries of files that no longer exist.
+        present = {relative for relative, _, _ in tasks}
+        manifest = {k: v for k, v in manifest.items() if k in present}
+        self.save_manifest(manifest_path, manifest)
+
+        self.stdout.write("-" * 30)
+        self.stdout.write(
+            f"{counts['optimized']} optimized, {counts['skipped']} unchanged, "
+            f"{counts['error']} failed in {elapsed:.1f}s"
+        )
+        if elapsed > 0:
+            self.stdout.write(
+                f"Throughput: {len(tasks) / elapsed:.1f} files/s, "
+                f"{bytes_scanned / (1024 * 1024) / elapsed:.2f} MB/s scanned, "
+                f"{total_orig / (1024 * 1024) / elapsed:.2f} MB/s optimized"
+            )
         if total_orig > 0:
             saved_mb = (total_orig - total_new) / (1024 * 1024)
-            self.stdout.write("-" * 30)
             self.stdout.write(
                 self.style.SUCCESS(f"Total Space Saved: {saved_mb:.2f} MB")
             )
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("common", "0002_jobcheckpoint"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="jobcheckpoint",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("RUNNING", "Running"),
+                    ("PAUSED", "Paused"),
+                    ("FAILED", "Failed"),
+                    ("COMPLETED", "Completed"),
+                ],
+                default="RUNNING",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:30
+
+from django.db import migrations, models
+
+
+def requeue_completed(apps, schema_editor):
+    # Re-rendering skips files that exist, so this only records the widths.
+    ImageRenditionTask = apps.get_model("common", "ImageRenditionTask")
+    ImageRenditionTask.objects.filter(status="COMPLETED").update(
+        status="PENDING", attempts=0
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("common", "0003_alter_jobcheckpoint_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="imagerenditiontask",
+            name="widths",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(requeue_completed, migrations.RunPython.noop),
+    ]
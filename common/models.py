@@ -1,5 +1,10 @@
+from datetime import timedelta
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 
 
 # Create your models here.
@@ -11,6 +16,169 @@ class TimestampedModel(models.Model):
         abstract = True
 
 
+class QueuedTaskQuerySet(models.QuerySet):
+    def claim(self, batch_size, lease_seconds=300, max_attempts=None):
+        """
+        Atomically claims up to `batch_size` due tasks for the calling worker.
+
+        Rows locked by other workers are skipped (FOR UPDATE SKIP LOCKED), so
+        any number of workers can poll the same table without contention.
+        Tasks stuck in PROCESSING past their lease (crashed worker) are
+        reclaimed; every claim counts as an attempt, so a task that keeps
+        crashing its worker is dead-lettered once it has had `max_attempts`.
+        """
+        now = timezone.now()
+        Status = self.model.Status
+        expired = Q(
+            status=Status.PROCESSING,
+            locked_at__lt=now - timedelta(seconds=lease_seconds),
+        )
+
+        with transaction.atomic():
+            if max_attempts is not None:
+                dead_ids = list(
+                    self.select_for_update(skip_locked=True)
+                    .filter(expired, attempts__gte=max_attempts)
+                    .values_list("pk", flat=True)
+                )
+                if dead_ids:
+                    self.model.objects.filter(pk__in=dead_ids).update(
+                        status=Status.DEAD,
+                        locked_at=None,
+                        last_error=(
+                            f"Lease expired after {max_attempts} attempts; "
+                            f"the worker processing it never finished."
+                        ),
+                    )
+
+            ids = list(
+                self.select_for_update(skip_locked=True)
+                .filter(Q(status=Status.PENDING, available_at__lte=now) | expired)
+                .order_by("available_at")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if ids:
+                self.model.objects.filter(pk__in=ids).update(
+                    status=Status.PROCESSING,
+                    locked_at=now,
+                    attempts=F("attempts") + 1,
+                )
+
+        if not ids:
+            return []
+
+        return list(self.model.objects.filter(pk__in=ids).order_by("available_at"))
+
+    def mark_completed(self):
+        return self.update(
+            status=self.model.Status.COMPLETED,
+            processed_at=timezone.now(),
+            locked_at=None,
+            last_error="",
+        )
+
+
+class QueuedTaskModel(TimestampedModel):
+    """
+    A row in a database-backed work queue.
+
+    Producers insert rows; workers claim them with `objects.claim()`, then
+    call `mark_completed()` or `mark_failed()`. Failed tasks are retried with
+    exponential backoff and dead-lettered once `max_attempts` is reached.
+    Pass the same `max_attempts` to `claim()`, so tasks whose worker keeps
+    dying are dead-lettered too.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "PENDING", _("Pending")
+        PROCESSING = "PROCESSING", _("Processing")
+        COMPLETED = "COMPLETED", _("Completed")
+        DEAD = "DEAD", _("Dead")
+
+    status = models.CharField(
+        max_length=20, choices=Status.choices, default=Status.PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    objects = QueuedTaskQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def mark_completed(self):
+        type(self).objects.filter(pk=self.pk).mark_completed()
+
+    def mark_failed(self, error, max_attempts, backoff_seconds=30):
+        if self.attempts >= max_attempts:
+            status = self.Status.DEAD
+            available_at = self.available_at
+        else:
+            status = self.Status.PENDING
+            delay = backoff_seconds * 2 ** max(self.attempts - 1, 0)
+            available_at = timezone.now() + timedelta(seconds=delay)
+
+        type(self).objects.filter(pk=self.pk).update(
+            status=status,
+            available_at=available_at,
+            locked_at=None,
+            last_error=str(error),
+        )
+        return status
+
+
+class ImageRenditionTask(QueuedTaskModel):
+    """
+    An uploaded image whose renditions (see `common.renditions`) still have to
+    be generated. Once completed, `widths` records the renditions that exist.
+    """
+
+    field = models.CharField(max_length=100)
+    source_name = models.CharField(max_length=255, unique=True)
+    # Rendition size -> actual width in pixels, for the sizes generated.
+    widths = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "available_at"], name="rendition_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.source_name} - {self.status}"
+
+
+class JobCheckpoint(TimestampedModel):
+    """
+    Progress of a resumable batch job, see `common.jobs.CheckpointedJob`.
+    """
+
+    class Status(models.TextChoices):
+        RUNNING = "RUNNING", _("Running")
+        PAUSED = "PAUSED", _("Paused")
+        FAILED = "FAILED", _("Failed")
+        COMPLETED = "COMPLETED", _("Completed")
+
+    name = models.CharField(max_length=255, unique=True)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=20, choices=Status.choices, default=Status.RUNNING
+    )
+    position = models.BigIntegerField(
+        default=0,
+        help_text="Where to resume: the last processed id, or the number of "
+        "items consumed from a stream.",
+    )
+    processed = models.PositiveBigIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} - {self.status} at {self.position}"
+
+
 class OrderableModel(models.Model):
     sort_order = models.IntegerField(default=0, blank=False, null=True)
 
@@ -0,0 +1,206 @@
+import logging
+from functools import lru_cache
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.files import File
+from django.db.models.fields.files import ImageFieldFile
+from imagekit import ImageSpec
+from imagekit.cachefiles import ImageCacheFile
+from imagekit.processors import ResizeToFit
+from imagekit.utils import get_storage
+
+from common.models import ImageRenditionTask
+
+logger = logging.getLogger(__name__)
+
+# Rendition name -> maximum width in pixels, smallest first. Images are never
+# upscaled.
+RENDITION_WIDTHS = {
+    "thumbnail": 160,
+    "card": 480,
+    "detail": 1200,
+    "zoom": 2400,
+}
+
+# Format key -> (PIL format, save options), in order of preference.
+RENDITION_FORMATS = {
+    "avif": ("AVIF", {"quality": 55}),
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+# Image fields that get renditions, as "app_label.Model.field".
+RENDITION_FIELDS = [
+    "products.Product.thumbnail",
+    "products.ProductVariant.image",
+    "products.ProductGalleryImage.image",
+    "products.Category.image",
+    "products.Collection.image",
+    "sections.FeaturedProduct.image",
+    "sections.FeaturedCategory.image",
+]
+
+GENERATED_WIDTHS_CACHE_TIMEOUT = 60 * 60 * 24
+# Images not rendered yet are looked up again after this long.
+PENDING_WIDTHS_CACHE_TIMEOUT = 60
+
+
+class RenditionSpec(ImageSpec):
+    def __init__(self, source, size, fmt):
+        self.processors = [ResizeToFit(width=RENDITION_WIDTHS[size], upscale=False)]
+        self.format, self.options = RENDITION_FORMATS[fmt]
+        super().__init__(source)
+
+
+@lru_cache(maxsize=16384)
+def get_rendition_name(source_name, size, fmt):
+    """
+    Storage name of a rendition. Names only depend on the source name and
+    the spec, so they can be computed without touching the file.
+    """
+    return ImageCacheFile(RenditionSpec(File(None, name=source_name), size, fmt)).name
+
+
+def get_rendition_widths(source_width):
+    """
+    {size: width} of the renditions of an image `source_width` pixels wide.
+    Sizes past the first one capped at the source width would only repeat
+    it, so they are left out.
+    """
+    widths = {}
+    for size, max_width in RENDITION_WIDTHS.items():
+        widths[size] = min(max_width, source_width)
+        if max_width >= source_width:
+            break
+    return widths
+
+
+def _widths_key(source_name):
+    return f"renditions:widths:{source_name}"
+
+
+def get_generated_widths_many(source_names):
+    """
+    Read-through cache of the {size: width} renditions generated for each of
+    `source_names`, in one cache round trip and at most one query. Images
+    not rendered yet by `generate_renditions` map to {}.
+    """
+    keys = {_widths_key(name): name for name in set(source_names)}
+    widths = {keys[key]: value for key, value in cache.get_many(keys).items()}
+
+    missing = [name for name in keys.values() if name not in widths]
+    if missing:
+        stored = dict(
+            ImageRenditionTask.objects.filter(
+                source_name__in=missing, status=ImageRenditionTask.Status.COMPLETED
+            ).values_list("source_name", "widths")
+        )
+        generated, pending = {}, {}
+        for name in missing:
+            widths[name] = stored.get(name) or {}
+            if widths[name]:
+                generated[_widths_key(name)] = widths[name]
+            else:
+                pending[_widths_key(name)] = widths[name]
+        cache.set_many(generated, GENERATED_WIDTHS_CACHE_TIMEOUT)
+        cache.set_many(pending, PENDING_WIDTHS_CACHE_TIMEOUT)
+
+    return widths
+
+
+def get_srcset(source, build_url=None, widths=None):
+    """
+    Returns {format: srcset} for an image field file, e.g.
+    {"webp": "/media/CACHE/.../a.webp 160w, /media/CACHE/.../b.webp 480w", ...}.
+
+    Only renditions that were generated are listed, with their actual widths;
+    until the image has been rendered in the background, this is None.
+    `widths` saves the lookup when the caller already fetched them with
+    `get_generated_widths_many`.
+    """
+    if not source:
+        return None
+
+    if widths is None:
+        widths = get_generated_widths_many([source.name])[source.name]
+    if not widths:
+        return None
+
+    storage = get_storage()
+    srcset = {}
+    for fmt in RENDITION_FORMATS:
+        candidates = []
+        # jsonb does not keep key order.
+        for size, width in sorted(widths.items(), key=lambda item: item[1]):
+            url = storage.url(get_rendition_name(source.name, size, fmt))
+            if build_url:
+                url = build_url(url)
+            candidates.append(f"{url} {width}w")
+        srcset[fmt] = ", ".join(candidates)
+
+    return srcset
+
+
+def get_field(field_label):
+    app_label, model_name, field_name = field_label.split(".")
+    return apps.get_model(app_label, model_name)._meta.get_field(field_name)
+
+
+def queue_renditions(field_label, source_names):
+    """
+    Queues rendition generation for the given files. A file that was already
+    queued is left alone, so re-saving a model with an unchanged image costs
+    a single no-op INSERT.
+    """
+    ImageRenditionTask.objects.bulk_create(
+        [
+            ImageRenditionTask(field=field_label, source_name=name)
+            for name in set(source_names)
+            if name
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def generate_renditions(field_label, source_name, force=False):
+    """
+    Generates every size and format of one image that is not on disk yet.
+    Returns the {size: width} of the renditions.
+    """
+    field = get_field(field_label)
+    source = ImageFieldFile(None, field, source_name)
+    widths = get_rendition_widths(source.width)
+
+    for size in widths:
+        for fmt in RENDITION_FORMATS:
+            rendition = ImageCacheFile(RenditionSpec(source, size, fmt))
+            rendition.generate(force=force)
+
+    return widths
+
+
+def process_rendition_batch(batch_size=10, max_attempts=3, backoff_seconds=60):
+    """
+    Claims up to `batch_size` queued images and renders them. Returns the
+    number of images handled.
+    """
+    tasks = ImageRenditionTask.objects.claim(batch_size, max_attempts=max_attempts)
+
+    for task in tasks:
+        try:
+            widths = generate_renditions(task.field, task.source_name)
+        except Exception as e:
+            status = task.mark_failed(
+                e, max_attempts=max_attempts, backoff_seconds=backoff_seconds
+            )
+            logger.error(
+                f"Failed to render {task.source_name} "
+                f"(attempt {task.attempts}, now {status}): {e}"
+            )
+        else:
+            ImageRenditionTask.objects.filter(pk=task.pk).update(widths=widths)
+            task.mark_completed()
+            cache.delete(_widths_key(task.source_name))
+
+    return len(tasks)
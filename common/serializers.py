@@ -0,0 +1,67 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Manager
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+
+from common.renditions import get_generated_widths_many, get_srcset
+
+
+def _collect_source_names(serializer, instance, names):
+    """
+    Adds the names of the images every `SrcsetField` under `serializer`
+    will render for `instance` to `names`.
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        items = instance.all() if isinstance(instance, Manager) else instance
+        for item in items:
+            _collect_source_names(serializer.child, item, names)
+        return
+
+    for field in serializer.fields.values():
+        if field.write_only or not isinstance(
+            field, (SrcsetField, serializers.BaseSerializer)
+        ):
+            continue
+        try:
+            attribute = field.get_attribute(instance)
+        except (AttributeError, KeyError, ObjectDoesNotExist, SkipField):
+            continue
+        if not attribute:
+            continue
+        if isinstance(field, SrcsetField):
+            names.add(attribute.name)
+        else:
+            _collect_source_names(field, attribute, names)
+
+
+class SrcsetField(serializers.Field):
+    """
+    Read-only `srcset` strings, one per rendition format, for an image field.
+
+    The first field to render resolves the renditions of every image the
+    whole (list) serializer renders in one batch, so a page of products
+    costs one cache round trip rather than one per image.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def get_widths(self, name):
+        widths = self.context.setdefault("rendition_widths", {})
+        if name not in widths:
+            names = {name}
+            if self.root.instance is not None:
+                _collect_source_names(self.root, self.root.instance, names)
+            widths.update(get_generated_widths_many(names - widths.keys()))
+        return widths[name]
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get("request")
+        return get_srcset(
+            value,
+            request.build_absolute_uri if request else None,
+            widths=self.get_widths(value.name),
+        )
@@ -0,0 +1,36 @@
+from django.db.models import FileField
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from common.renditions import RENDITION_FIELDS, queue_renditions
+from common.storage import ContentAddressedStorage, delete_unreferenced_on_commit
+
+# Model label -> image fields of that model that get renditions.
+RENDITION_FIELDS_BY_MODEL = {}
+for field_label in RENDITION_FIELDS:
+    model_label, field_name = field_label.rsplit(".", 1)
+    RENDITION_FIELDS_BY_MODEL.setdefault(model_label, []).append(field_name)
+
+
+@receiver(post_save)
+def queue_image_renditions(sender, instance, **kwargs):
+    for field_name in RENDITION_FIELDS_BY_MODEL.get(sender._meta.label, ()):
+        queue_renditions(
+            f"{sender._meta.label}.{field_name}",
+            [getattr(instance, field_name).name],
+        )
+
+
+@receiver(post_delete)
+def delete_unreferenced_files(sender, instance, **kwargs):
+    """
+    Content-addressed files are shared between rows, so a file is only
+    removed once the last row referencing it is deleted (and committed).
+    """
+    for field in sender._meta.concrete_fields:
+        if not isinstance(field, FileField) or not isinstance(
+            field.storage, ContentAddressedStorage
+        ):
+            continue
+
+        delete_unreferenced_on_commit(getattr(instance, field.name).name)
@@ -0,0 +1,166 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+from django.db.models import FileField
+
+# "<root>/ab/cd/<sha256>.<ext>", as produced by ContentAddressedStorage.
+CONTENT_NAME_RE = re.compile(r"^[^/]+/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$")
+
+# A reused file is not deleted for this long, so the row reusing it can
+# commit first.
+REUSE_GRACE_SECONDS = 3600
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores files under the SHA-256 of their content.
+
+    Only the first segment of the name produced by `upload_to` is kept (e.g.
+    "products"), so identical bytes uploaded for a thumbnail, a variant and a
+    gallery image end up as one file. Saving content that is already stored
+    writes nothing and returns the existing name.
+
+    Files are shared between rows, so they must only be deleted once no row
+    references them any more; see `delete_unreferenced` and the
+    `cleanup_media` command. Reusing a file refreshes its modification time,
+    under the same lock as deletion, so a file about to be referenced again
+    is never deleted.
+    """
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        if hasattr(content, "seek"):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, "seek"):
+            content.seek(0)
+
+        digest = digest.hexdigest()
+        root = name.split("/", 1)[0] if "/" in name else "files"
+        ext = os.path.splitext(name)[1].lower()
+        return f"{root}/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+    def _save(self, name, content):
+        name = self.get_content_name(name, content)
+        with transaction.atomic():
+            lock_name(name)
+            if self.exists(name):
+                os.utime(self.path(name))
+                return name
+
+            # Write under a private name and hard-link it into place, so the
+            # content name only ever points at a complete file, even when the
+            # same bytes are uploaded concurrently.
+            tmp_name = super()._save(f"{name}.{uuid.uuid4().hex}.tmp", content)
+            try:
+                os.link(self.path(tmp_name), self.path(name))
+            except FileExistsError:
+                os.utime(self.path(name))
+            finally:
+                os.remove(self.path(tmp_name))
+
+        return name
+
+
+content_addressed_storage = ContentAddressedStorage()
+
+
+def get_content_addressed_storage():
+    return content_addressed_storage
+
+
+def get_content_addressed_fields():
+    """Every model file field stored in the content-addressed storage."""
+    return [
+        field
+        for model in apps.get_models()
+        for field in model._meta.get_fields()
+        if isinstance(field, FileField)
+        and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+def get_referenced_names(names=None):
+    """
+    The names referenced by any content-addressed field, or those of `names`
+    that are still referenced.
+    """
+    referenced = set()
+    for field in get_content_addressed_fields():
+        rows = field.model._default_manager.exclude(**{field.name: ""})
+        if names is not None:
+            rows = rows.filter(**{f"{field.name}__in": names})
+        referenced.update(rows.values_list(field.name, flat=True).distinct().iterator())
+    return referenced
+
+
+def lock_name(name):
+    """
+    Serializes reusing and deleting the file `name` until the current
+    transaction ends.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [name])
+
+
+def delete_unreferenced(names, grace_seconds=REUSE_GRACE_SECONDS):
+    """
+    Deletes the shared files of `names` that no row references any more.
+    Files reused within `grace_seconds` are left to `cleanup_media`, since
+    the row reusing them may not be committed yet. Returns the names
+    deleted.
+    """
+    names = sorted({name for name in names if name and CONTENT_NAME_RE.match(name)})
+    if not names:
+        return []
+
+    deleted = []
+    cutoff = time.time() - grace_seconds
+    with transaction.atomic():
+        # In a fixed order, so two deletions never wait on each other.
+        for name in names:
+            lock_name(name)
+        referenced = get_referenced_names(names)
+
+        for name in names:
+            if name in referenced or not content_addressed_storage.exists(name):
+                continue
+            if os.path.getmtime(content_addressed_storage.path(name)) > cutoff:
+                continue
+            content_addressed_storage.delete(name)
+            deleted.append(name)
+    return deleted
+
+
+_pending = threading.local()
+
+
+def delete_unreferenced_on_commit(name):
+    """
+    Deletes the file `name` once the transaction commits, if nothing
+    references it then. Names deleted in one transaction are checked
+    together by the first callback that runs.
+    """
+    pending = _pending.__dict__.setdefault("names", set())
+    if not name or name in pending:
+        return
+    pending.add(name)
+    transaction.on_commit(_delete_pending)
+
+
+def _delete_pending():
+    names = getattr(_pending, "names", None)
+    if not names:
+        return
+    # Names left by a rolled-back transaction may be in the batch; their rows
+    # still exist, so they are kept.
+    _pending.names = set()
+    delete_unreferenced(names)
@@ -1 +1,227 @@
-# Create your tests here.
+import io
+import os
+import tempfile
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from common.jobs import CheckpointedJob, iter_batches
+from common.models import ImageRenditionTask, JobCheckpoint
+from common.renditions import get_srcset, process_rendition_batch
+from common.responses import ranged_file_response
+from common.storage import REUSE_GRACE_SECONDS, content_addressed_storage
+from products.models import Category, Product, ProductGalleryImage, ProductType
+from products.serializers import CategorySerializer
+
+
+class CheckpointedJobTestCase(TransactionTestCase):
+    def run_job(self, items, limit=None):
+        job = CheckpointedJob("test-job", params={"source": "items"})
+        start = job.position
+        batches = iter_batches(items, 2, start=start)
+        if limit is not None:
+            batches = islice(batches, limit // 2)
+        processed = []
+        for batch in job.run(
+            batches,
+            lambda batch: [item for _, item in batch],
+            complete=limit is None or start + limit >= len(items),
+        ):
+            processed.extend(batch)
+        return processed
+
+    def test_limited_runs_resume(self):
+        items = list(range(10))
+
+        self.assertEqual(self.run_job(items, limit=4), [0, 1, 2, 3])
+        checkpoint = JobCheckpoint.objects.get(name="test-job")
+        self.assertEqual(checkpoint.status, JobCheckpoint.Status.PAUSED)
+        self.assertEqual(checkpoint.position, 4)
+
+        self.assertEqual(self.run_job(items, limit=4), [4, 5, 6, 7])
+        self.assertEqual(self.run_job(items, limit=4), [8, 9])
+        checkpoint.refresh_from_db()
+        self.assertEqual(checkpoint.status, JobCheckpoint.Status.COMPLETED)
+
+    def test_completed_job_starts_over(self):
+        items = list(range(4))
+        self.assertEqual(self.run_job(items), items)
+        self.assertEqual(self.run_job(items), items)
+
+
+class ContentAddressedStorageTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            product_type=ProductType.objects.create(name="Statue"),
+            title="Statue",
+            thumbnail="products/s.jpg",
+        )
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def store(self, content=b"statue"):
+        return content_addressed_storage.save("products/a.jpg", ContentFile(content))
+
+    def age(self, name):
+        past = time.time() - REUSE_GRACE_SECONDS - 60
+        os.utime(content_addressed_storage.path(name), (past, past))
+
+    def delete(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+
+    def test_file_is_deleted_with_its_last_reference(self):
+        name = self.store()
+        self.assertEqual(self.store(), name)
+        self.age(name)
+        first, second = [
+            ProductGalleryImage.objects.create(product=self.product, image=name)
+            for _ in range(2)
+        ]
+
+        self.delete(first)
+        self.assertTrue(content_addressed_storage.exists(name))
+        self.delete(second)
+        self.assertFalse(content_addressed_storage.exists(name))
+
+    def test_reused_file_is_kept(self):
+        name = self.store()
+        self.age(name)
+        image = ProductGalleryImage.objects.create(product=self.product, image=name)
+
+        # An upload of the same bytes whose row is not saved yet.
+        self.assertEqual(self.store(), name)
+        self.delete(image)
+        self.assertTrue(content_addressed_storage.exists(name))
+
+
+class RangedFileResponseTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "feed.csv")
+        with open(self.path, "wb") as f:
+            f.write(b"0123456789")
+
+    def replace_file(self):
+        replacement = f"{self.path}.tmp"
+        with open(replacement, "wb") as f:
+            f.write(b"abcdefghijklmnopqrstuvwxyz")
+        os.replace(replacement, self.path)
+
+    def get(self, **headers):
+        request = RequestFactory().get("/feed.csv", headers=headers)
+        return ranged_file_response(request, self.path, "text/csv")
+
+    def test_range_is_served_from_the_validated_file(self):
+        response = self.get(Range="bytes=5-")
+        self.replace_file()
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 5-9/10")
+        self.assertEqual(b"".join(response.streaming_content), b"56789")
+        response.close()
+
+    def test_full_body_matches_its_validators(self):
+        response = self.get()
+        self.replace_file()
+
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        response.close()
+
+
+class QueuedTaskClaimTestCase(TestCase):
+    def create_abandoned_task(self, attempts):
+        return ImageRenditionTask.objects.create(
+            field="products.Product.thumbnail",
+            source_name=f"products/{attempts}.jpg",
+            status=ImageRenditionTask.Status.PROCESSING,
+            locked_at=timezone.now() - timedelta(hours=1),
+            attempts=attempts,
+        )
+
+    def test_reclaims_count_as_attempts(self):
+        retried = self.create_abandoned_task(attempts=2)
+        exhausted = self.create_abandoned_task(attempts=3)
+
+        claimed = ImageRenditionTask.objects.claim(10, max_attempts=3)
+
+        self.assertEqual([task.pk for task in claimed], [retried.pk])
+        self.assertEqual(claimed[0].attempts, 3)
+        exhausted.refresh_from_db()
+        self.assertEqual(exhausted.status, ImageRenditionTask.Status.DEAD)
+        self.assertIsNone(exhausted.locked_at)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class RenditionSrcsetTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def create_category(self, width, title="Garden"):
+        image = io.BytesIO()
+        Image.new("RGB", (width, width // 2)).save(image, format="JPEG")
+        category = Category(title=title)
+        category.image.save("garden.jpg", ContentFile(image.getvalue()), save=False)
+        category.save()
+        return category
+
+    def widths(self, srcset):
+        return [candidate.rsplit(" ", 1)[1] for candidate in srcset.split(", ")]
+
+    def test_srcset_lists_generated_renditions_only(self):
+        category = self.create_category(width=600)
+        self.assertIsNone(get_srcset(category.image))
+
+        process_rendition_batch()
+
+        srcset = get_srcset(category.image)
+        self.assertEqual(self.widths(srcset["jpeg"]), ["160w", "480w", "600w"])
+        self.assertEqual(self.widths(srcset["webp"]), ["160w", "480w", "600w"])
+
+    def test_list_resolves_srcsets_in_one_lookup(self):
+        for width in (200, 300, 400):
+            self.create_category(width, title=f"Garden {width}")
+        process_rendition_batch()
+        categories = list(Category.objects.all())
+
+        def rendition_queries():
+            with CaptureQueriesContext(connection) as queries:
+                data = CategorySerializer(categories, many=True).data
+            self.assertTrue(all(item["image_srcset"] for item in data))
+            return [
+                query
+                for query in queries
+                if ImageRenditionTask._meta.db_table in query["sql"]
+            ]
+
+        cache.clear()
+        self.assertEqual(len(rendition_queries()), 1)
+        self.assertEqual(len(rendition_queries()), 0)
@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connection, connections
+
+logger = logging.getLogger(__name__)
+
+
+def run_worker_pool(process_batch, workers=4, poll_interval=1.0, run_once=False):
+    """
+    Runs `process_batch` in a pool of polling threads.
+
+    `process_batch` must claim and process one batch of work and return the
+    number of items it handled. A worker sleeps for `poll_interval` whenever
+    it finds nothing to do. With `run_once`, each worker exits as soon as the
+    queue is drained, which is handy for cron jobs and backlog replays.
+
+    Returns the total number of items processed.
+    """
+    stop_event = threading.Event()
+    totals = []
+    totals_lock = threading.Lock()
+
+    def worker():
+        processed = 0
+        try:
+            while not stop_event.is_set():
+                try:
+                    count = process_batch()
+                except Exception as e:
+                    logger.error(f"Worker batch failed: {e}", exc_info=True)
+                    count = 0
+
+                processed += count
+
+                if count == 0:
+                    if run_once:
+                        break
+                    stop_event.wait(poll_interval)
+        finally:
+            connection.close()
+            with totals_lock:
+                totals.append(processed)
+
+    threads = [
+        threading.Thread(target=worker, name=f"queue-worker-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        logger.info("Stopping workers...")
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+
+    return sum(totals)
+
+
+def _init_worker_process():
+    # Only needed when the pool spawns rather than forks its workers.
+    django.setup()
+
+
+def _run_worker_process(process_batch, poll_interval, run_once):
+    try:
+        return run_worker_pool(
+            process_batch, workers=1, poll_interval=poll_interval, run_once=run_once
+        )
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        connections.close_all()
+
+
+def run_process_pool(process_batch, workers=4, poll_interval=1.0, run_once=False):
+    """
+    Like `run_worker_pool`, but each worker is a process, so CPU-bound
+    batches (image encoding) run in parallel rather than one at a time
+    under the GIL. `process_batch` must be picklable: a module-level
+    function, or a `functools.partial` of one.
+
+    Returns the total number of items processed.
+    """
+    # Forked workers must open their own database connections rather than
+    # share the parent's socket.
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker_process
+    ) as executor:
+        futures = [
+            executor.submit(_run_worker_process, process_batch, poll_interval, run_once)
+            for _ in range(workers)
+        ]
+        try:
+            return sum(future.result() for future in futures)
+        except KeyboardInterrupt:
+            # The workers got the same signal and stop after their batch.
+            logger.info("Stopping workers...")
+            return sum(future.result() for future in futures)
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # Third party apps
     "corsheaders",
     "rest_framework",
@@ -110,6 +111,19 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Shared by every worker process, so an invalidation reaches all of them;
+# a per-process cache would keep serving stale prices, stock and status.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": config("REDIS_URL"),
+        "KEY_PREFIX": "sculpturesly",
+    }
+}
+
 AUTH_USER_MODEL = "accounts.User"
 
 # Password validation
@@ -217,12 +231,22 @@ META_SYSTEM_USER_TOKEN = config("META_SYSTEM_USER_TOKEN")
 META_DATASET_ID = config("META_DATASET_ID")
 META_CATALOGUE_ID = config("META_CATALOGUE_ID")
 META_DATASET_TEST_EVENT_CODE = config("META_DATASET_TEST_EVENT_CODE")
+META_API_TIMEOUT = config("META_API_TIMEOUT", default=10.0, cast=float)
+META_HTTP_POOL_SIZE = config("META_HTTP_POOL_SIZE", default=10, cast=int)
+META_GRAPH_URL = config("META_GRAPH_URL", default="https://graph.facebook.com")
+# Pending Conversions API events beyond which new events are dropped.
+META_EVENT_MAX_BACKLOG = config("META_EVENT_MAX_BACKLOG", default=100000, cast=int)
 
 
 # Stripe configuration
 STRIPE_PUBLIC_KEY = config("STRIPE_PUBLIC_KEY")
 STRIPE_SECRET_KEY = config("STRIPE_SECRET_KEY")
 STRIPE_WEBHOOK_SECRET = config("STRIPE_WEBHOOK_SECRET")
+STRIPE_API_BASE = config("STRIPE_API_BASE", default="https://api.stripe.com")
+STRIPE_CONNECT_TIMEOUT = config("STRIPE_CONNECT_TIMEOUT", default=3.0, cast=float)
+STRIPE_READ_TIMEOUT = config("STRIPE_READ_TIMEOUT", default=10.0, cast=float)
+STRIPE_MAX_NETWORK_RETRIES = config("STRIPE_MAX_NETWORK_RETRIES", default=2, cast=int)
+STRIPE_HTTP_POOL_SIZE = config("STRIPE_HTTP_POOL_SIZE", default=10, cast=int)
 
 # Base URLs configuration
 BACKEND_BASE_URL = config("DJANGO_BASE_URL")
@@ -233,3 +257,8 @@ BRAND_NAME = "Sculpturesly"
 
 # OpenAI configuration
 OPENAI_API_KEY = config("OPENAI_API_KEY")
+OPENAI_BASE_URL = config("OPENAI_BASE_URL", default="https://api.openai.com/v1")
+OPENAI_MODEL = config("OPENAI_MODEL", default="gpt-4o-mini")
+OPENAI_TIMEOUT = config("OPENAI_TIMEOUT", default=60.0, cast=float)
+OPENAI_REQUESTS_PER_MINUTE = config("OPENAI_REQUESTS_PER_MINUTE", default=500, cast=int)
+OPENAI_TOKENS_PER_MINUTE = config("OPENAI_TOKENS_PER_MINUTE", default=200000, cast=int)
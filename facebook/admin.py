@@ -1 +1,51 @@
-# Register your models here.
+from django.contrib import admin
+
+from .models import CatalogueSyncItem, MetaEvent
+
+
+@admin.register(MetaEvent)
+class MetaEventAdmin(admin.ModelAdmin):
+    list_display = [
+        "event_name",
+        "event_id",
+        "status",
+        "attempts",
+        "available_at",
+        "processed_at",
+    ]
+    list_filter = ["status", "event_name"]
+    search_fields = ["event_id"]
+    readonly_fields = ["user_data", "custom_data", "last_error"]
+
+    @admin.action(description="Retry selected events")
+    def retry_events(self, request, queryset):
+        updated = queryset.update(
+            status=MetaEvent.Status.PENDING, attempts=0, locked_at=None
+        )
+        self.message_user(request, f"{updated} events re-queued.")
+
+    actions = [retry_events]
+
+
+@admin.register(CatalogueSyncItem)
+class CatalogueSyncItemAdmin(admin.ModelAdmin):
+    list_display = [
+        "sku",
+        "status",
+        "attempts",
+        "changed_at",
+        "available_at",
+        "processed_at",
+    ]
+    list_filter = ["status"]
+    search_fields = ["sku"]
+    readonly_fields = ["last_error"]
+
+    @admin.action(description="Retry selected items")
+    def retry_items(self, request, queryset):
+        updated = queryset.update(
+            status=CatalogueSyncItem.Status.PENDING, attempts=0, locked_at=None
+        )
+        self.message_user(request, f"{updated} items re-queued.")
+
+    actions = [retry_items]
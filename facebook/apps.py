@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FacebookConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "facebook"
+
+    def ready(self):
+        from facebook import signals  # noqa: F401
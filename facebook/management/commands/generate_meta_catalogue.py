@@ -0,0 +1,87 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from facebook.services.feed_writers import FEED_WRITERS
+from facebook.services.meta_catalogue_service import MetaCatalogueService
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-generates the product feed files (Meta CSV, Google Merchant XML, "
+        "JSON Lines) served to the channels' crawlers. "
+        "Only rows of variants that changed since the last run are re-rendered, "
+        "unless --full is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            action="append",
+            dest="formats",
+            choices=sorted(FEED_WRITERS),
+            help="Feed format to write; repeat for several (default: all)",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help=(
+                "Re-render every row in parallel id-range shards "
+                "(e.g. nightly, or after changing domains or the brand)"
+            ),
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of processes rendering shards with --full",
+        )
+        parser.add_argument(
+            "--shard-size",
+            type=int,
+            default=20000,
+            help="Number of variant ids per shard with --full",
+        )
+        parser.add_argument(
+            "--gzip",
+            action="store_true",
+            help=(
+                "Also write a gzipped copy of each feed (copies written by "
+                "earlier runs are always kept up to date)"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        service = MetaCatalogueService(
+            backend_domain=settings.BACKEND_BASE_URL,
+            frontend_domain=settings.FRONTEND_BASE_URL,
+            currency="EUR",
+            brand_name=settings.BRAND_NAME,
+        )
+
+        formats = options["formats"] or MetaCatalogueService.DEFAULT_FORMATS
+        started = time.monotonic()
+
+        if options["full"]:
+            paths, written = service.generate_sharded_feed(
+                formats=formats,
+                workers=options["workers"],
+                shard_size=options["shard_size"],
+                compress=options["gzip"],
+            )
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"Rendered {written} rows in {elapsed:.1f}s "
+                f"({written / elapsed if elapsed else 0:.0f} rows/s)."
+            )
+        else:
+            rendered, deleted = service.refresh_rows()
+            self.stdout.write(f"Rendered {rendered} rows, removed {deleted} rows.")
+            paths = service.write_feed_files(formats, compress=options["gzip"])
+            elapsed = time.monotonic() - started
+
+        for path in paths:
+            self.stdout.write(
+                self.style.SUCCESS(f"Feed written to {path} in {elapsed:.1f}s")
+            )
@@ -0,0 +1,106 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from common.workers import run_worker_pool
+from facebook.services.meta_conversion_service import MetaConversionService
+from facebook.tasks import (
+    delivery_metrics,
+    process_meta_event_batch,
+    purge_meta_events,
+)
+
+
+class Command(BaseCommand):
+    help = "Delivers queued Meta Conversions API events with a pool of workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Worker threads")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=MetaConversionService.MAX_EVENTS_PER_REQUEST,
+            help="Events sent per Conversions API request",
+        )
+        parser.add_argument(
+            "--max-batch-age",
+            type=float,
+            default=5.0,
+            help="Seconds an event may wait for its batch to fill up",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=6,
+            help="Attempts before an event is dead-lettered",
+        )
+        parser.add_argument(
+            "--purge-interval",
+            type=float,
+            default=300.0,
+            help="Seconds between purges of delivered and dead-lettered events",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is drained instead of polling forever",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        max_attempts = options["max_attempts"]
+        # When draining, send whatever is queued instead of waiting for full batches.
+        max_batch_age = 0 if options["once"] else options["max_batch_age"]
+
+        if batch_size > MetaConversionService.MAX_EVENTS_PER_REQUEST:
+            raise CommandError(
+                f"--batch-size cannot exceed {MetaConversionService.MAX_EVENTS_PER_REQUEST}."
+            )
+
+        self.stdout.write(f"Sending Meta events with {options['workers']} workers...")
+
+        purge_lock = threading.Lock()
+        purged_at = None
+
+        def process_batch():
+            nonlocal purged_at
+            processed = process_meta_event_batch(
+                batch_size, max_attempts, max_batch_age_seconds=max_batch_age
+            )
+            # One worker at a time purges; the others keep delivering.
+            if purge_lock.acquire(blocking=False):
+                try:
+                    now = time.monotonic()
+                    if (
+                        purged_at is None
+                        or now - purged_at >= options["purge_interval"]
+                    ):
+                        purged_at = now
+                        purge_meta_events()
+                finally:
+                    purge_lock.release()
+            return processed
+
+        processed = run_worker_pool(
+            process_batch,
+            workers=options["workers"],
+            poll_interval=options["poll_interval"],
+            run_once=options["once"],
+        )
+
+        metrics = delivery_metrics.snapshot()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {processed} events: {metrics['events_sent']} sent, "
+                f"{metrics['events_failed']} failed in {metrics['requests']} requests "
+                f"({metrics['events_per_second']:.1f} events/s, "
+                f"{metrics['avg_request_ms']:.0f} ms/request)."
+            )
+        )
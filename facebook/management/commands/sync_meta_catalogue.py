@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from common.workers import run_worker_pool
+from facebook.services.meta_catalogue_sync_service import MetaCatalogueSyncService
+from facebook.tasks import process_catalogue_sync_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Pushes queued price, stock and status changes to the Meta catalogue "
+        "through the catalog batch API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1, help="Worker threads")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Items sent per batch request",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=5.0,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=6,
+            help="Attempts before an item is dead-lettered",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is drained instead of polling forever",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        max_attempts = options["max_attempts"]
+
+        if not settings.META_CATALOGUE_ID:
+            raise CommandError("META_CATALOGUE_ID is not configured.")
+
+        if batch_size > MetaCatalogueSyncService.MAX_REQUESTS_PER_BATCH:
+            raise CommandError(
+                "--batch-size cannot exceed "
+                f"{MetaCatalogueSyncService.MAX_REQUESTS_PER_BATCH}."
+            )
+
+        self.stdout.write(
+            f"Syncing Meta catalogue changes with {options['workers']} workers..."
+        )
+
+        processed = run_worker_pool(
+            lambda: process_catalogue_sync_batch(batch_size, max_attempts),
+            workers=options["workers"],
+            poll_interval=options["poll_interval"],
+            run_once=options["once"],
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} items."))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("facebook", "0002_metaorderuserdata"),
+        ("products", "0003_category_seo_metadata_collection_seo_metadata_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatalogueFeedRow",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("row", models.JSONField()),
+                ("source_updated_at", models.DateTimeField()),
+                (
+                    "variant",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="products.productvariant",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:46
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The index is built concurrently, so the table stays writable.
+    atomic = False
+
+    dependencies = [
+        ("facebook", "0004_cataloguesyncitem"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="metaevent",
+            index=models.Index(
+                fields=["status", "created_at"], name="meta_event_purge_idx"
+            ),
+        ),
+    ]
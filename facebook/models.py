@@ -1 +1,90 @@
-# Create your models here.
+from django.db import models
+from django.utils import timezone
+
+from common.models import QueuedTaskModel
+
+
+class MetaEvent(QueuedTaskModel):
+    """
+    Outbox of Conversions API events waiting to be delivered to Meta.
+
+    Rows that exhaust their retries stay in the table with status DEAD and act
+    as the dead-letter store, until `purge_meta_events` deletes them.
+    """
+
+    event_name = models.CharField(max_length=50)
+    event_id = models.CharField(max_length=255)
+    event_time = models.PositiveBigIntegerField()
+    event_source_url = models.URLField(max_length=2048, blank=True)
+    user_data = models.JSONField(default=dict)
+    custom_data = models.JSONField(default=dict)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "available_at"], name="meta_event_queue_idx"
+            ),
+            models.Index(fields=["status", "created_at"], name="meta_event_purge_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.event_name} ({self.event_id}) - {self.status}"
+
+
+class CatalogueSyncItem(QueuedTaskModel):
+    """
+    Outbox of catalogue items whose price, stock or status changed and still
+    have to be pushed to the Meta catalogue.
+
+    There is one row per sku, so repeated edits coalesce into a single
+    update; the syncer sends whatever the variant looks like at send time.
+    `changed_at` is bumped on every edit, which tells the syncer whether an
+    item changed again while its batch was in flight.
+    """
+
+    sku = models.CharField(max_length=255, unique=True)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "available_at"], name="catalogue_sync_queue_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.sku} - {self.status}"
+
+
+class MetaOrderUserData(models.Model):
+    """
+    Hashed customer identity captured at checkout and reused for the
+    order's Purchase event.
+    """
+
+    order = models.OneToOneField(
+        "orders.Order", on_delete=models.CASCADE, related_name="meta_user_data"
+    )
+    user_data = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"Meta user data for order {self.order_id}"
+
+
+class CatalogueFeedRow(models.Model):
+    """
+    Rendered catalogue feed row of a published variant.
+
+    `source_updated_at` is the newest `updated_at` of the variant, its product
+    and their gallery images at render time; rows are only re-rendered when
+    that timestamp moves.
+    """
+
+    variant = models.OneToOneField(
+        "products.ProductVariant", on_delete=models.CASCADE, related_name="+"
+    )
+    row = models.JSONField()
+    source_updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Feed row for variant {self.variant_id}"
@@ -3,6 +3,19 @@ from typing import List, Optional
 
 from pydantic import BaseModel, Field, field_validator
 
+# Fields Meta requires to be SHA-256 hashed before they leave our servers.
+PII_FIELDS = (
+    "email",
+    "phone",
+    "first_name",
+    "last_name",
+    "city",
+    "state",
+    "zip_code",
+    "country",
+    "external_id",
+)
+
 
 class MetaCustomData(BaseModel):
     currency: str = Field(default="USD", max_length=3)
@@ -41,3 +54,24 @@ class MetaUserData(BaseModel):
     @classmethod
     def normalize_phone(cls, v):
         return re.sub(r"\D", "", v) if v else v
+
+
+class MetaHashedUserData(BaseModel):
+    """
+    MetaUserData with every PII field already normalized and SHA-256 hashed.
+    This is the form that is cached, stored with orders and queued for sending.
+    """
+
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    zip_code: Optional[str] = None
+    country: Optional[str] = None
+    external_id: Optional[str] = None
+    client_ip_address: Optional[str] = None
+    client_user_agent: Optional[str] = None
+    fbp: Optional[str] = None
+    fbc: Optional[str] = None
@@ -0,0 +1,173 @@
+import csv
+import json
+from typing import Any, Dict, Iterable, Iterator, List
+from xml.sax.saxutils import escape
+
+FEED_WRITERS = {}
+
+
+def register_feed_writer(cls):
+    """Makes a writer available to the feed service under `cls.name`."""
+    FEED_WRITERS[cls.name] = cls
+    return cls
+
+
+class Echo:
+    """
+    A helper class that implements the file-like interface.
+    Instead of writing to a buffer, it simply returns the value.
+    This allows us to use the csv module for streaming.
+    """
+
+    def write(self, value):
+        return value
+
+
+class FeedWriter:
+    """
+    Formats precomputed catalogue rows for one channel.
+
+    A feed is `header()`, then `format_row(row)` for every row, then
+    `footer()`, so feeds can be streamed, written in one pass, or rendered in
+    shards and concatenated.
+    """
+
+    name = ""
+    filename = ""
+    content_type = "text/plain"
+
+    def __init__(self, title: str = "", link: str = "", description: str = ""):
+        self.title = title
+        self.link = link
+        self.description = description
+
+    def header(self) -> str:
+        return ""
+
+    def format_row(self, row: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    def footer(self) -> str:
+        return ""
+
+    def stream(self, rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+        yield self.header()
+        for row in rows:
+            yield self.format_row(row)
+        yield self.footer()
+
+
+@register_feed_writer
+class MetaCsvFeedWriter(FeedWriter):
+    """Facebook/Instagram Catalog compliant CSV."""
+
+    name = "meta"
+    filename = "meta_catalog.csv"
+    content_type = "text/csv"
+
+    CSV_HEADERS = [
+        "id",
+        "title",
+        "description",
+        "availability",
+        "condition",
+        "price",
+        "sale_price",
+        "link",
+        "image_link",
+        "brand",
+        "item_group_id",
+        "google_product_category",
+        "color",
+        "size",
+        "gender",
+        "age_group",
+        "additional_image_link",
+    ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writer = csv.DictWriter(Echo(), fieldnames=self.CSV_HEADERS)
+
+    def header(self) -> str:
+        return self.writer.writeheader()
+
+    def format_row(self, row: Dict[str, Any]) -> str:
+        return self.writer.writerow(row)
+
+
+@register_feed_writer
+class GoogleMerchantFeedWriter(FeedWriter):
+    """Google Merchant Center RSS 2.0 product feed."""
+
+    name = "google"
+    filename = "google_merchant.xml"
+    content_type = "application/xml"
+
+    FIELDS = [
+        "id",
+        "title",
+        "description",
+        "link",
+        "image_link",
+        "availability",
+        "price",
+        "sale_price",
+        "brand",
+        "condition",
+        "item_group_id",
+        "google_product_category",
+        "color",
+        "size",
+        "gender",
+        "age_group",
+    ]
+
+    # The rows use Meta's wording; Google expects underscores.
+    AVAILABILITY = {"in stock": "in_stock", "out of stock": "out_of_stock"}
+
+    def header(self) -> str:
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0">\n'
+            "<channel>\n"
+            f"<title>{escape(self.title)}</title>\n"
+            f"<link>{escape(self.link)}</link>\n"
+            f"<description>{escape(self.description)}</description>\n"
+        )
+
+    def _element(self, field: str, value: Any) -> str:
+        return f"<g:{field}>{escape(str(value))}</g:{field}>"
+
+    def format_row(self, row: Dict[str, Any]) -> str:
+        values = dict(row)
+        values["availability"] = self.AVAILABILITY.get(
+            values["availability"], values["availability"]
+        )
+
+        elements: List[str] = [
+            self._element(field, values[field])
+            for field in self.FIELDS
+            if values.get(field) not in (None, "")
+        ]
+        elements.extend(
+            self._element("additional_image_link", link)
+            for link in (row.get("additional_image_link") or "").split(",")
+            if link
+        )
+        return "<item>" + "".join(elements) + "</item>\n"
+
+    def footer(self) -> str:
+        return "</channel>\n</rss>\n"
+
+
+@register_feed_writer
+class JsonLinesFeedWriter(FeedWriter):
+    """One JSON object per variant, for internal consumers and other channels."""
+
+    name = "jsonl"
+    filename = "products.jsonl"
+    content_type = "application/x-ndjson"
+
+    def format_row(self, row: Dict[str, Any]) -> str:
+        return json.dumps(row, ensure_ascii=False, default=str) + "\n"
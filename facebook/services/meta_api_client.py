@@ -0,0 +1,51 @@
+import os
+import threading
+
+from django.conf import settings
+from facebook_business.api import FacebookAdsApi
+from facebook_business.session import FacebookSession
+from requests.adapters import HTTPAdapter
+
+_api = None
+_api_pid = None
+_api_lock = threading.Lock()
+
+
+def get_meta_api() -> FacebookAdsApi:
+    """
+    Returns the process-wide Meta API client, initializing it on first use.
+
+    The client's requests session is kept for the life of the process so its
+    keep-alive connections to graph.facebook.com are reused between sends.
+    A process forked after initialization (gunicorn --preload) detects the
+    new pid and builds its own session instead of sharing the parent's
+    sockets.
+    """
+    global _api, _api_pid
+
+    if _api is None or _api_pid != os.getpid():
+        with _api_lock:
+            if _api is None or _api_pid != os.getpid():
+                session = FacebookSession(
+                    app_id=settings.META_APP_ID,
+                    app_secret=settings.META_APP_SECRET,
+                    access_token=settings.META_SYSTEM_USER_TOKEN,
+                    timeout=settings.META_API_TIMEOUT,
+                )
+                # Pointing META_GRAPH_URL at a local stub exercises the
+                # integrations without touching a real ad account.
+                session.GRAPH = settings.META_GRAPH_URL.rstrip("/")
+
+                adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=settings.META_HTTP_POOL_SIZE
+                )
+                session.requests.mount("https://", adapter)
+                session.requests.mount("http://", adapter)
+
+                api = FacebookAdsApi(session)
+                FacebookAdsApi.set_default_api(api)
+
+                _api = api
+                _api_pid = os.getpid()
+
+    return _api
@@ -1,50 +1,44 @@
-import csv
+import gzip
 import os
+import shutil
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from decimal import Decimal
-from typing import Any, Dict, Iterator, List, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+import django
 from django.conf import settings
+from django.db import connections
+from django.db.models import F, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Greatest
 from django.utils.html import strip_tags
 
-# Import your models
-from products.models import Product, ProductVariant
-
-
-class Echo:
-    """
-    A helper class that implements the file-like interface.
-    Instead of writing to a buffer, it simply returns the value.
-    This allows us to use the csv module for streaming.
-    """
-
-    def write(self, value):
-        return value
+from facebook.models import CatalogueFeedRow
+from facebook.services.feed_writers import FEED_WRITERS, FeedWriter
+from products.models import Product, ProductGalleryImage, ProductVariant
 
 
 class MetaCatalogueService:
     """
-    Generates a Facebook/Instagram Catalog compliant CSV feed.
+    Renders one channel-neutral row per published variant, keeps the rows in
+    CatalogueFeedRow, and writes them out through the registered feed writers
+    (Meta CSV, Google Merchant XML, JSON Lines).
     """
 
-    CSV_HEADERS = [
+    VARIANT_FIELDS = (
         "id",
-        "title",
-        "description",
-        "availability",
-        "condition",
+        "product_id",
+        "sku",
         "price",
-        "sale_price",
-        "link",
-        "image_link",
-        "brand",
-        "item_group_id",
-        "google_product_category",
-        "color",
-        "size",
-        "gender",
-        "age_group",
-        "additional_image_link",
-    ]
+        "compare_at_price",
+        "stock_quantity",
+        "image",
+        "attributes",
+    )
+
+    DEFAULT_FORMATS = tuple(FEED_WRITERS)
+    REFRESH_CHUNK_SIZE = 1000
 
     def __init__(
         self,
@@ -53,22 +47,128 @@ class MetaCatalogueService:
         currency: str = "USD",
         brand_name: str = "MyBrand",
     ):
+        # Kept so shard workers can rebuild an identical service.
+        self.options = {
+            "backend_domain": backend_domain,
+            "frontend_domain": frontend_domain,
+            "currency": currency,
+            "brand_name": brand_name,
+        }
         self.backend_domain = backend_domain.rstrip("/")
         self.frontend_domain = frontend_domain.rstrip("/")
         self.currency = currency
         self.brand_name = brand_name
+        self.image_storages = {
+            "thumbnail": Product._meta.get_field("thumbnail").storage,
+            "variant": ProductVariant._meta.get_field("image").storage,
+            "gallery": ProductGalleryImage._meta.get_field("image").storage,
+        }
+
+    def _published_variants(self):
+        return ProductVariant.objects.filter(product__status=Product.Status.PUBLISHED)
+
+    def iter_variant_chunks(
+        self,
+        variant_ids: Optional[Iterable[int]] = None,
+        id_range: Optional[Tuple[int, int]] = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields published variants as lists of plain dicts, REFRESH_CHUNK_SIZE
+        at a time, walking the id index (keyset pagination) so no query ever
+        scans or holds more than one chunk.
 
-    def get_queryset(self):
-        return (
-            ProductVariant.objects.filter(product__status=Product.Status.PUBLISHED)
-            .select_related("product", "product__product_type")
-            .prefetch_related(
-                "product__categories",
-                "gallery_images",
-                "product__gallery_images",
+        Either `variant_ids` or a half-open `id_range` (start, end) narrows
+        the variants walked.
+        """
+        if variant_ids is not None:
+            variant_ids = list(variant_ids)
+            for i in range(0, len(variant_ids), self.REFRESH_CHUNK_SIZE):
+                chunk_ids = variant_ids[i : i + self.REFRESH_CHUNK_SIZE]
+                chunk = list(
+                    self._published_variants()
+                    .filter(id__in=chunk_ids)
+                    .order_by("id")
+                    .values(*self.VARIANT_FIELDS)
+                )
+                if chunk:
+                    yield chunk
+            return
+
+        variants = self._published_variants()
+        last_id = 0
+        if id_range is not None:
+            start_id, end_id = id_range
+            variants = variants.filter(id__lt=end_id)
+            last_id = start_id - 1
+
+        while True:
+            chunk = list(
+                variants.filter(id__gt=last_id)
+                .order_by("id")
+                .values(*self.VARIANT_FIELDS)[: self.REFRESH_CHUNK_SIZE]
             )
-            .order_by("product__id", "id")
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1]["id"]
+
+    def load_chunk(self, variants: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Fetches everything the rows of `variants` are rendered from with one
+        query per relation.
+        """
+        variant_ids = [v["id"] for v in variants]
+        product_ids = {v["product_id"] for v in variants}
+
+        products = {
+            p["id"]: p
+            for p in Product.objects.filter(id__in=product_ids).values(
+                "id", "title", "slug", "description", "thumbnail"
+            )
+        }
+
+        # Categories are ordered by title, so the first one per product matches
+        # what `product.categories.first()` used to return.
+        categories = {}
+        category_links = (
+            Product.categories.through.objects.filter(product_id__in=product_ids)
+            .order_by("product_id", "category__title")
+            .values_list("product_id", "category__title")
+        )
+        for product_id, title in category_links:
+            categories.setdefault(product_id, title)
+
+        variant_images = defaultdict(list)
+        product_images = defaultdict(list)
+        gallery = (
+            ProductGalleryImage.objects.filter(
+                Q(product_id__in=product_ids) | Q(variant_id__in=variant_ids)
+            )
+            .order_by("id")
+            .values_list("product_id", "variant_id", "image")
         )
+        for product_id, variant_id, image in gallery:
+            product_images[product_id].append(image)
+            if variant_id:
+                variant_images[variant_id].append(image)
+
+        return {
+            "products": products,
+            "categories": categories,
+            "variant_images": variant_images,
+            "product_images": product_images,
+        }
+
+    def iter_rows(
+        self,
+        variant_ids: Optional[Iterable[int]] = None,
+        id_range: Optional[Tuple[int, int]] = None,
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Yields (variant_id, row) for published variants, chunk by chunk."""
+        for variants in self.iter_variant_chunks(variant_ids, id_range):
+            related = self.load_chunk(variants)
+            for variant in variants:
+                yield variant["id"], self.build_row(variant, related)
 
     def _build_absolute_url(self, path: str, to_backend: bool) -> str:
         if not path:
@@ -84,8 +184,13 @@ class MetaCatalogueService:
             return ""
         return f"{amount:.2f} {self.currency}"
 
-    def _get_availability(self, variant: ProductVariant) -> str:
-        return "in stock" if variant.stock_quantity > 0 else "out of stock"
+    def get_availability(self, variant: Dict[str, Any]) -> str:
+        return "in stock" if variant["stock_quantity"] > 0 else "out of stock"
+
+    def _image_url(self, field_name: str, name: str) -> str:
+        if not name:
+            return ""
+        return self.image_storages[field_name].url(name)
 
     def _extract_attribute(self, attributes: dict, keys: List[str]) -> str:
         for key in keys:
@@ -102,48 +207,62 @@ class MetaCatalogueService:
         text = strip_tags(text)
         return " ".join(text.split())
 
-    def process_variant(self, variant: ProductVariant) -> Dict[str, Any]:
-        product = variant.product
-
-        price_val = variant.price
+    def build_price_fields(self, variant: Dict[str, Any]) -> Dict[str, str]:
+        """
+        A discounted variant is listed at its compare-at price with its own
+        price as the sale price.
+        """
+        price_val = variant["price"]
         sale_price_val = None
-        if variant.compare_at_price and variant.compare_at_price > variant.price:
-            price_val = variant.compare_at_price
-            sale_price_val = variant.price
+        compare_at_price = variant["compare_at_price"]
+        if compare_at_price and compare_at_price > variant["price"]:
+            price_val = compare_at_price
+            sale_price_val = variant["price"]
+
+        return {
+            "price": self._format_price(price_val),
+            "sale_price": self._format_price(sale_price_val) if sale_price_val else "",
+        }
 
-        product_url = f"/products/{product.slug}?sku={variant.sku}"
-        main_image = variant.image.url if variant.image else product.thumbnail.url
+    def build_row(
+        self, variant: Dict[str, Any], related: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        product = related["products"][variant["product_id"]]
+        attributes = variant["attributes"]
 
-        gallery_imgs = [img.image.url for img in variant.gallery_images.all()]
-        if not gallery_imgs:
-            gallery_imgs = [img.image.url for img in product.gallery_images.all()]
+        product_url = f"/products/{product['slug']}?sku={variant['sku']}"
+        if variant["image"]:
+            main_image = self._image_url("variant", variant["image"])
+        else:
+            main_image = self._image_url("thumbnail", product["thumbnail"])
+
+        gallery_imgs = related["variant_images"].get(variant["id"]) or related[
+            "product_images"
+        ].get(product["id"], [])
         additional_images = ",".join(
-            [self._build_absolute_url(url, True) for url in gallery_imgs[:10]]
+            [
+                self._build_absolute_url(self._image_url("gallery", name), True)
+                for name in gallery_imgs[:10]
+            ]
         )
 
-        category = product.categories.first()
-        google_category = category.title if category else ""
+        google_category = related["categories"].get(product["id"], "")
 
-        color = self._extract_attribute(
-            variant.attributes, ["Color", "Colour", "Shade"]
-        )
-        size = self._extract_attribute(variant.attributes, ["Size", "Dimensions"])
-        gender = (
-            self._extract_attribute(variant.attributes, ["Gender", "Sex"]) or "unisex"
-        )
+        color = self._extract_attribute(attributes, ["Color", "Colour", "Shade"])
+        size = self._extract_attribute(attributes, ["Size", "Dimensions"])
+        gender = self._extract_attribute(attributes, ["Gender", "Sex"]) or "unisex"
 
         return {
-            "id": variant.sku,
-            "title": self._clean_text(product.title),
-            "description": self._clean_text(product.description),
-            "availability": self._get_availability(variant),
+            "id": variant["sku"],
+            "title": self._clean_text(product["title"]),
+            "description": self._clean_text(product["description"]),
+            "availability": self.get_availability(variant),
             "condition": "new",
-            "price": self._format_price(price_val),
-            "sale_price": self._format_price(sale_price_val) if sale_price_val else "",
+            **self.build_price_fields(variant),
             "link": self._build_absolute_url(product_url, False),
             "image_link": self._build_absolute_url(main_image, True),
             "brand": self.brand_name,
-            "item_group_id": product.id,
+            "item_group_id": product["id"],
             "google_product_category": google_category,
             "color": color,
             "size": size,
@@ -152,41 +271,365 @@ class MetaCatalogueService:
             "additional_image_link": additional_images,
         }
 
+    def get_source_timestamps(self):
+        """
+        Published variants annotated with the newest `updated_at` of everything
+        their feed row is rendered from.
+        """
+        variant_gallery = (
+            ProductGalleryImage.objects.filter(variant=OuterRef("pk"))
+            .order_by()
+            .values("variant")
+            .annotate(latest=Max("updated_at"))
+            .values("latest")
+        )
+        product_gallery = (
+            ProductGalleryImage.objects.filter(product=OuterRef("product"))
+            .order_by()
+            .values("product")
+            .annotate(latest=Max("updated_at"))
+            .values("latest")
+        )
+
+        return self._published_variants().annotate(
+            source_updated_at=Greatest(
+                "updated_at",
+                "product__updated_at",
+                Subquery(variant_gallery),
+                Subquery(product_gallery),
+            )
+        )
+
+    def refresh_rows(self, full: bool = False) -> Tuple[int, int]:
+        """
+        Re-renders the stored rows of variants whose sources changed since
+        they were last rendered, and drops rows of variants that are no longer
+        published. With `full`, every row is re-rendered.
+
+        Stale variants are found and streamed by the database, so memory use
+        does not grow with the size of the catalogue.
+
+        Returns (rendered, deleted).
+        """
+        deleted = self._delete_unpublished_rows()
+
+        stale = self.get_source_timestamps()
+        if not full:
+            stored_at = CatalogueFeedRow.objects.filter(variant=OuterRef("pk")).values(
+                "source_updated_at"
+            )
+            stale = stale.annotate(stored_at=Subquery(stored_at)).filter(
+                Q(stored_at__isnull=True) | ~Q(stored_at=F("source_updated_at"))
+            )
+
+        stale = stale.order_by("id").values_list("id", "source_updated_at")
+
+        rendered = 0
+        last_id = 0
+        while True:
+            chunk = dict(stale.filter(id__gt=last_id)[: self.REFRESH_CHUNK_SIZE])
+            if not chunk:
+                break
+            last_id = max(chunk)
+
+            rows = list(self.iter_rows(variant_ids=chunk.keys()))
+            self._store_rows(rows, chunk)
+            rendered += len(rows)
+
+        return rendered, deleted
+
+    def _delete_unpublished_rows(self) -> int:
+        deleted, _ = CatalogueFeedRow.objects.exclude(
+            variant__product__status=Product.Status.PUBLISHED
+        ).delete()
+        return deleted
+
+    def _store_rows(
+        self, rows: List[Tuple[int, Dict[str, Any]]], timestamps: Dict[int, Any]
+    ):
+        # A variant unpublished between the two loads has no timestamp; it is
+        # not stored, and the next refresh reconciles it.
+        CatalogueFeedRow.objects.bulk_create(
+            [
+                CatalogueFeedRow(
+                    variant_id=variant_id,
+                    row=row,
+                    source_updated_at=timestamps[variant_id],
+                )
+                for variant_id, row in rows
+                if variant_id in timestamps
+            ],
+            update_conflicts=True,
+            unique_fields=["variant"],
+            update_fields=["row", "source_updated_at"],
+        )
+
+    def get_shard_ranges(self, shard_size: int) -> List[Tuple[int, int]]:
+        """
+        Splits the id space of published variants into half-open ranges of
+        `shard_size` ids each.
+        """
+        bounds = self._published_variants().aggregate(
+            min_id=Min("id"), max_id=Max("id")
+        )
+        if bounds["min_id"] is None:
+            return []
+
+        return [
+            (start, min(start + shard_size, bounds["max_id"] + 1))
+            for start in range(bounds["min_id"], bounds["max_id"] + 1, shard_size)
+        ]
+
+    def get_writer(self, feed_format: str) -> FeedWriter:
+        return FEED_WRITERS[feed_format](
+            title=self.brand_name,
+            link=self.frontend_domain,
+            description=f"{self.brand_name} product catalogue",
+        )
+
+    def render_shard(self, id_range: Tuple[int, int], paths: Dict[str, str]) -> int:
+        """
+        Renders every published variant in `id_range` once and writes the rows
+        to one body-only shard per feed format (`paths` maps format to shard
+        path), storing the rows as it goes so later incremental runs start
+        from them. Returns the number of rows written.
+        """
+        writers = {name: self.get_writer(name) for name in paths}
+        files = {
+            name: open(path, mode="w", newline="", encoding="utf-8")
+            for name, path in paths.items()
+        }
+
+        written = 0
+        try:
+            for variants in self.iter_variant_chunks(id_range=id_range):
+                related = self.load_chunk(variants)
+                rows = [
+                    (variant["id"], self.build_row(variant, related))
+                    for variant in variants
+                ]
+                for name, writer in writers.items():
+                    files[name].writelines(writer.format_row(row) for _, row in rows)
+
+                timestamps = dict(
+                    self.get_source_timestamps()
+                    .filter(id__in=[variant_id for variant_id, _ in rows])
+                    .values_list("id", "source_updated_at")
+                )
+                self._store_rows(rows, timestamps)
+                written += len(rows)
+        finally:
+            for file in files.values():
+                file.close()
+
+        return written
+
+    def generate_sharded_feed(
+        self,
+        formats: Iterable[str] = DEFAULT_FORMATS,
+        workers: int = 4,
+        shard_size: int = 20000,
+        compress: bool = False,
+    ) -> Tuple[List[str], int]:
+        """
+        Fully regenerates the feeds in `formats` by rendering id-range shards
+        in a pool of `workers` processes and concatenating them in id order.
+        With `compress`, a gzipped copy is written next to each plain feed;
+        a gzipped copy left by an earlier run is always rewritten.
+
+        Every output file is renamed into place only once complete.
+
+        Returns (paths written, rows written).
+        """
+        formats = list(formats)
+        self._delete_unpublished_rows()
+        shard_ranges = self.get_shard_ranges(shard_size)
+
+        output_dir = os.path.dirname(self.get_feed_path(""))
+        os.makedirs(output_dir, exist_ok=True)
+        shard_dir = tempfile.mkdtemp(dir=output_dir, prefix=".shards-")
+
+        try:
+            shard_paths = [
+                {
+                    name: os.path.join(shard_dir, f"{index:06d}.{name}")
+                    for name in formats
+                }
+                for index in range(len(shard_ranges))
+            ]
+
+            # Forked workers must open their own database connections rather
+            # than share the parent's socket.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_shard_worker
+            ) as executor:
+                written = sum(
+                    executor.map(
+                        _render_shard,
+                        [self.options] * len(shard_ranges),
+                        shard_ranges,
+                        shard_paths,
+                    )
+                )
+
+            paths = []
+            for name in formats:
+                writer = self.get_writer(name)
+                output_path = self.get_feed_path(writer.filename)
+                parts = [paths_by_format[name] for paths_by_format in shard_paths]
+
+                paths.append(output_path)
+                self._concatenate_shards(writer, parts, output_path, compress=False)
+                if compress or os.path.exists(f"{output_path}.gz"):
+                    paths.append(f"{output_path}.gz")
+                    self._concatenate_shards(writer, parts, paths[-1], compress=True)
+        finally:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+
+        return paths, written
+
+    def _concatenate_shards(
+        self,
+        writer: FeedWriter,
+        shard_paths: List[str],
+        output_path: str,
+        compress: bool,
+    ):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output_path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, mode="wb") as raw_file:
+                out = (
+                    gzip.GzipFile(fileobj=raw_file, mode="wb") if compress else raw_file
+                )
+                with out:
+                    out.write(writer.header().encode("utf-8"))
+                    for shard_path in shard_paths:
+                        with open(shard_path, mode="rb") as shard_file:
+                            shutil.copyfileobj(shard_file, out, 1024 * 1024)
+                    out.write(writer.footer().encode("utf-8"))
+
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def get_feed_path(self, filename: str) -> str:
+        return os.path.join(settings.MEDIA_ROOT, "feeds", filename)
+
+    def _compress_file(self, path: str) -> str:
+        """
+        Rewrites the gzipped copy of the file at `path`, renaming it into
+        place once complete. Returns its path.
+        """
+        output_path = f"{path}.gz"
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, mode="wb") as raw_file:
+                with open(path, mode="rb") as src, gzip.GzipFile(
+                    fileobj=raw_file, mode="wb"
+                ) as out:
+                    shutil.copyfileobj(src, out, 1024 * 1024)
+
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return output_path
+
+    def write_feed_files(
+        self, formats: Iterable[str] = DEFAULT_FORMATS, compress: bool = False
+    ) -> List[str]:
+        """
+        Writes the stored rows to the file of every feed format in a single
+        pass over the table. Each file is written next to its destination and
+        renamed into place, so a crawler fetching it mid-write still gets the
+        previous complete feed.
+
+        With `compress`, a gzipped copy is written next to each plain feed;
+        a gzipped copy left by an earlier run is always rewritten, so it
+        never serves an older feed than the plain file.
+        """
+        writers = [self.get_writer(name) for name in formats]
+        output_paths = [self.get_feed_path(writer.filename) for writer in writers]
+        os.makedirs(os.path.dirname(output_paths[0]), exist_ok=True)
+
+        tmp_paths = []
+        try:
+            files = []
+            for output_path in output_paths:
+                fd, tmp_path = tempfile.mkstemp(
+                    dir=os.path.dirname(output_path), suffix=".tmp"
+                )
+                tmp_paths.append(tmp_path)
+                files.append(os.fdopen(fd, mode="w", newline="", encoding="utf-8"))
+
+            try:
+                for writer, file in zip(writers, files):
+                    file.write(writer.header())
+
+                rows = (
+                    CatalogueFeedRow.objects.order_by("variant_id")
+                    .values_list("row", flat=True)
+                    .iterator(chunk_size=self.REFRESH_CHUNK_SIZE)
+                )
+                for row in rows:
+                    for writer, file in zip(writers, files):
+                        file.write(writer.format_row(row))
+
+                for writer, file in zip(writers, files):
+                    file.write(writer.footer())
+            finally:
+                for file in files:
+                    file.close()
+
+            for tmp_path, output_path in zip(tmp_paths, output_paths):
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, output_path)
+        except BaseException:
+            for tmp_path in tmp_paths:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            raise
+
+        paths = []
+        for output_path in output_paths:
+            paths.append(output_path)
+            if compress or os.path.exists(f"{output_path}.gz"):
+                paths.append(self._compress_file(output_path))
+        return paths
+
     def generate_feed(
-        self, save_to_file: bool = False, filename: str = "meta_catalog.csv"
+        self, save_to_file: bool = False, feed_format: str = "meta"
     ) -> Union[str, Iterator[str]]:
         """
         Main entry point.
 
-        :param save_to_file: If True, saves to MEDIA_ROOT and returns the file path.
+        :param save_to_file: If True, refreshes the changed rows, writes the
+                             feed to MEDIA_ROOT and returns the file path.
                              If False, returns a generator (iterator) for streaming.
 
-        :param filename: Name of the file (used for saving or download header).
+        :param feed_format: Name of the registered feed writer to use.
         """
         if save_to_file:
-            return self._generate_to_file(filename)
+            self.refresh_rows()
+            return self.write_feed_files([feed_format])[0]
         else:
-            return self._generate_stream()
-
-    def _generate_to_file(self, filename: str) -> str:
-        output_dir = os.path.join(settings.MEDIA_ROOT, "feeds")
-        os.makedirs(output_dir, exist_ok=True)
-        output_path = os.path.join(output_dir, filename)
+            rows = (row for _, row in self.iter_rows())
+            return self.get_writer(feed_format).stream(rows)
 
-        with open(output_path, mode="w", newline="", encoding="utf-8") as csv_file:
-            writer = csv.DictWriter(csv_file, fieldnames=self.CSV_HEADERS)
-            writer.writeheader()
-
-            for variant in self.get_queryset().iterator(chunk_size=1000):
-                writer.writerow(self.process_variant(variant))
-
-        return output_path
 
-    def _generate_stream(self) -> Iterator[str]:
-        pseudo_buffer = Echo()
-        writer = csv.DictWriter(pseudo_buffer, fieldnames=self.CSV_HEADERS)
+def _init_shard_worker():
+    # Only needed when the pool spawns rather than forks its workers.
+    django.setup()
 
-        yield writer.writeheader()
 
-        for variant in self.get_queryset().iterator(chunk_size=1000):
-            yield writer.writerow(self.process_variant(variant))
+def _render_shard(
+    options: Dict[str, Any], id_range: Tuple[int, int], paths: Dict[str, str]
+):
+    try:
+        return MetaCatalogueService(**options).render_shard(id_range, paths)
+    finally:
+        connections.close_all()
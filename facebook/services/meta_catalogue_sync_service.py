@@ -0,0 +1,102 @@
+import logging
+import time
+from typing import Any, Dict, Iterable, List
+
+from django.conf import settings
+from facebook_business.adobjects.productcatalog import ProductCatalog
+
+from facebook.services.meta_api_client import get_meta_api
+from facebook.services.meta_catalogue_service import MetaCatalogueService
+from products.models import Product, ProductVariant
+
+logger = logging.getLogger(__name__)
+
+
+class MetaCatalogueSyncService:
+    """
+    Pushes price, stock and status deltas to the Meta catalogue through the
+    catalog batch API, in between full feed fetches.
+    """
+
+    # Hard limit of the items_batch endpoint.
+    MAX_REQUESTS_PER_BATCH = 5000
+
+    def __init__(self):
+        self.catalogue_id = settings.META_CATALOGUE_ID
+        self.api = get_meta_api()
+        self.catalogue_service = MetaCatalogueService(
+            backend_domain=settings.BACKEND_BASE_URL,
+            frontend_domain=settings.FRONTEND_BASE_URL,
+            currency="EUR",
+            brand_name=settings.BRAND_NAME,
+        )
+
+    def build_requests(self, skus: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        One UPDATE per sku of a published variant, carrying its current price
+        and stock, and one DELETE per sku that is gone or no longer published.
+        """
+        skus = list(skus)
+        variants = {
+            variant["sku"]: variant
+            for variant in ProductVariant.objects.filter(
+                sku__in=skus, product__status=Product.Status.PUBLISHED
+            ).values("sku", "price", "compare_at_price", "stock_quantity")
+        }
+
+        requests = []
+        for sku in skus:
+            variant = variants.get(sku)
+            if variant is None:
+                requests.append({"method": "DELETE", "data": {"id": sku}})
+                continue
+
+            requests.append(
+                {
+                    "method": "UPDATE",
+                    "data": {
+                        "id": sku,
+                        "availability": self.catalogue_service.get_availability(
+                            variant
+                        ),
+                        "inventory": variant["stock_quantity"],
+                        **self.catalogue_service.build_price_fields(variant),
+                    },
+                }
+            )
+
+        return requests
+
+    def push(self, skus: Iterable[str]) -> Dict[str, Any]:
+        """
+        Sends the deltas of `skus` in a single batch request.
+
+        Upserts are disabled: a partial update cannot create a valid item, so
+        newly published variants still arrive with the next feed fetch.
+        """
+        requests = self.build_requests(skus)
+        if not requests:
+            return {}
+
+        started = time.monotonic()
+        response = ProductCatalog(self.catalogue_id, api=self.api).create_items_batch(
+            params={
+                "item_type": "PRODUCT_ITEM",
+                "allow_upsert": False,
+                "requests": requests,
+            }
+        )
+        logger.info(
+            f"Meta catalogue batch of {len(requests)} items sent in "
+            f"{(time.monotonic() - started) * 1000:.0f} ms."
+        )
+
+        result = response.export_all_data()
+        for status in result.get("validation_status", []):
+            for error in status.get("errors", []):
+                logger.warning(
+                    f"Meta rejected catalogue item {status.get('retailer_id')}: "
+                    f"{error.get('message')}"
+                )
+
+        return result
@@ -1,7 +1,6 @@
-import hashlib
 import logging
 import time
-from typing import Optional
+from typing import List, Optional
 
 from django.conf import settings
 from facebook_business.adobjects.serverside.action_source import ActionSource
@@ -9,14 +8,20 @@ from facebook_business.adobjects.serverside.custom_data import CustomData
 from facebook_business.adobjects.serverside.event import Event
 from facebook_business.adobjects.serverside.event_request import EventRequest
 from facebook_business.adobjects.serverside.user_data import UserData
-from facebook_business.api import FacebookAdsApi
 
-from facebook.schemas.meta_conversion_schemas import MetaCustomData, MetaUserData
+from facebook.schemas.meta_conversion_schemas import (
+    MetaCustomData,
+    MetaHashedUserData,
+)
+from facebook.services.meta_api_client import get_meta_api
 
 logger = logging.getLogger(__name__)
 
 
 class MetaConversionService:
+    # Hard limit of the Conversions API.
+    MAX_EVENTS_PER_REQUEST = 1000
+
     def __init__(self):
         self.app_id = settings.META_APP_ID
         self.app_secret = settings.META_APP_SECRET
@@ -24,32 +29,21 @@ class MetaConversionService:
         self.pixel_id = settings.META_DATASET_ID
         self.test_event_code = settings.META_DATASET_TEST_EVENT_CODE
 
-        FacebookAdsApi.init(
-            app_id=self.app_id,
-            app_secret=self.app_secret,
-            access_token=self.access_token,
-        )
+        # Shared, lazily created client; also installed as the SDK default api.
+        self.api = get_meta_api()
 
-    def _hash_pii(self, data: str) -> Optional[str]:  # noqa
-        """SHA256 hashing required by Meta."""
-        if not data:
-            return None
-        return hashlib.sha256(data.encode("utf-8")).hexdigest()
-
-    def _map_user_data(self, data: MetaUserData) -> UserData:
-        """Maps Pydantic model to Meta SDK UserData with hashing."""
+    def _map_user_data(self, data: MetaHashedUserData) -> UserData:  # noqa
+        """Maps already hashed Pydantic model to Meta SDK UserData."""
         return UserData(
-            emails=[self._hash_pii(data.email)] if data.email else None,
-            phones=[self._hash_pii(data.phone)] if data.phone else None,
-            first_names=[self._hash_pii(data.first_name)] if data.first_name else None,
-            last_names=[self._hash_pii(data.last_name)] if data.last_name else None,
-            cities=[self._hash_pii(data.city)] if data.city else None,
-            states=[self._hash_pii(data.state)] if data.state else None,
-            zip_codes=[self._hash_pii(data.zip_code)] if data.zip_code else None,
-            country_codes=[self._hash_pii(data.country)] if data.country else None,
-            external_ids=(
-                [self._hash_pii(data.external_id)] if data.external_id else None
-            ),
+            emails=[data.email] if data.email else None,
+            phones=[data.phone] if data.phone else None,
+            first_names=[data.first_name] if data.first_name else None,
+            last_names=[data.last_name] if data.last_name else None,
+            cities=[data.city] if data.city else None,
+            states=[data.state] if data.state else None,
+            zip_codes=[data.zip_code] if data.zip_code else None,
+            country_codes=[data.country] if data.country else None,
+            external_ids=[data.external_id] if data.external_id else None,
             client_ip_address=data.client_ip_address,
             client_user_agent=data.client_user_agent,
             fbp=data.fbp,
@@ -72,42 +66,80 @@ class MetaConversionService:
             status=data.status,
         )
 
+    def build_event(
+        self,
+        event_name: str,
+        event_id: str,
+        user_data: MetaHashedUserData,
+        custom_data: Optional[MetaCustomData] = None,
+        event_source_url: str = None,
+        event_time: Optional[int] = None,
+    ) -> Event:
+        """Builds a Meta SDK Event ready to be sent on its own or in a batch."""
+        return Event(
+            event_name=event_name,
+            event_time=event_time or int(time.time()),
+            user_data=self._map_user_data(user_data),
+            custom_data=self._map_custom_data(custom_data) if custom_data else None,
+            event_source_url=event_source_url,
+            action_source=ActionSource.WEBSITE,
+            event_id=str(event_id),
+        )
+
+    def send_events(self, events: List[Event]):
+        """
+        Sends up to MAX_EVENTS_PER_REQUEST events in a single EventRequest.
+
+        Meta accepts or rejects the request as a whole, so errors are raised
+        for the caller to retry or split the batch.
+        """
+        if len(events) > self.MAX_EVENTS_PER_REQUEST:
+            raise ValueError(
+                f"Cannot send more than {self.MAX_EVENTS_PER_REQUEST} events per request."
+            )
+
+        event_request = EventRequest(
+            events=events,
+            pixel_id=self.pixel_id,
+            test_event_code=self.test_event_code if self.test_event_code else None,
+        )
+
+        started = time.perf_counter()
+        response = event_request.execute()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        logger.info(
+            f"Meta CAPI Success [{len(events)} events] in {elapsed_ms:.0f} ms: {response}"
+        )
+        return response
+
     def send_event(
         self,
         event_name: str,
         event_id: str,
-        user_data: MetaUserData,
+        user_data: MetaHashedUserData,
         custom_data: Optional[MetaCustomData] = None,
         event_source_url: str = None,
+        event_time: Optional[int] = None,
     ):
         """
         Sends an event to the Meta Conversions API.
+
+        Errors are logged and re-raised so that the caller can decide whether
+        the event should be retried.
         """
 
         try:
-            fb_user_data = self._map_user_data(user_data)
-            fb_custom_data = self._map_custom_data(custom_data) if custom_data else None
-
-            event = Event(
-                event_name=event_name,
-                event_time=int(time.time()),
-                user_data=fb_user_data,
-                custom_data=fb_custom_data,
-                event_source_url=event_source_url,
-                action_source=ActionSource.WEBSITE,
-                event_id=str(event_id),
-            )
-
-            event_request = EventRequest(
-                events=[event],
-                pixel_id=self.pixel_id,
-                test_event_code=self.test_event_code if self.test_event_code else None,
+            event = self.build_event(
+                event_name,
+                event_id,
+                user_data,
+                custom_data,
+                event_source_url,
+                event_time,
             )
-
-            response = event_request.execute()
-            logger.info(f"Meta CAPI Success [{event_name}]: {response}")
-            return response
+            return self.send_events([event])
 
         except Exception as e:
             logger.error(f"Meta CAPI Error [{event_name}]: {e}", exc_info=True)
-            return None
+            raise
@@ -0,0 +1,67 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from facebook.tasks import record_catalogue_changes
+from facebook.utils import get_identity_cache_key
+from products.models import Product, ProductVariant
+from products.signals import catalogue_bulk_changed
+
+# Fields pushed by the catalogue delta sync.
+SYNCED_VARIANT_FIELDS = {"sku", "price", "compare_at_price", "stock_quantity"}
+
+
+@receiver(post_save, sender=ProductVariant)
+def queue_variant_sync(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SYNCED_VARIANT_FIELDS & set(update_fields):
+        return
+    record_catalogue_changes([instance.sku])
+
+
+@receiver(pre_save, sender=ProductVariant)
+def queue_renamed_variant_removal(sender, instance, update_fields=None, **kwargs):
+    """
+    Catalogue items are keyed by sku, so a renamed variant leaves its old
+    item behind; with no variant left under that sku, the sync deletes it.
+    """
+    if not settings.META_CATALOGUE_ID or instance.pk is None:
+        return
+    if update_fields is not None and "sku" not in update_fields:
+        return
+    previous_sku = (
+        ProductVariant.objects.filter(pk=instance.pk)
+        .values_list("sku", flat=True)
+        .first()
+    )
+    if previous_sku and previous_sku != instance.sku:
+        record_catalogue_changes([previous_sku])
+
+
+@receiver(post_delete, sender=ProductVariant)
+def queue_variant_removal(sender, instance, **kwargs):
+    record_catalogue_changes([instance.sku])
+
+
+@receiver(post_save, sender=Product)
+def queue_product_sync(sender, instance, update_fields=None, **kwargs):
+    """A product's status decides whether its variants are listed at all."""
+    if update_fields is not None and "status" not in update_fields:
+        return
+    record_catalogue_changes(instance.variants.values_list("sku", flat=True))
+
+
+@receiver(catalogue_bulk_changed)
+def queue_bulk_sync(sender, skus=(), **kwargs):
+    record_catalogue_changes(skus)
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def invalidate_user_identity(sender, instance, update_fields=None, **kwargs):
+    """The cached hashed identity embeds the user's email."""
+    if update_fields is not None and "email" not in update_fields:
+        return
+    transaction.on_commit(partial(cache.delete, get_identity_cache_key(instance.pk)))
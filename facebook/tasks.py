@@ -1,18 +1,400 @@
-# from celery import shared_task
 import logging
+import threading
+import time
+from datetime import timedelta
 
-from facebook.schemas.meta_conversion_schemas import MetaCustomData, MetaUserData
+from django.conf import settings
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from facebook_business.exceptions import FacebookRequestError
+
+from facebook.models import CatalogueSyncItem, MetaEvent
+from facebook.schemas.meta_conversion_schemas import (
+    MetaCustomData,
+    MetaHashedUserData,
+)
+from facebook.services.meta_catalogue_sync_service import MetaCatalogueSyncService
 from facebook.services.meta_conversion_service import MetaConversionService
 
 logger = logging.getLogger(__name__)
 
+# Meta rejects events whose event_time is more than 7 days in the past.
+MAX_EVENT_AGE_SECONDS = 7 * 24 * 60 * 60
+
+# Delivered events are kept briefly for debugging, dead-lettered ones long
+# enough for someone to look at them and re-queue them.
+COMPLETED_EVENT_RETENTION = timedelta(days=7)
+DEAD_EVENT_RETENTION = timedelta(days=30)
+
+# Events still queued while the backlog is full: they are rare and the
+# ones the ad campaigns optimise for.
+BACKLOG_EXEMPT_EVENTS = {"Purchase"}
+
+
+class DeliveryMetrics:
+    """
+    Process-wide throughput counters for Meta event delivery.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.batches = 0
+        self.requests = 0
+        self.events_sent = 0
+        self.events_failed = 0
+        self.send_seconds = 0.0
+
+    def record_request(self, seconds):
+        with self._lock:
+            self.requests += 1
+            self.send_seconds += seconds
+
+    def record_batch(self, sent, failed):
+        with self._lock:
+            self.batches += 1
+            self.events_sent += sent
+            self.events_failed += failed
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.monotonic() - self.started_at
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "events_sent": self.events_sent,
+                "events_failed": self.events_failed,
+                "avg_request_ms": (
+                    self.send_seconds / self.requests * 1000 if self.requests else 0
+                ),
+                "events_per_second": self.events_sent / elapsed if elapsed else 0,
+            }
+
+
+delivery_metrics = DeliveryMetrics()
+
+
+class EventBacklog:
+    """
+    Tracks whether more than `settings.META_EVENT_MAX_BACKLOG` events are
+    pending, e.g. while Meta is down or no worker is running.
+
+    Each process checks the depth at most once every `check_interval`
+    seconds, with a query that stops at the limit, so enqueueing stays a
+    single INSERT.
+    """
+
+    def __init__(self, check_interval=10):
+        self._lock = threading.Lock()
+        self.check_interval = check_interval
+        self.checked_at = None
+        self.full = False
+
+    def is_full(self):
+        now = time.monotonic()
+        with self._lock:
+            if (
+                self.checked_at is not None
+                and now - self.checked_at < self.check_interval
+            ):
+                return self.full
+            self.checked_at = now
+
+        limit = settings.META_EVENT_MAX_BACKLOG
+        full = MetaEvent.objects.filter(status=MetaEvent.Status.PENDING)[
+            limit : limit + 1
+        ].exists()
+        if full and not self.full:
+            logger.warning(
+                f"Over {limit} Meta events are pending; dropping new events "
+                f"(except {', '.join(sorted(BACKLOG_EXEMPT_EVENTS))}) until "
+                f"the backlog drains."
+            )
+        self.full = full
+        return full
+
+
+event_backlog = EventBacklog()
+
 
-# @shared_task
 def send_meta_event_task(event_name, event_id, user_data_dict, custom_data_dict, url):
-    service = MetaConversionService()
+    """
+    Queues a Meta Pixel Event. Delivery happens in the `send_meta_events`
+    workers, so the calling request only pays for a single INSERT.
+
+    While the backlog is full, events other than BACKLOG_EXEMPT_EVENTS are
+    dropped, so an outage cannot grow the queue without bound.
+    """
+    if event_name not in BACKLOG_EXEMPT_EVENTS and event_backlog.is_full():
+        return
+
+    MetaEvent.objects.create(
+        event_name=event_name,
+        event_id=str(event_id),
+        event_time=int(time.time()),
+        event_source_url=url or "",
+        user_data=user_data_dict,
+        custom_data=custom_data_dict,
+    )
+
+
+# Graph API error for an invalid parameter, i.e. a malformed event.
+INVALID_PARAMETER_ERROR_CODE = 100
+# ...unless the object is unknown: the dataset id or token is wrong.
+UNKNOWN_OBJECT_ERROR_SUBCODE = 33
+
+
+def _is_permanent_error(error):
+    """Client errors other than rate limiting will fail the same way on retry."""
+    if not isinstance(error, FacebookRequestError):
+        return False
+
+    status = error.http_status()
+    return status is not None and 400 <= status < 500 and status != 429
+
+
+def _is_event_error(error):
+    """
+    Meta rejected the request because of an event in it. Auth, permission and
+    dataset errors fail every request the same way until the configuration
+    is fixed, so they are not blamed on the events.
+    """
+    return (
+        _is_permanent_error(error)
+        and error.api_error_code() == INVALID_PARAMETER_ERROR_CODE
+        and error.api_error_subcode() != UNKNOWN_OBJECT_ERROR_SUBCODE
+    )
+
+
+def _should_flush(batch_size, max_batch_age_seconds):
+    """
+    A batch is worth sending once it is full, or once its oldest event has
+    waited `max_batch_age_seconds`.
+    """
+    now = timezone.now()
+    due = MetaEvent.objects.filter(
+        status=MetaEvent.Status.PENDING, available_at__lte=now
+    )
+
+    if due.filter(
+        available_at__lte=now - timedelta(seconds=max_batch_age_seconds)
+    ).exists():
+        return True
+
+    return due[:batch_size].count() >= batch_size
+
+
+def _build_events(service, meta_events):
+    """
+    Builds the SDK event of each queued event on its own, so one event with
+    bad stored data cannot take the batch down with it.
+
+    Returns ([(meta_event, event)], [(meta_event, error)]).
+    """
+    built = []
+    failures = []
+    for meta_event in meta_events:
+        try:
+            event = service.build_event(
+                meta_event.event_name,
+                meta_event.event_id,
+                MetaHashedUserData(**meta_event.user_data),
+                MetaCustomData(**meta_event.custom_data),
+                meta_event.event_source_url or None,
+                event_time=meta_event.event_time,
+            )
+        except Exception as e:
+            failures.append((meta_event, e))
+        else:
+            built.append((meta_event, event))
+    return built, failures
+
+
+def _deliver(service, built):
+    """
+    Sends the built (meta_event, event) pairs as one request. If Meta rejects
+    the request because of an event in it, the batch is split in half until
+    the offending events are isolated, so one bad event cannot block the
+    rest. Any other error fails the whole batch.
+
+    Returns a list of (meta_event, error) pairs for events that failed.
+    """
+    started = time.monotonic()
     try:
-        user_data = MetaUserData(**user_data_dict)
-        custom_data = MetaCustomData(**custom_data_dict)
-        service.send_event(event_name, event_id, user_data, custom_data, url)
+        service.send_events([event for _, event in built])
+        return []
     except Exception as e:
-        logger.exception(f"An error occurred when sending a Meta Pixel Event: {e}")
+        if len(built) == 1 or not _is_event_error(e):
+            return [(meta_event, e) for meta_event, _ in built]
+    finally:
+        delivery_metrics.record_request(time.monotonic() - started)
+
+    middle = len(built) // 2
+    return _deliver(service, built[:middle]) + _deliver(service, built[middle:])
+
+
+def process_meta_event_batch(
+    batch_size=MetaConversionService.MAX_EVENTS_PER_REQUEST,
+    max_attempts=6,
+    backoff_seconds=30,
+    max_batch_age_seconds=5,
+):
+    """
+    Claims up to `batch_size` queued events and delivers them to Meta in a
+    single request, flushing early only when the oldest event is too old.
+    Returns the number of events handled.
+    """
+    if not _should_flush(batch_size, max_batch_age_seconds):
+        return 0
+
+    events = MetaEvent.objects.claim(batch_size, max_attempts=max_attempts)
+    if not events:
+        return 0
+
+    oldest_allowed = int(time.time()) - MAX_EVENT_AGE_SECONDS
+    deliverable = []
+    for meta_event in events:
+        if meta_event.event_time < oldest_allowed:
+            meta_event.mark_failed("Event expired before delivery.", max_attempts=0)
+        else:
+            deliverable.append(meta_event)
+
+    invalid = []
+    failures = []
+    if deliverable:
+        service = MetaConversionService()
+        built, invalid = _build_events(service, deliverable)
+        if built:
+            failures = _deliver(service, built)
+
+    for meta_event, error in invalid:
+        meta_event.mark_failed(f"Invalid event: {error}", max_attempts=0)
+        logger.error(f"Invalid Meta Pixel Event {meta_event.event_id}: {error}")
+
+    failed_ids = {meta_event.pk for meta_event, _ in invalid + failures}
+    MetaEvent.objects.filter(
+        pk__in=[e.pk for e in deliverable if e.pk not in failed_ids]
+    ).mark_completed()
+
+    for meta_event, error in failures:
+        status = meta_event.mark_failed(
+            error,
+            max_attempts=0 if _is_event_error(error) else max_attempts,
+            backoff_seconds=backoff_seconds,
+        )
+        logger.error(
+            f"An error occurred when sending a Meta Pixel Event "
+            f"{meta_event.event_id} (attempt {meta_event.attempts}, now {status}): {error}"
+        )
+
+    sent = len(deliverable) - len(failed_ids)
+    delivery_metrics.record_batch(sent, len(events) - sent)
+    logger.info(f"Meta batch delivered: {sent}/{len(events)} events sent.")
+
+    return len(events)
+
+
+def purge_meta_events(batch_size=1000):
+    """
+    Deletes delivered and dead-lettered events past their retention, in
+    batches so no single DELETE holds locks for long. Returns the number of
+    events deleted.
+    """
+    now = timezone.now()
+    expired = MetaEvent.objects.filter(
+        Q(
+            status=MetaEvent.Status.COMPLETED,
+            created_at__lt=now - COMPLETED_EVENT_RETENTION,
+        )
+        | Q(status=MetaEvent.Status.DEAD, created_at__lt=now - DEAD_EVENT_RETENTION)
+    )
+
+    deleted = 0
+    while True:
+        ids = list(expired.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += MetaEvent.objects.filter(pk__in=ids).delete()[0]
+
+
+def record_catalogue_changes(skus):
+    """
+    Queues the given skus for a delta sync to the Meta catalogue. An sku that
+    is already queued is re-armed rather than duplicated, so repeated edits
+    coalesce into one update. An sku a worker is pushing right now only has
+    its `changed_at` bumped; the worker re-queues it when it finishes, so
+    two workers never push the same sku at once.
+
+    Bulk `QuerySet.update()` calls bypass model signals and must call this
+    themselves.
+    """
+    if not settings.META_CATALOGUE_ID:
+        return
+
+    skus = set(skus)
+    if not skus:
+        return
+
+    now = timezone.now()
+    CatalogueSyncItem.objects.bulk_create(
+        [CatalogueSyncItem(sku=sku, changed_at=now, available_at=now) for sku in skus],
+        ignore_conflicts=True,
+    )
+
+    # One statement, so an item cannot finish between reading its status and
+    # re-arming it.
+    Status = CatalogueSyncItem.Status
+    in_flight = Q(status=Status.PROCESSING)
+    CatalogueSyncItem.objects.filter(sku__in=skus).update(
+        changed_at=now,
+        status=Case(When(in_flight, then=F("status")), default=Value(Status.PENDING)),
+        attempts=Case(When(in_flight, then=F("attempts")), default=Value(0)),
+        available_at=Case(When(in_flight, then=F("available_at")), default=Value(now)),
+    )
+
+
+def process_catalogue_sync_batch(
+    batch_size=1000,
+    max_attempts=6,
+    backoff_seconds=30,
+):
+    """
+    Claims up to `batch_size` queued skus and pushes their current state to
+    the Meta catalogue in a single batch request. Returns the number of skus
+    handled.
+    """
+    items = CatalogueSyncItem.objects.claim(batch_size, max_attempts=max_attempts)
+    if not items:
+        return 0
+
+    claimed_at = items[0].locked_at
+
+    try:
+        MetaCatalogueSyncService().push(item.sku for item in items)
+    except Exception as e:
+        for item in items:
+            status = item.mark_failed(
+                e,
+                max_attempts=0 if _is_permanent_error(e) else max_attempts,
+                backoff_seconds=backoff_seconds,
+            )
+        logger.error(
+            f"An error occurred when syncing {len(items)} catalogue items "
+            f"(attempt {items[0].attempts}, now {status}): {e}"
+        )
+        return len(items)
+
+    # Items edited again while the request was in flight had their
+    # `changed_at` bumped by `record_catalogue_changes` and go back in the
+    # queue to push the newer state.
+    pushed = CatalogueSyncItem.objects.filter(pk__in=[item.pk for item in items])
+    pushed.filter(changed_at__lte=claimed_at).mark_completed()
+    pushed.filter(changed_at__gt=claimed_at).update(
+        status=CatalogueSyncItem.Status.PENDING,
+        attempts=0,
+        available_at=timezone.now(),
+        locked_at=None,
+    )
+
+    logger.info(f"Meta catalogue sync: {len(items)} items pushed.")
+    return len(items)
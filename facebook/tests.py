@@ -1 +1,267 @@
-# Create your tests here.
+import gzip
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from facebook_business.exceptions import FacebookRequestError
+
+from facebook.models import CatalogueFeedRow, CatalogueSyncItem, MetaEvent
+from facebook.services.meta_catalogue_service import MetaCatalogueService
+from facebook.services.meta_catalogue_sync_service import MetaCatalogueSyncService
+from facebook.services.meta_conversion_service import MetaConversionService
+from facebook.tasks import (
+    EventBacklog,
+    process_catalogue_sync_batch,
+    process_meta_event_batch,
+    purge_meta_events,
+    record_catalogue_changes,
+    send_meta_event_task,
+)
+from facebook.utils import build_user_context, hash_pii
+from products.models import Attribute, Product, ProductType, ProductVariant
+
+
+class CatalogueFeedFilesTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        size = Attribute.objects.create(name="Size", slug="size", choices=["S"])
+        product_type = ProductType.objects.create(name="Statue")
+        product_type.allowed_attributes.add(size)
+        cls.product = Product.objects.create(
+            product_type=product_type,
+            title="Statue",
+            status=Product.Status.PUBLISHED,
+            thumbnail="products/s.jpg",
+        )
+        cls.variant = ProductVariant.objects.create(
+            product=cls.product,
+            sku="STATUE",
+            price="10.00",
+            image="products/s.jpg",
+            attributes={"size": "S"},
+        )
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.service = MetaCatalogueService(
+            backend_domain="https://api.example.com",
+            frontend_domain="https://example.com",
+        )
+
+    def read_feed(self, feed_format, compressed=False):
+        path = self.service.get_feed_path(self.service.get_writer(feed_format).filename)
+        if compressed:
+            with gzip.open(f"{path}.gz", mode="rt", encoding="utf-8") as file:
+                return file.read()
+        with open(path, encoding="utf-8") as file:
+            return file.read()
+
+    def test_incremental_run_rewrites_gzipped_copies(self):
+        self.service.refresh_rows()
+        paths = self.service.write_feed_files(["meta"], compress=True)
+        self.assertEqual(len(paths), 2)
+        self.assertIn("10.00 USD", self.read_feed("meta", compressed=True))
+
+        self.variant.price = "12.00"
+        self.variant.save()
+        self.service.refresh_rows()
+        self.service.write_feed_files(["meta", "google"])
+
+        self.assertIn("12.00 USD", self.read_feed("meta"))
+        self.assertEqual(
+            self.read_feed("meta", compressed=True), self.read_feed("meta")
+        )
+        path = self.service.get_feed_path(self.service.get_writer("google").filename)
+        self.assertFalse(os.path.exists(f"{path}.gz"))
+
+    def test_rows_without_a_timestamp_are_not_stored(self):
+        rows = list(self.service.iter_rows())
+        self.service._store_rows(rows, {})
+        self.assertFalse(CatalogueFeedRow.objects.exists())
+
+
+def graph_error(http_status, code, subcode=None):
+    return FacebookRequestError(
+        "Request failed",
+        request_context={},
+        http_status=http_status,
+        http_headers={},
+        body=json.dumps({"error": {"code": code, "error_subcode": subcode}}),
+    )
+
+
+class MetaEventDeliveryTestCase(TestCase):
+    def setUp(self):
+        for event_id in ["1", "2", "3", "4"]:
+            MetaEvent.objects.create(
+                event_name="PageView",
+                event_id=event_id,
+                event_time=int(time.time()),
+                custom_data={"value": 1},
+            )
+        self.requests = []
+
+    def deliver(self, error_for):
+        def send_events(service, events):
+            self.requests.append([event.event_id for event in events])
+            error = error_for([event.event_id for event in events])
+            if error:
+                raise error
+
+        with mock.patch.object(
+            MetaConversionService, "send_events", send_events
+        ), self.assertLogs("facebook.tasks", "ERROR"):
+            process_meta_event_batch(max_batch_age_seconds=0)
+
+    def statuses(self):
+        return dict(MetaEvent.objects.values_list("event_id", "status"))
+
+    def test_bad_events_are_isolated(self):
+        MetaEvent.objects.filter(event_id="2").update(custom_data={"value": "x"})
+
+        self.deliver(lambda ids: graph_error(400, 100) if "3" in ids else None)
+
+        self.assertEqual(self.requests[0], ["1", "3", "4"])
+        self.assertEqual(
+            self.statuses(),
+            {
+                "1": MetaEvent.Status.COMPLETED,
+                "2": MetaEvent.Status.DEAD,
+                "3": MetaEvent.Status.DEAD,
+                "4": MetaEvent.Status.COMPLETED,
+            },
+        )
+
+    def test_auth_errors_fail_the_batch_for_retry(self):
+        self.deliver(lambda ids: graph_error(400, 190))
+
+        self.assertEqual(self.requests, [["1", "2", "3", "4"]])
+        self.assertEqual(set(self.statuses().values()), {MetaEvent.Status.PENDING})
+
+
+class MetaEventRetentionTestCase(TestCase):
+    def create_event(self, event_id, status, age_days=0):
+        event = MetaEvent.objects.create(
+            event_name="PageView",
+            event_id=event_id,
+            event_time=int(time.time()),
+            status=status,
+        )
+        MetaEvent.objects.filter(pk=event.pk).update(
+            created_at=timezone.now() - timedelta(days=age_days)
+        )
+
+    def queue(self, event_name, event_id):
+        send_meta_event_task(event_name, event_id, {}, {}, None)
+
+    def test_purge_keeps_pending_and_recent_events(self):
+        Status = MetaEvent.Status
+        self.create_event("old-completed", Status.COMPLETED, age_days=8)
+        self.create_event("new-completed", Status.COMPLETED, age_days=1)
+        self.create_event("old-dead", Status.DEAD, age_days=31)
+        self.create_event("new-dead", Status.DEAD, age_days=8)
+        self.create_event("old-pending", Status.PENDING, age_days=31)
+
+        self.assertEqual(purge_meta_events(batch_size=1), 2)
+        self.assertEqual(
+            set(MetaEvent.objects.values_list("event_id", flat=True)),
+            {"new-completed", "new-dead", "old-pending"},
+        )
+
+    @override_settings(META_EVENT_MAX_BACKLOG=1)
+    def test_full_backlog_drops_all_but_purchases(self):
+        with mock.patch("facebook.tasks.event_backlog", EventBacklog()):
+            self.queue("PageView", "1")
+            self.queue("PageView", "2")
+            with mock.patch("time.monotonic", return_value=time.monotonic() + 60):
+                with self.assertLogs("facebook.tasks", "WARNING"):
+                    self.queue("PageView", "3")
+                self.queue("Purchase", "4")
+
+        self.assertEqual(
+            list(MetaEvent.objects.order_by("pk").values_list("event_id", flat=True)),
+            ["1", "2", "4"],
+        )
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class UserIdentityTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="ada", email="ada@example.com", password="password"
+        )
+
+    def hashed_email(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        return build_user_context(request).email
+
+    def test_changing_the_email_drops_the_cached_identity(self):
+        self.assertEqual(self.hashed_email(), hash_pii("ada@example.com"))
+
+        self.user.email = "ada@lovelace.example"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        self.assertEqual(self.hashed_email(), hash_pii("ada@lovelace.example"))
+
+
+@override_settings(META_CATALOGUE_ID="1")
+class CatalogueSyncQueueTestCase(TestCase):
+    def statuses(self):
+        return dict(CatalogueSyncItem.objects.values_list("sku", "status"))
+
+    def test_items_edited_mid_push_are_requeued(self):
+        record_catalogue_changes(["A", "B"])
+
+        def push(service, skus):
+            self.assertEqual(sorted(skus), ["A", "B"])
+            # Edited while the batch is in flight: must not be claimable yet.
+            record_catalogue_changes(["A"])
+            self.assertEqual(self.statuses()["A"], CatalogueSyncItem.Status.PROCESSING)
+
+        with mock.patch.object(MetaCatalogueSyncService, "__init__", return_value=None):
+            with mock.patch.object(MetaCatalogueSyncService, "push", push):
+                process_catalogue_sync_batch()
+
+        self.assertEqual(
+            self.statuses(),
+            {
+                "A": CatalogueSyncItem.Status.PENDING,
+                "B": CatalogueSyncItem.Status.COMPLETED,
+            },
+        )
+
+    def test_renamed_sku_is_queued_for_removal(self):
+        size = Attribute.objects.create(name="Size", slug="size", choices=["S"])
+        product_type = ProductType.objects.create(name="Statue")
+        product_type.allowed_attributes.add(size)
+        variant = ProductVariant.objects.create(
+            product=Product.objects.create(
+                product_type=product_type, title="Statue", thumbnail="products/s.jpg"
+            ),
+            sku="OLD",
+            price="10.00",
+            image="products/s.jpg",
+            attributes={"size": "S"},
+        )
+        CatalogueSyncItem.objects.all().delete()
+
+        variant.sku = "NEW"
+        variant.save()
+
+        self.assertEqual(set(self.statuses()), {"OLD", "NEW"})
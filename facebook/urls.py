@@ -2,8 +2,8 @@ from django.urls import path
 
 from .views import (
     AddToCartView,
+    CatalogueFeedView,
     InitiateCheckoutView,
-    MetaCatalogFeedView,
     PurchaseView,
     ViewContentView,
 )
@@ -19,5 +19,25 @@ urlpatterns = [
         name="initiate_checkout",
     ),
     path("conversions/purchase/", PurchaseView.as_view(), name="purchase"),
-    path("catalogue/feed/", MetaCatalogFeedView.as_view(), name="meta_catalogue_feed"),
+    path("catalogue/feed/", CatalogueFeedView.as_view(), name="meta_catalogue_feed"),
+    path(
+        "catalogue/feed.csv.gz",
+        CatalogueFeedView.as_view(compressed=True),
+        name="meta_catalogue_feed_gzip",
+    ),
+    path(
+        "catalogue/google.xml",
+        CatalogueFeedView.as_view(feed_format="google"),
+        name="google_merchant_feed",
+    ),
+    path(
+        "catalogue/google.xml.gz",
+        CatalogueFeedView.as_view(feed_format="google", compressed=True),
+        name="google_merchant_feed_gzip",
+    ),
+    path(
+        "catalogue/products.jsonl",
+        CatalogueFeedView.as_view(feed_format="jsonl"),
+        name="products_jsonl_feed",
+    ),
 ]
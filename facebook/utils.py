@@ -1,13 +1,93 @@
-from facebook.schemas.meta_conversion_schemas import MetaUserData
+import hashlib
+from typing import Optional
 
+from django.core.cache import cache
 
-def build_user_context(request) -> MetaUserData:
+from facebook.models import MetaOrderUserData
+from facebook.schemas.meta_conversion_schemas import (
+    PII_FIELDS,
+    MetaHashedUserData,
+    MetaUserData,
+)
+
+IDENTITY_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def hash_pii(data: str) -> Optional[str]:
+    """SHA256 hashing required by Meta."""
+    if not data:
+        return None
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def hash_user_data(data: MetaUserData) -> MetaHashedUserData:
+    """Hashes the (already normalized) PII fields of `data`."""
+    values = data.model_dump()
+    for field in PII_FIELDS:
+        values[field] = hash_pii(values[field])
+    return MetaHashedUserData(**values)
+
+
+def get_identity_cache_key(user_id) -> str:
+    return f"meta:identity:user:{user_id}"
+
+
+def _get_hashed_identity(user):
+    """
+    Hashed PII of an authenticated user, computed once and then served from
+    the cache for every later event of that user. Only the hashes are
+    cached; saving the user drops them.
+    """
+    cache_key = get_identity_cache_key(user.id)
+    identity = cache.get(cache_key)
+
+    if identity is None:
+        hashed = hash_user_data(
+            MetaUserData(email=user.email, external_id=str(user.id))
+        )
+        identity = hashed.model_dump(include={"email", "external_id"})
+        cache.set(cache_key, identity, IDENTITY_CACHE_TIMEOUT)
+
+    return identity
+
+
+def build_user_context(request) -> MetaHashedUserData:
     """Helper to extract standard request data into our Pydantic Model"""
-    return MetaUserData(
+    identity = {}
+    if request.user.is_authenticated:
+        identity = _get_hashed_identity(request.user)
+
+    return MetaHashedUserData(
         client_ip_address=request.META.get("REMOTE_ADDR"),
         client_user_agent=request.META.get("HTTP_USER_AGENT"),
         fbp=request.COOKIES.get("_fbp"),
         fbc=request.COOKIES.get("_fbc"),
-        email=request.user.email if request.user.is_authenticated else None,
-        external_id=str(request.user.id) if request.user.is_authenticated else None,
+        **identity,
+    )
+
+
+def build_order_identity(order) -> dict:
+    """Hashed PII of the customer who placed `order`."""
+    addr = order.shipping_address
+    user_data = MetaUserData(
+        email=order.email,
+        first_name=addr.first_name,
+        last_name=addr.last_name,
+        phone=addr.phone,
+        city=addr.city,
+        state=addr.state,
+        zip_code=addr.postal_code,
+        country=str(addr.country),
+    )
+
+    return hash_user_data(user_data).model_dump(include=set(PII_FIELDS))
+
+
+def save_order_user_data(order):
+    """
+    Stores the hashed identity of the order's customer at checkout so that the
+    Purchase event can be sent without normalizing or hashing anything.
+    """
+    MetaOrderUserData.objects.update_or_create(
+        order=order, defaults={"user_data": build_order_identity(order)}
     )
@@ -1,15 +1,23 @@
+import os
+
 from django.conf import settings
-from django.http import StreamingHttpResponse
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import Q, Value
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.views import View
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from carts.models import Cart
+from carts.constants import CART_SESSION_COOKIE_LABEL
+from carts.models import Cart, CartItem
+from common.responses import ranged_file_response
+from common.utils import get_session_key
 from orders.models import Order
-from products.models import Product, ProductVariant
+from products.cache import get_product_summary, get_variant_summary
 
+from .models import MetaOrderUserData
 from .schemas.meta_conversion_schemas import MetaCustomData
 from .serializers import (
     AddToCartSerializer,
@@ -19,7 +27,7 @@ from .serializers import (
 )
 from .services.meta_catalogue_service import MetaCatalogueService
 from .tasks import send_meta_event_task
-from .utils import build_user_context
+from .utils import build_order_identity, build_user_context
 
 
 class BaseFacebookView(APIView):
@@ -43,18 +51,27 @@ class ViewContentView(BaseFacebookView):
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
 
-        product = get_object_or_404(Product, slug=data["product_slug"])
-        price = product.base_price
-        content_id = str(product.id)
-
+        variant = None
         if data.get("variant_sku"):
-            variant = ProductVariant.objects.filter(sku=data["variant_sku"]).first()
-            if variant:
-                price = variant.price
-                content_id = str(variant.id)
+            variant = get_variant_summary(data["variant_sku"])
+
+        if variant and variant["product_slug"] == data["product_slug"]:
+            content_name = variant["product_title"]
+        else:
+            product = get_product_summary(data["product_slug"])
+            if product is None:
+                raise Http404("Product not found.")
+            content_name = product["title"]
+
+        if variant:
+            price = variant["price"]
+            content_id = str(variant["id"])
+        else:
+            price = product["base_price"]
+            content_id = str(product["id"])
 
         custom_data = MetaCustomData(
-            content_name=product.title, content_ids=[content_id], value=float(price)
+            content_name=content_name, content_ids=[content_id], value=float(price)
         )
 
         self.dispatch_event(
@@ -73,12 +90,14 @@ class AddToCartView(BaseFacebookView):
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
 
-        variant = get_object_or_404(ProductVariant, sku=data["variant_sku"])
+        variant = get_variant_summary(data["variant_sku"])
+        if variant is None:
+            raise Http404("Product variant not found.")
 
         custom_data = MetaCustomData(
-            content_name=variant.product.title,
-            content_ids=[str(variant.id)],
-            value=float(variant.price) * data["quantity"],
+            content_name=variant["product_title"],
+            content_ids=[str(variant["id"])],
+            value=float(variant["price"]) * data["quantity"],
         )
 
         self.dispatch_event(
@@ -97,8 +116,8 @@ class InitiateCheckoutView(BaseFacebookView):
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
 
-        session_key = request.session.session_key
-        if not session_key:
+        cart_session_key = get_session_key(request, CART_SESSION_COOKIE_LABEL, False)
+        if not cart_session_key:
             return Response(
                 {
                     "detail": "Session cookie missing.",
@@ -107,16 +126,20 @@ class InitiateCheckoutView(BaseFacebookView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        cart = get_object_or_404(
-            Cart, session_key=request.session.session_key, status="ACTIVE"
+        items = list(
+            CartItem.objects.filter(
+                cart__session_key=cart_session_key, cart__status=Cart.Status.ACTIVE
+            ).values_list("product_variant_id", "quantity", "product_variant__price")
         )
+        if not items:
+            raise Http404("Cart not found.")
 
-        content_ids = [str(item.product_variant.id) for item in cart.items.all()]
+        content_ids = [str(variant_id) for variant_id, _, _ in items]
 
         custom_data = MetaCustomData(
             content_ids=content_ids,
             num_items=len(content_ids),
-            value=float(cart.total_price),
+            value=float(sum(price * quantity for _, quantity, price in items)),
         )
 
         self.dispatch_event(
@@ -135,25 +158,26 @@ class PurchaseView(BaseFacebookView):
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
 
-        order = get_object_or_404(Order, order_number=data["order_number"])
-
-        user_context = build_user_context(request)
-        if order.shipping_address:
-            addr = order.shipping_address
-            user_context.email = order.email
-            user_context.first_name = addr.first_name
-            user_context.last_name = addr.last_name
-            user_context.phone = addr.phone
-            user_context.city = addr.city
-            user_context.state = addr.state
-            user_context.zip_code = addr.postal_code
-            user_context.country = str(addr.country)
-
-        content_ids = [
-            str(item.product_variant.id)
-            for item in order.items.all()
-            if item.product_variant
-        ]
+        order = get_object_or_404(
+            Order.objects.select_related("meta_user_data", "shipping_address").annotate(
+                variant_ids=ArrayAgg(
+                    "items__product_variant_id",
+                    filter=Q(items__product_variant__isnull=False),
+                    default=Value([]),
+                )
+            ),
+            order_number=data["order_number"],
+        )
+
+        try:
+            identity = order.meta_user_data.user_data
+        except MetaOrderUserData.DoesNotExist:
+            # Orders placed before identities were captured at checkout.
+            identity = build_order_identity(order)
+
+        user_context = build_user_context(request).model_copy(update=identity)
+
+        content_ids = [str(variant_id) for variant_id in order.variant_ids]
 
         custom_data = MetaCustomData(
             value=float(order.total_amount),
@@ -172,22 +196,44 @@ class PurchaseView(BaseFacebookView):
         return Response({"status": "tracked"})
 
 
-class MetaCatalogFeedView(View):
-    filename = "meta_catalog.csv"
+class CatalogueFeedView(View):
+    """
+    Serves a pre-generated product feed (see `generate_meta_catalogue`),
+    falling back to streaming it from the database when it has not been
+    generated yet. Compressed feeds are only served from disk.
+    """
 
-    def get(self, request, *args, **kwargs):
-        domain = settings.BACKEND_BASE_URL
+    feed_format = "meta"
+    compressed = False
 
+    def get(self, request, *args, **kwargs):
         service = MetaCatalogueService(
             backend_domain=settings.BACKEND_BASE_URL,
             frontend_domain=settings.FRONTEND_BASE_URL,
             currency="EUR",
-            brand_name="Sculpturesly",
+            brand_name=settings.BRAND_NAME,
         )
+        writer = service.get_writer(self.feed_format)
+
+        filename = writer.filename
+        content_type = writer.content_type
+        if self.compressed:
+            filename = f"{filename}.gz"
+            content_type = "application/gzip"
+
+        feed_path = service.get_feed_path(filename)
+        if os.path.exists(feed_path):
+            return ranged_file_response(
+                request, feed_path, content_type, filename=filename
+            )
+
+        if self.compressed:
+            raise Http404("The compressed feed has not been generated yet.")
 
         response = StreamingHttpResponse(
-            service.generate_feed(save_to_file=False), content_type="text/csv"
+            service.generate_feed(save_to_file=False, feed_format=self.feed_format),
+            content_type=content_type,
         )
 
-        response["Content-Disposition"] = f'attachment; filename="{self.filename}"'
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
         return response
@@ -2,6 +2,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
 
+from common.admin import IndexedSearchMixin
+
 from .models import Order, OrderAddress, OrderItem
 
 
@@ -35,7 +37,7 @@ class OrderItemInline(admin.TabularInline):
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = [
         "order_number",
         "email",
@@ -55,8 +57,8 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = [
         "order_number",
         "email",
-        "id",
-        "stripe_payment_intent_id",
+        "=id",
+        "=stripe_payment_intent_id",
         "shipping_address__first_name",
         "shipping_address__last_name",
         "shipping_address__email",
@@ -146,7 +148,7 @@ class OrderAdmin(admin.ModelAdmin):
 
 
 @admin.register(OrderAddress)
-class OrderAddressAdmin(admin.ModelAdmin):
+class OrderAddressAdmin(IndexedSearchMixin, admin.ModelAdmin):
     """
     Usually accessed via the Order inline, but useful to have separate
     if you need to search specifically for an address across all orders.
@@ -154,10 +156,16 @@ class OrderAddressAdmin(admin.ModelAdmin):
 
     list_display = ["full_name", "email", "city", "country", "created_at"]
 
-    search_fields = ["first_name", "last_name", "email", "address_line_1", "zip_code"]
+    search_fields = [
+        "first_name",
+        "last_name",
+        "email",
+        "address_line_1",
+        "postal_code",
+    ]
 
     list_filter = ["country", "created_at"]
 
     @admin.display(description="Full Name")
     def full_name(self, obj):
-        return f
+        return f"{obj.first_name} {obj.last_name}"
@@ -0,0 +1,324 @@
+import logging
+
+import numpy as np
+from django.core.cache import cache
+from django.db import connection, transaction
+from scipy import sparse
+
+from orders.models import (
+    BoughtTogether,
+    Order,
+    OrderItem,
+    VariantOrderCount,
+    VariantPairCount,
+)
+from products.models import Product
+
+logger = logging.getLogger(__name__)
+
+CACHE_TIMEOUT = 60 * 15
+TOTAL_ORDERS_CACHE_KEY = "orders:bought-together:total-orders"
+
+
+def _cache_key(variant_id):
+    return f"orders:bought-together:{variant_id}"
+
+
+# --- Mining ---
+
+
+def _add_counts(variant_ids, order_counts, pairs, pair_counts):
+    """Adds the batch's counts to the running totals in two statements."""
+    with connection.cursor() as cursor:
+        table = VariantOrderCount._meta.db_table
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (variant_id, order_count)
+            SELECT * FROM unnest(%s::bigint[], %s::integer[])
+            ON CONFLICT (variant_id) DO UPDATE
+            SET order_count = {table}.order_count + EXCLUDED.order_count
+            """,
+            [variant_ids, order_counts],
+        )
+        if not pairs:
+            return
+
+        table = VariantPairCount._meta.db_table
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (variant_id, companion_id, order_count)
+            SELECT * FROM unnest(%s::bigint[], %s::bigint[], %s::integer[])
+            ON CONFLICT (variant_id, companion_id) DO UPDATE
+            SET order_count = {table}.order_count + EXCLUDED.order_count
+            """,
+            [[a for a, _ in pairs], [b for _, b in pairs], pair_counts],
+        )
+
+
+def count_new_orders(batch_size=5000):
+    """
+    Adds up to `batch_size` paid orders that were not counted yet to the
+    variant and pair counts, and flags them, in one transaction.
+
+    The batch is an order x variant incidence matrix B: column sums are the
+    per-variant order counts and B.T @ B holds the pair counts.
+
+    Returns (orders counted, ids of the variants they contain).
+    """
+    with transaction.atomic():
+        order_ids = list(
+            Order.objects.select_for_update(skip_locked=True)
+            .filter(is_paid=True, bought_together_counted=False)
+            .order_by("created_at")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return 0, set()
+
+        lines = list(
+            OrderItem.objects.filter(
+                order_id__in=order_ids, product_variant__isnull=False
+            )
+            .values_list("order_id", "product_variant_id")
+            .distinct()
+        )
+
+        if lines:
+            order_index = {order_id: i for i, order_id in enumerate(order_ids)}
+            variant_ids = sorted({variant_id for _, variant_id in lines})
+            variant_index = {variant_id: i for i, variant_id in enumerate(variant_ids)}
+
+            incidence = sparse.csr_matrix(
+                (
+                    np.ones(len(lines), dtype=np.int32),
+                    (
+                        [order_index[order_id] for order_id, _ in lines],
+                        [variant_index[variant_id] for _, variant_id in lines],
+                    ),
+                ),
+                shape=(len(order_ids), len(variant_ids)),
+            )
+            order_counts = np.asarray(incidence.sum(axis=0)).ravel()
+
+            co_occurrence = (incidence.T @ incidence).tocoo()
+            off_diagonal = co_occurrence.row != co_occurrence.col
+            ids = np.asarray(variant_ids, dtype=np.int64)
+            pairs = list(
+                zip(
+                    ids[co_occurrence.row[off_diagonal]].tolist(),
+                    ids[co_occurrence.col[off_diagonal]].tolist(),
+                )
+            )
+
+            _add_counts(
+                variant_ids,
+                order_counts.tolist(),
+                pairs,
+                co_occurrence.data[off_diagonal].tolist(),
+            )
+        else:
+            variant_ids = []
+
+        Order.objects.filter(pk__in=order_ids).update(bought_together_counted=True)
+        transaction.on_commit(lambda: cache.delete(TOTAL_ORDERS_CACHE_KEY))
+
+    return len(order_ids), set(variant_ids)
+
+
+def refresh_companions(variant_ids, top_n=10, min_orders=2):
+    """
+    Recomputes the top companions of `variant_ids` and of every variant
+    paired with them. A list stores the pair counts and the counts of the
+    variant and its companions, and lift only adds a factor common to every
+    list (the number of counted orders), so lists without a counted variant
+    are unchanged. Returns the number of variants refreshed.
+    """
+    variant_ids = set(variant_ids)
+    if not variant_ids:
+        return 0
+
+    affected = variant_ids | set(
+        VariantPairCount.objects.filter(companion_id__in=variant_ids).values_list(
+            "variant_id", flat=True
+        )
+    )
+
+    pairs = np.asarray(
+        VariantPairCount.objects.filter(
+            variant_id__in=affected,
+            order_count__gte=min_orders,
+            companion__product__status=Product.Status.PUBLISHED,
+        ).values_list("variant_id", "companion_id", "order_count"),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+
+    rows = []
+    if len(pairs):
+        counts = dict(
+            VariantOrderCount.objects.filter(
+                variant_id__in=np.unique(pairs[:, :2]).tolist()
+            ).values_list("variant_id", "order_count")
+        )
+        lookup = np.vectorize(lambda variant_id: counts.get(variant_id, 0))
+
+        variant, companion, together = pairs[:, 0], pairs[:, 1], pairs[:, 2]
+        variant_orders = lookup(variant).astype(np.float64)
+        companion_orders = lookup(companion).astype(np.float64)
+
+        confidence = together / variant_orders
+        affinity = together / (variant_orders * companion_orders)
+
+        # Group by variant, best lift first, more shared orders on ties.
+        order = np.lexsort((-together, -affinity, variant))
+        variant, companion, together = variant[order], companion[order], together[order]
+        confidence, affinity = confidence[order], affinity[order]
+
+        starts = np.r_[0, np.flatnonzero(np.diff(variant)) + 1]
+        ranks = np.arange(len(variant)) - np.repeat(
+            starts, np.diff(np.r_[starts, len(variant)])
+        )
+
+        # Whether lift is above 1 depends on the number of orders, so that
+        # cut is made when the list is read.
+        for i in np.flatnonzero(ranks < top_n):
+            rows.append(
+                BoughtTogether(
+                    variant_id=int(variant[i]),
+                    companion_id=int(companion[i]),
+                    rank=int(ranks[i]) + 1,
+                    order_count=int(together[i]),
+                    confidence=float(confidence[i]),
+                    affinity=float(affinity[i]),
+                )
+            )
+
+    with transaction.atomic():
+        BoughtTogether.objects.filter(variant_id__in=affected).delete()
+        BoughtTogether.objects.bulk_create(rows, batch_size=5000)
+        transaction.on_commit(lambda: invalidate_bought_together(affected))
+
+    return len(affected)
+
+
+def rebuild_counts():
+    """Forgets all counts, so every paid order is counted again."""
+    with transaction.atomic():
+        variant_ids = set(
+            BoughtTogether.objects.values_list("variant_id", flat=True).distinct()
+        )
+        VariantPairCount.objects.all().delete()
+        VariantOrderCount.objects.all().delete()
+        BoughtTogether.objects.all().delete()
+        Order.objects.filter(bought_together_counted=True).update(
+            bought_together_counted=False
+        )
+        transaction.on_commit(lambda: invalidate_bought_together(variant_ids))
+        transaction.on_commit(lambda: cache.delete(TOTAL_ORDERS_CACHE_KEY))
+
+
+def process_bought_together_batch(batch_size=5000, top_n=10, min_orders=2):
+    """
+    Counts one batch of new paid orders and refreshes the companions they
+    affect. Returns the number of orders counted.
+    """
+    counted, variant_ids = count_new_orders(batch_size)
+    if counted:
+        refreshed = refresh_companions(variant_ids, top_n, min_orders)
+        logger.info(
+            f"Bought together: {counted} orders counted, "
+            f"{refreshed} variants refreshed."
+        )
+    return counted
+
+
+# --- Serving ---
+
+
+def get_counted_orders():
+    """Read-through cache of the number of orders in the counts."""
+    total = cache.get(TOTAL_ORDERS_CACHE_KEY)
+    if total is None:
+        total = Order.objects.filter(bought_together_counted=True).count()
+        cache.set(TOTAL_ORDERS_CACHE_KEY, total, CACHE_TIMEOUT)
+    return total
+
+
+def _with_lift(companions, total_orders):
+    """Swaps `affinity` for lift, keeping the companions with a lift above 1."""
+    result = []
+    for companion in companions:
+        lift = companion["affinity"] * total_orders
+        if lift > 1:
+            entry = {
+                key: value for key, value in companion.items() if key != "affinity"
+            }
+            entry["lift"] = round(lift, 3)
+            result.append(entry)
+    return result
+
+
+def get_bought_together(variant_ids):
+    """
+    Read-through cache of the companions of each variant, as
+    {variant id: [{"id", "sku", "price", "product_title", "product_slug",
+    "lift"}, ...]} in rank order.
+    """
+    variant_ids = list(dict.fromkeys(variant_ids))
+    keys = {_cache_key(variant_id): variant_id for variant_id in variant_ids}
+    cached = cache.get_many(list(keys))
+    companions = {keys[key]: value for key, value in cached.items()}
+
+    missing = [variant_id for variant_id in variant_ids if variant_id not in companions]
+    if missing:
+        found = {variant_id: [] for variant_id in missing}
+        for entry in (
+            BoughtTogether.objects.filter(
+                variant_id__in=missing,
+                companion__product__status=Product.Status.PUBLISHED,
+            )
+            .select_related("companion__product")
+            .order_by("variant_id", "rank")
+        ):
+            found[entry.variant_id].append(
+                {
+                    "id": entry.companion_id,
+                    "sku": entry.companion.sku,
+                    "price": entry.companion.price,
+                    "product_title": entry.companion.product.title,
+                    "product_slug": entry.companion.product.slug,
+                    "affinity": entry.affinity,
+                }
+            )
+        cache.set_many(
+            {_cache_key(variant_id): value for variant_id, value in found.items()},
+            CACHE_TIMEOUT,
+        )
+        companions.update(found)
+
+    total_orders = get_counted_orders()
+    return {
+        variant_id: _with_lift(entries, total_orders)
+        for variant_id, entries in companions.items()
+    }
+
+
+def get_companions(variant_ids, limit=10):
+    """
+    Companions of a set of variants (a cart, or a product's variants),
+    excluding the variants themselves, best lift first.
+    """
+    variant_ids = set(variant_ids)
+    best = {}
+    for companions in get_bought_together(variant_ids).values():
+        for companion in companions:
+            if companion["id"] in variant_ids:
+                continue
+            current = best.get(companion["id"])
+            if current is None or companion["lift"] > current["lift"]:
+                best[companion["id"]] = companion
+
+    return sorted(best.values(), key=lambda companion: -companion["lift"])[:limit]
+
+
+def invalidate_bought_together(variant_ids):
+    cache.delete_many([_cache_key(variant_id) for variant_id in variant_ids])
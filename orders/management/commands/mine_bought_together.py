@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+
+from common.workers import run_worker_pool
+from orders.bought_together import process_bought_together_batch, rebuild_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Mines frequently-bought-together variants from paid orders. Only "
+        "orders that were not counted yet are read, so runs are incremental."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Orders counted per transaction",
+        )
+        parser.add_argument(
+            "--top-n", type=int, default=10, help="Companions kept per variant"
+        )
+        parser.add_argument(
+            "--min-orders",
+            type=int,
+            default=2,
+            help="Orders a pair must share to be recommended",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=300.0,
+            help="Seconds to wait when there are no new paid orders",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Forget all counts and mine the whole order history again",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once all paid orders are counted instead of polling forever",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            rebuild_counts()
+            self.stdout.write("Cleared the bought-together counts.")
+
+        self.stdout.write("Mining bought-together pairs...")
+
+        # One worker: batches share variant counts and companion lists.
+        processed = run_worker_pool(
+            lambda: process_bought_together_batch(
+                options["batch_size"], options["top_n"], options["min_orders"]
+            ),
+            workers=1,
+            poll_interval=options["poll_interval"],
+            run_once=options["once"],
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"Counted {processed} orders."))
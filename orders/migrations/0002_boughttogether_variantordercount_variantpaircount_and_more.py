@@ -0,0 +1,131 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0001_initial"),
+        ("products", "0006_relatedproductsrefresh_relatedproduct"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BoughtTogether",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rank", models.PositiveSmallIntegerField()),
+                ("order_count", models.PositiveIntegerField()),
+                ("support", models.FloatField()),
+                ("confidence", models.FloatField()),
+                ("lift", models.FloatField()),
+            ],
+            options={
+                "ordering": ["variant", "rank"],
+            },
+        ),
+        migrations.CreateModel(
+            name="VariantOrderCount",
+            fields=[
+                (
+                    "variant",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="+",
+                        serialize=False,
+                        to="products.productvariant",
+                    ),
+                ),
+                ("order_count", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="VariantPairCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("order_count", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="bought_together_counted",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(
+                    ("bought_together_counted", False), ("is_paid", True)
+                ),
+                fields=["created_at"],
+                name="order_uncounted_paid_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="boughttogether",
+            name="companion",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="products.productvariant",
+            ),
+        ),
+        migrations.AddField(
+            model_name="boughttogether",
+            name="variant",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="bought_together",
+                to="products.productvariant",
+            ),
+        ),
+        migrations.AddField(
+            model_name="variantpaircount",
+            name="companion",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="products.productvariant",
+            ),
+        ),
+        migrations.AddField(
+            model_name="variantpaircount",
+            name="variant",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="products.productvariant",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="boughttogether",
+            constraint=models.UniqueConstraint(
+                fields=("variant", "rank"), name="unique_bought_together_rank"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="variantpaircount",
+            constraint=models.UniqueConstraint(
+                fields=("variant", "companion"), name="unique_variant_pair"
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:08
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently, so the tables stay writable.
+    atomic = False
+
+    dependencies = [
+        ("orders", "0002_boughttogether_variantordercount_variantpaircount_and_more"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name="order",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("order_number"),
+                    name="gin_trgm_ops",
+                ),
+                name="order_number_trgm",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="order",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("email"), name="gin_trgm_ops"
+                ),
+                name="order_email_trgm",
+            ),
+        ),
+    ]
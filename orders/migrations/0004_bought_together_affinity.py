@@ -0,0 +1,29 @@
+from django.db import migrations, models
+from django.db.models import F
+
+
+def lift_to_affinity(apps, schema_editor):
+    Order = apps.get_model("orders", "Order")
+    BoughtTogether = apps.get_model("orders", "BoughtTogether")
+    total_orders = Order.objects.filter(bought_together_counted=True).count()
+    if total_orders:
+        BoughtTogether.objects.update(affinity=F("lift") / total_orders)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0003_order_order_number_trgm_order_order_email_trgm"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="boughttogether",
+            name="affinity",
+            field=models.FloatField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(lift_to_affinity, migrations.RunPython.noop),
+        migrations.RemoveField(model_name="boughttogether", name="lift"),
+        migrations.RemoveField(model_name="boughttogether", name="support"),
+    ]
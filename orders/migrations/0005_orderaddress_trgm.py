@@ -0,0 +1,67 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:43
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently, so the table stays writable.
+    atomic = False
+
+    dependencies = [
+        ("orders", "0004_bought_together_affinity"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="orderaddress",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("first_name"),
+                    name="gin_trgm_ops",
+                ),
+                name="address_first_name_trgm",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="orderaddress",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("last_name"),
+                    name="gin_trgm_ops",
+                ),
+                name="address_last_name_trgm",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="orderaddress",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("email"), name="gin_trgm_ops"
+                ),
+                name="address_email_trgm",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="orderaddress",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("address_line_1"),
+                    name="gin_trgm_ops",
+                ),
+                name="address_address_line_1_trgm",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="orderaddress",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("postal_code"),
+                    name="gin_trgm_ops",
+                ),
+                name="address_postal_code_trgm",
+            ),
+        ),
+    ]
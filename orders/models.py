@@ -2,7 +2,9 @@ import secrets
 import string
 import uuid
 
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_countries.fields import CountryField
@@ -23,6 +25,31 @@ class OrderAddress(TimestampedModel):
     postal_code = models.CharField(max_length=20)
     country = CountryField()
 
+    class Meta:
+        # Admin search runs `icontains`, i.e. UPPER(...) LIKE '%...%'.
+        indexes = [
+            GinIndex(
+                OpClass(Upper("first_name"), name="gin_trgm_ops"),
+                name="address_first_name_trgm",
+            ),
+            GinIndex(
+                OpClass(Upper("last_name"), name="gin_trgm_ops"),
+                name="address_last_name_trgm",
+            ),
+            GinIndex(
+                OpClass(Upper("email"), name="gin_trgm_ops"),
+                name="address_email_trgm",
+            ),
+            GinIndex(
+                OpClass(Upper("address_line_1"), name="gin_trgm_ops"),
+                name="address_address_line_1_trgm",
+            ),
+            GinIndex(
+                OpClass(Upper("postal_code"), name="gin_trgm_ops"),
+                name="address_postal_code_trgm",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name} - {self.city}"
 
@@ -59,9 +86,26 @@ class Order(TimestampedModel):
         max_length=255, blank=True, db_index=True
     )
     is_paid = models.BooleanField(default=False)
+    # Set once the order's items were added to the bought-together counts.
+    bought_together_counted = models.BooleanField(default=False)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(is_paid=True, bought_together_counted=False),
+                name="order_uncounted_paid_idx",
+            ),
+            # Admin search runs `icontains`, i.e. UPPER(...) LIKE '%...%'.
+            GinIndex(
+                OpClass(Upper("order_number"), name="gin_trgm_ops"),
+                name="order_number_trgm",
+            ),
+            GinIndex(
+                OpClass(Upper("email"), name="gin_trgm_ops"), name="order_email_trgm"
+            ),
+        ]
 
     def __str__(self):
         return f"Order #{self.order_number} ({self.status})"
@@ -100,3 +144,73 @@ class OrderItem(models.Model):
         if not self.total_price and self.unit_price and self.quantity:
             self.total_price = self.unit_price * self.quantity
         super().save(*args, **kwargs)
+
+
+class VariantOrderCount(models.Model):
+    """Number of counted paid orders that contain a variant."""
+
+    variant = models.OneToOneField(
+        ProductVariant, on_delete=models.CASCADE, primary_key=True, related_name="+"
+    )
+    order_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.variant_id}: {self.order_count}"
+
+
+class VariantPairCount(models.Model):
+    """
+    Number of counted paid orders that contain both variants. Pairs are
+    stored in both directions, so a variant's pairs are one index range.
+    """
+
+    variant = models.ForeignKey(
+        ProductVariant, on_delete=models.CASCADE, related_name="+"
+    )
+    companion = models.ForeignKey(
+        ProductVariant, on_delete=models.CASCADE, related_name="+"
+    )
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["variant", "companion"], name="unique_variant_pair"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.variant_id} + {self.companion_id}: {self.order_count}"
+
+
+class BoughtTogether(models.Model):
+    """
+    A variant's top companions by lift, see `orders.bought_together`.
+
+    Only values that don't depend on the total number of orders are stored,
+    so lists stay exact while orders are added: lift is `affinity` times
+    the number of counted orders, worked out when the list is read.
+    """
+
+    variant = models.ForeignKey(
+        ProductVariant, on_delete=models.CASCADE, related_name="bought_together"
+    )
+    companion = models.ForeignKey(
+        ProductVariant, on_delete=models.CASCADE, related_name="+"
+    )
+    rank = models.PositiveSmallIntegerField()
+    order_count = models.PositiveIntegerField()
+    confidence = models.FloatField()
+    # Shared orders / (variant orders x companion orders).
+    affinity = models.FloatField()
+
+    class Meta:
+        ordering = ["variant", "rank"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["variant", "rank"], name="unique_bought_together_rank"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.variant_id} #{self.rank} -> {self.companion_id}"
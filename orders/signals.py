@@ -0,0 +1,42 @@
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from orders.bought_together import invalidate_bought_together
+from orders.models import BoughtTogether
+from products.models import Product, ProductVariant
+from products.signals import catalogue_bulk_changed
+
+# Cached companion lists embed each companion's sku and price, and its
+# product's title, slug and published state.
+
+
+def invalidate_lists_containing(companions):
+    invalidate_bought_together(
+        BoughtTogether.objects.filter(companion__in=companions)
+        .values_list("variant_id", flat=True)
+        .distinct()
+    )
+
+
+@receiver(post_save, sender=ProductVariant)
+def invalidate_variant_bought_together(sender, instance, **kwargs):
+    invalidate_lists_containing([instance.pk])
+
+
+@receiver(pre_delete, sender=ProductVariant)
+def invalidate_deleted_variant_bought_together(sender, instance, **kwargs):
+    # Before the delete, while the cascaded rows still say which lists to drop.
+    invalidate_lists_containing([instance.pk])
+    invalidate_bought_together([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def invalidate_product_bought_together(sender, instance, **kwargs):
+    invalidate_lists_containing(instance.variants.values("pk"))
+
+
+@receiver(catalogue_bulk_changed)
+def invalidate_bulk_changed_bought_together(sender, skus=(), **kwargs):
+    if not skus:
+        return
+    invalidate_lists_containing(ProductVariant.objects.filter(sku__in=skus))
@@ -1 +1,197 @@
-# Create your tests here.
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from orders.bought_together import get_companions, process_bought_together_batch
+from orders.models import Order, OrderAddress, OrderItem
+from products.models import Attribute, Product, ProductType, ProductVariant
+
+
+class OrderAddressAdminTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            username="admin", email="admin@example.com", password="password"
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse("admin:orders_orderaddress_changelist")
+
+    def create_addresses(self, count):
+        OrderAddress.objects.bulk_create(
+            [
+                OrderAddress(
+                    first_name="Ada",
+                    last_name=f"Lovelace {i}",
+                    email=f"ada{i}@example.com",
+                    address_line_1="1 Main Street",
+                    city="London",
+                    state="London",
+                    postal_code=f"N{i}",
+                    country="GB",
+                )
+                for i in range(count)
+            ]
+        )
+
+    def test_changelist_query_count_is_constant(self):
+        self.create_addresses(1)
+        with CaptureQueriesContext(connection) as baseline:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        self.create_addresses(4)
+        with self.assertNumQueries(len(baseline)):
+            response = self.client.get(self.url)
+        self.assertContains(response, "Ada Lovelace 3")
+
+    def test_search_by_postal_code(self):
+        self.create_addresses(3)
+        response = self.client.get(self.url, {"q": "N2"})
+        self.assertContains(response, "Ada Lovelace 2")
+        self.assertNotContains(response, "Ada Lovelace 1")
+
+
+class OrderAdminSearchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            username="admin", email="admin@example.com", password="password"
+        )
+        cls.orders = []
+        for name in ["Lovelace", "Hopper"]:
+            address = OrderAddress.objects.create(
+                first_name="Customer",
+                last_name=name,
+                email=f"{name.lower()}@example.com",
+                address_line_1="1 Main Street",
+                city="London",
+                state="London",
+                postal_code="N1",
+                country="GB",
+            )
+            cls.orders.append(
+                Order.objects.create(
+                    email=f"{name.lower()}@example.com",
+                    total_amount="10.00",
+                    shipping_address=address,
+                    stripe_payment_intent_id=f"pi_{name.lower()}",
+                )
+            )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def search(self, term):
+        response = self.client.get(
+            reverse("admin:orders_order_changelist"), {"q": term}
+        )
+        self.assertEqual(response.status_code, 200)
+        return list(response.context["cl"].result_list)
+
+    def test_search_by_customer_name(self):
+        self.assertEqual(self.search("lovelace"), [self.orders[0]])
+
+    def test_search_by_exact_identifiers(self):
+        lovelace, hopper = self.orders
+        self.assertEqual(self.search("pi_hopper"), [hopper])
+        self.assertEqual(self.search(str(lovelace.pk)), [lovelace])
+        # Identifiers only match whole.
+        self.assertEqual(self.search("pi_"), [])
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class BoughtTogetherTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        size = Attribute.objects.create(name="Size", slug="size", choices=["S"])
+        product_type = ProductType.objects.create(name="Statue")
+        product_type.allowed_attributes.add(size)
+        cls.address = OrderAddress.objects.create(
+            first_name="Ada",
+            last_name="Lovelace",
+            email="ada@example.com",
+            address_line_1="1 Main Street",
+            city="London",
+            state="London",
+            postal_code="N1",
+            country="GB",
+        )
+        cls.variants = {}
+        for name in "ABC":
+            product = Product.objects.create(
+                product_type=product_type,
+                title=f"Statue {name}",
+                status=Product.Status.PUBLISHED,
+                thumbnail=f"products/{name}.jpg",
+            )
+            cls.variants[name] = ProductVariant.objects.create(
+                product=product,
+                sku=name,
+                price="10.00",
+                image=f"products/{name}.jpg",
+                attributes={"size": "S"},
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def create_orders(self, names, count):
+        for _ in range(count):
+            order = Order.objects.create(
+                email="ada@example.com",
+                total_amount="10.00",
+                shipping_address=self.address,
+                billing_address=self.address,
+                is_paid=True,
+            )
+            for name in names:
+                OrderItem.objects.create(
+                    order=order,
+                    product_variant=self.variants[name],
+                    product_sku=name,
+                    product_name=name,
+                    unit_price="10.00",
+                )
+
+    def mine(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            process_bought_together_batch()
+
+    def companions_of(self, name):
+        return get_companions([self.variants[name].pk])
+
+    def test_lift_follows_the_order_count(self):
+        self.create_orders("AB", 3)
+        self.create_orders("A", 1)
+        self.create_orders("C", 1)
+        self.mine()
+        # 3 shared orders x 5 orders / (4 orders with A x 3 with B)
+        self.assertEqual(self.companions_of("A")[0]["lift"], 1.25)
+
+        # Orders without A or B don't refresh A's list, but dilute its pairs.
+        self.create_orders("C", 5)
+        self.mine()
+        self.assertEqual(self.companions_of("A")[0]["lift"], 2.5)
+
+    def test_companion_changes_invalidate_cached_lists(self):
+        self.create_orders("AB", 3)
+        self.create_orders("C", 2)
+        self.mine()
+        self.assertEqual(self.companions_of("A")[0]["price"], Decimal("10.00"))
+
+        companion = self.variants["B"]
+        companion.price = Decimal("12.00")
+        companion.save()
+        self.assertEqual(self.companions_of("A")[0]["price"], Decimal("12.00"))
+
+        companion.product.status = Product.Status.ARCHIVED
+        companion.product.save()
+        self.assertEqual(self.companions_of("A"), [])
@@ -5,6 +5,7 @@ from rest_framework import generics, status, views
 from rest_framework.response import Response
 
 from carts.utils import get_cart_from_request
+from facebook.utils import save_order_user_data
 from stripe_payments.services.stripe_checkout_service import StripeCheckoutService
 
 from .models import Order
@@ -72,6 +73,8 @@ class CheckoutView(views.APIView):
             shipping_data=shipping_data,
             billing_data=billing_data,
         )
+        save_order_user_data(order)
+
         logger.info(f"Order created locally: {order.order_number}")
         return order
 
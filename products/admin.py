@@ -1,18 +1,28 @@
 import json
 
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import PermissionDenied
 from django.db import models
+from django.db.models import Count
 from django.forms import Textarea
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils.html import mark_safe
 from mptt.admin import MPTTModelAdmin
 
+from common.admin import IndexedSearchMixin
 from products.models import *
+from products.services import bulk_product_service
 
 
 # Register your models here.
 @admin.register(Category)
 class CategoryAdmin(MPTTModelAdmin):
     list_display = ("title", "slug", "parent")
+    list_select_related = ("parent",)
     search_fields = ("title", "slug")
     list_filter = ("parent",)
     fields = ("title", "slug", "parent", "description")
@@ -42,6 +52,57 @@ class PrettyJSONWidget(Textarea):
             return value
 
 
+class PriceActionForm(ActionForm):
+    percent = forms.DecimalField(
+        label="Price change (%)",
+        required=False,
+        max_digits=6,
+        decimal_places=2,
+        help_text="10 raises prices by 10%, -15 lowers them by 15%.",
+    )
+
+
+class ProductActionForm(PriceActionForm):
+    category = forms.ModelChoiceField(Category.objects.all(), required=False)
+    collection = forms.ModelChoiceField(Collection.objects.all(), required=False)
+
+
+class StockImportForm(forms.Form):
+    file = forms.FileField(label="CSV file", help_text="Columns: sku, stock_quantity.")
+
+
+class BulkActionsMixin:
+    """
+    Reads the extra fields of the action form. The admin validates the form
+    before running an action but doesn't hand it over.
+    """
+
+    def get_action_value(self, request, field):
+        form = self.action_form(request.POST)
+        form.full_clean()
+        value = form.cleaned_data.get(field)
+        if value is None:
+            label = form.fields[field].label or field.capitalize()
+            error = (
+                " ".join(form.errors[field])
+                if field in form.errors
+                else "This field is required for this action."
+            )
+            self.message_user(request, f"{label}: {error}", messages.ERROR)
+        return value
+
+    def reprice(self, request, variants):
+        percent = self.get_action_value(request, "percent")
+        if percent is None:
+            return
+        try:
+            repriced = bulk_product_service.adjust_prices(variants, percent)
+        except ValueError as e:
+            self.message_user(request, str(e), messages.ERROR)
+            return
+        self.message_user(request, f"{repriced} variants repriced by {percent}%.")
+
+
 class ProductGalleryImageInline(AdminImagePreviewMixin, admin.TabularInline):
     model = ProductGalleryImage
     extra = 1
@@ -122,7 +183,9 @@ class CollectionAdmin(AdminImagePreviewMixin, admin.ModelAdmin):
 
 
 @admin.register(Product)
-class ProductAdmin(AdminImagePreviewMixin, admin.ModelAdmin):
+class ProductAdmin(
+    IndexedSearchMixin, BulkActionsMixin, AdminImagePreviewMixin, admin.ModelAdmin
+):
     list_display = [
         "title",
         "product_type",
@@ -131,8 +194,9 @@ class ProductAdmin(AdminImagePreviewMixin, admin.ModelAdmin):
         "preview_image",
         "variant_count",
     ]
+    list_select_related = ["product_type"]
     list_filter = ["status", "product_type", "created_at"]
-    search_fields = ["title", "slug", "specifications"]
+    search_fields = ["title", "=slug"]
     prepopulated_fields = {"slug": ("title",)}
     filter_horizontal = ["categories"]
 
@@ -179,15 +243,75 @@ class ProductAdmin(AdminImagePreviewMixin, admin.ModelAdmin):
         },
     }
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(num_variants=Count("variants"))
+
+    @admin.display(description="Variants", ordering="num_variants")
     def variant_count(self, obj):
-        return obj.variants.count()
+        return obj.num_variants
 
-    variant_count.short_description = "Variants"
+    def set_status(self, request, queryset, status):
+        updated = bulk_product_service.set_status(queryset, status)
+        self.message_user(
+            request, f"{updated} products marked as {Product.Status(status).label}."
+        )
+
+    @admin.action(description="Publish selected products", permissions=["change"])
+    def publish_products(self, request, queryset):
+        self.set_status(request, queryset, Product.Status.PUBLISHED)
+
+    @admin.action(description="Archive selected products", permissions=["change"])
+    def archive_products(self, request, queryset):
+        self.set_status(request, queryset, Product.Status.ARCHIVED)
+
+    @admin.action(description="Move selected products to draft", permissions=["change"])
+    def draft_products(self, request, queryset):
+        self.set_status(request, queryset, Product.Status.DRAFT)
+
+    @admin.action(
+        description="Change variant prices of selected products by %%",
+        permissions=["change"],
+    )
+    def reprice_products(self, request, queryset):
+        self.reprice(
+            request, ProductVariant.objects.filter(product__in=queryset.values("pk"))
+        )
+
+    @admin.action(
+        description="Add selected products to category", permissions=["change"]
+    )
+    def add_to_category(self, request, queryset):
+        category = self.get_action_value(request, "category")
+        if category is not None:
+            added = bulk_product_service.add_to_category(queryset, category)
+            self.message_user(request, f'{added} products added to "{category}".')
+
+    @admin.action(
+        description="Add selected products to collection", permissions=["change"]
+    )
+    def add_to_collection(self, request, queryset):
+        collection = self.get_action_value(request, "collection")
+        if collection is not None:
+            added = bulk_product_service.add_to_collection(queryset, collection)
+            self.message_user(request, f'{added} products added to "{collection}".')
+
+    action_form = ProductActionForm
+    actions = [
+        publish_products,
+        archive_products,
+        draft_products,
+        reprice_products,
+        add_to_category,
+        add_to_collection,
+    ]
 
 
 @admin.register(ProductVariant)
-class ProductVariantAdmin(AdminImagePreviewMixin, admin.ModelAdmin):
+class ProductVariantAdmin(
+    IndexedSearchMixin, BulkActionsMixin, AdminImagePreviewMixin, admin.ModelAdmin
+):
     list_display = ["product", "sku", "price", "stock_quantity", "preview_image"]
+    list_select_related = ["product"]
     list_filter = ["product__product_type", "created_at"]
     search_fields = ["sku", "product__title"]
     autocomplete_fields = ["product"]
@@ -207,9 +331,70 @@ class ProductVariantAdmin(AdminImagePreviewMixin, admin.ModelAdmin):
         },
     }
 
+    @admin.action(
+        description="Change prices of selected variants by %%", permissions=["change"]
+    )
+    def reprice_variants(self, request, queryset):
+        self.reprice(request, queryset)
+
+    action_form = PriceActionForm
+    actions = [reprice_variants]
+
+    def get_urls(self):
+        return [
+            path(
+                "import-stock/",
+                self.admin_site.admin_view(self.import_stock_view),
+                name="products_productvariant_import_stock",
+            ),
+            *super().get_urls(),
+        ]
+
+    def import_stock_view(self, request):
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+
+        form = StockImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            quantities, errors = bulk_product_service.parse_stock_csv(
+                form.cleaned_data["file"]
+            )
+            if errors:
+                for error in errors[:20]:
+                    self.message_user(request, error, messages.ERROR)
+                self.message_user(
+                    request, "Nothing was imported; fix the file and try again."
+                )
+            else:
+                stats = bulk_product_service.import_stock(quantities)
+                self.message_user(
+                    request,
+                    f"Stock updated for {stats['updated']} variants, "
+                    f"{stats['unchanged']} already up to date.",
+                )
+                if stats["unknown"]:
+                    self.message_user(
+                        request,
+                        f"{len(stats['unknown'])} unknown skus skipped: "
+                        f"{', '.join(stats['unknown'][:20])}",
+                        messages.WARNING,
+                    )
+                return redirect("admin:products_productvariant_changelist")
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.opts,
+            "form": form,
+            "title": "Import stock",
+        }
+        return TemplateResponse(
+            request, "admin/products/productvariant/import_stock.html", context
+        )
+
 
 @admin.register(ProductGalleryImage)
 class ProductGalleryImageAdmin(AdminImagePreviewMixin, admin.ModelAdmin):
     list_display = ["product", "variant", "is_feature", "preview_image"]
+    list_select_related = ["product", "variant__product"]
     list_filter = ["is_feature"]
     autocomplete_fields = ["product", "variant"]
@@ -0,0 +1,83 @@
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+
+from products.models import Product, ProductVariant
+
+SUMMARY_CACHE_TIMEOUT = 60 * 15
+
+
+def _variant_key(sku):
+    return f"products:variant-summary:{sku}"
+
+
+def _product_key(slug):
+    return f"products:product-summary:{slug}"
+
+
+def get_variant_summary(sku):
+    """
+    Read-through cache of the few variant fields the tracking endpoints need.
+
+    Returns a dict with id, price, product_slug and product_title, or None
+    when no variant has this sku.
+    """
+    key = _variant_key(sku)
+    summary = cache.get(key)
+
+    if summary is None:
+        summary = (
+            ProductVariant.objects.filter(sku=sku)
+            .values("id", "price", "product__slug", "product__title")
+            .first()
+        )
+        if summary is None:
+            return None
+
+        summary = {
+            "id": summary["id"],
+            "price": summary["price"],
+            "product_slug": summary["product__slug"],
+            "product_title": summary["product__title"],
+        }
+        cache.set(key, summary, SUMMARY_CACHE_TIMEOUT)
+
+    return summary
+
+
+def get_product_summary(slug):
+    """
+    Read-through cache of a product's id, title and base_price, or None when
+    no product has this slug.
+    """
+    key = _product_key(slug)
+    summary = cache.get(key)
+
+    if summary is None:
+        summary = (
+            Product.objects.filter(slug=slug)
+            .values("id", "title", "base_price")
+            .first()
+        )
+        if summary is None:
+            return None
+
+        cache.set(key, summary, SUMMARY_CACHE_TIMEOUT)
+
+    return summary
+
+
+def _delete_on_commit(keys):
+    # Deleting before commit would let a concurrent read cache the old row
+    # again; outside a transaction this runs immediately.
+    if keys:
+        transaction.on_commit(partial(cache.delete_many, keys))
+
+
+def invalidate_variant_summaries(skus):
+    _delete_on_commit([_variant_key(sku) for sku in skus])
+
+
+def invalidate_product_summaries(slugs):
+    _delete_on_commit([_product_key(slug) for slug in slugs])
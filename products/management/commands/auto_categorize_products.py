@@ -1,174 +1,168 @@
-import concurrent.futures
-import json
-
-import openai
 from django.conf import settings
-from django.core.management.base import BaseCommand
-from django.db import connection
+from django.core.management.base import BaseCommand, CommandError
 
-from products.models import Category, Product
+from common.jobs import CheckpointedJob, iter_keyset_batches
+from products.models import Product
+from products.services.categorization_service import (
+    CategorizationService,
+    CategoryTree,
+)
+from products.services.category_classifier import CategoryClassifier
 
 
 class Command(BaseCommand):
-    help = "Auto-assign categories using OpenAI. Processes products in batches."
+    help = (
+        "Auto-assign categories with a local classifier trained on the "
+        "categorized products, falling back to OpenAI for low-confidence ones. "
+        "Processes products in batches, in id order, and resumes after the last "
+        "completed batch when interrupted. Products whose content was already "
+        "categorized against the current category tree are not sent again."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
             "--batch-size", type=int, default=20, help="Products per OpenAI call"
         )
         parser.add_argument(
-            "--max-workers", type=int, default=3, help="Parallel threads"
+            "--max-workers",
+            type=int,
+            default=4,
+            help="Concurrent OpenAI calls",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Products written and checkpointed together",
         )
         parser.add_argument(
             "--limit",
             type=int,
             default=None,
-            help="Limit number of products to process",
+            help="Limit number of products to process in this run",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the checkpoint of an interrupted run and start over",
+        )
+        parser.add_argument(
+            "--min-confidence",
+            type=float,
+            default=0.35,
+            help="Local classifier score (cosine, 0-1) needed to skip the LLM",
+        )
+        parser.add_argument(
+            "--no-classifier",
+            action="store_true",
+            help="Send every product to the LLM",
+        )
+        parser.add_argument(
+            "--local-only",
+            action="store_true",
+            help="Never call the LLM; leave low-confidence products as they are",
         )
 
     def handle(self, *args, **options):
-        if not getattr(settings, "OPENAI_API_KEY", None):
+        if options["local_only"] and options["no_classifier"]:
+            raise CommandError("--local-only needs the classifier.")
+
+        if not options["local_only"] and not getattr(settings, "OPENAI_API_KEY", None):
             self.stdout.write(
                 self.style.ERROR("OPENAI_API_KEY is missing from settings.")
             )
             return
 
-        category_tree_str, category_lookup = self.get_category_context()
+        tree = CategoryTree.load()
+        self.stdout.write(f"Loaded {len(tree.categories)} categories.")
 
-        self.stdout.write(f"Loaded {len(category_lookup)} categories.")
+        classifier = None
+        if not options["no_classifier"]:
+            classifier = CategoryClassifier(min_confidence=options["min_confidence"])
+            trained_on = classifier.train()
+            self.stdout.write(
+                f"Trained the local classifier on {trained_on} products "
+                f"({len(classifier.category_ids)} categories)."
+            )
 
-        products = Product.objects.all().order_by("-created_at")
-        if options["limit"]:
-            products = products[: options["limit"]]
+        # A new category tree invalidates the cached answers, not the
+        # assignments made so far, so the checkpoint stays valid.
+        job = CheckpointedJob("auto_categorize_products", restart=options["restart"])
 
-        total_products = products.count()
+        products = Product.objects.filter(pk__gt=job.position).only(
+            "id", "title", "description", "specifications"
+        )
+        remaining = products.count()
+        total_products = remaining
+        if options["limit"]:
+            total_products = min(remaining, options["limit"])
         if total_products == 0:
             self.stdout.write("No products found.")
             return
 
-        self.stdout.write(f"Processing {total_products} products with LLM...")
-
-        batch_size = options["batch_size"]
-        products_list = list(products)
-        batches = [
-            products_list[i : i + batch_size]
-            for i in range(0, total_products, batch_size)
-        ]
-
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=options["max_workers"]
-        ) as executor:
-            future_to_batch = {
-                executor.submit(
-                    self.process_batch, batch, category_tree_str, category_lookup
-                ): batch
-                for batch in batches
-            }
-
-            for future in concurrent.futures.as_completed(future_to_batch):
-                try:
-                    result_msg = future.result()
-                    self.stdout.write(result_msg)
-                except Exception as exc:
-                    self.stdout.write(
-                        self.style.ERROR(f"Batch generated an exception: {exc}")
-                    )
-
-    def get_category_context(self):
-        categories = Category.objects.all().select_related("parent")
-        lookup = {c.title.lower(): c for c in categories}
-
-        lines = []
-        for cat in categories:
-            if cat.parent is None:
-                lines.append(f"- {cat.title}")
-                children = cat.children.all()
-                for child in children:
-                    lines.append(f"  - {child.title}")
-
-        return "\n".join(lines), lookup
-
-    def process_batch(self, batch, category_tree_str, category_lookup):
-        connection.close()
-
-        products_data = []
-        for p in batch:
-            size_info = p.specifications.get("dimensions", "") or ""
-            products_data.append(
-                {
-                    "id": p.id,
-                    "title": p.title,
-                    "description": p.description[:200],
-                    "specs": size_info,
-                }
-            )
-
-        prompt = f"""
-        You are an inventory assistant. 
-        Assign the most relevant categories from the provided CATEGORY TREE to the PRODUCTS list.
-
-        RULES:
-        1. Use ONLY exact names from the CATEGORY TREE.
-        2. A product can have multiple categories (Poly-hierarchy).
-        3. Example: A "Garden Truck" goes in "Vehicles" AND "Garden Statues".
-        4. Example: A "Mini Astronaut" goes in "Astronauts" AND "Accents".
-        5. Return ONLY valid JSON in this format: {{ "product_id": ["Category A", "Category B"] }}
-
-        CATEGORY TREE:
-        {category_tree_str}
-
-        PRODUCTS:
-        {json.dumps(products_data)}
-        """
+        if job.resumed:
+            self.stdout.write(f"Resuming after product {job.position}.")
+        self.stdout.write(f"Processing {total_products} products...")
 
+        batches = iter_keyset_batches(
+            products, options["chunk_size"], after=job.position
+        )
+        if options["limit"]:
+            batches = self.limit_batches(batches, options["limit"])
+
+        service = CategorizationService(
+            tree=tree,
+            batch_size=options["batch_size"],
+            concurrency=options["max_workers"],
+            classifier=classifier,
+            use_llm=not options["local_only"],
+        )
         try:
-            client = openai.Client(api_key=settings.OPENAI_API_KEY)
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a precise JSON generator."},
-                    {"role": "user", "content": prompt},
-                ],
-                response_format={"type": "json_object"},
+            # A run cut short by --limit pauses the job, so the next run
+            # picks up after it instead of starting over.
+            for stats in job.run(
+                batches,
+                lambda batch: self.process_batch(service, batch),
+                complete=total_products == remaining,
+            ):
+                self.stdout.write(job.progress(total_products))
+        except Exception as exc:
+            raise CommandError(
+                f"{exc}. Run the command again to resume after product "
+                f"{job.position}."
             )
-
-            content = response.choices[0].message.content
-            mapping = json.loads(content)
-
-            count = 0
-            updated_logs = []
-
-            for p_id_str, cat_names in mapping.items():
-                try:
-                    p_id = int(p_id_str)
-                    product = next((p for p in batch if p.id == p_id), None)
-
-                    if product:
-                        cats_to_add = []
-                        valid_names = []
-
-                        for name in cat_names:
-                            cat_obj = category_lookup.get(name.strip().lower())
-                            if cat_obj:
-                                cats_to_add.append(cat_obj)
-                                valid_names.append(cat_obj.title)
-
-                        if cats_to_add:
-                            product.categories.add(*cats_to_add)
-                            count += 1
-                            updated_logs.append(
-                                f'   [UPDATED] "{product.title}" -> {valid_names}'
-                            )
-
-                except Exception as e:
-                    updated_logs.append(f"   [ERROR] Processing ID {p_id_str}: {e}")
-
-            summary = self.style.SUCCESS(
-                f"Batch complete: Updated {count}/{len(batch)} products."
+        finally:
+            service.close()
+
+    def limit_batches(self, batches, limit):
+        for position, batch in batches:
+            if limit <= 0:
+                return
+            if len(batch) > limit:
+                batch = batch[:limit]
+                position = batch[-1].pk
+            limit -= len(batch)
+            yield position, batch
+
+    def process_batch(self, service, batch):
+        stats = service.categorize(batch)
+
+        titles = {p.pk: p.title for p in batch}
+        for product_id, category_ids in stats["added"].items():
+            names = [service.tree.categories[pk].title for pk in category_ids]
+            self.stdout.write(f'   [UPDATED] "{titles[product_id]}" -> {names}')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Batch complete: Updated {stats['updated']}/{len(batch)} products "
+                f"({stats['classified']} classified locally, "
+                f"{stats['requested']} sent to the LLM, the rest cached)."
             )
-            details = "\n".join(updated_logs)
+        )
 
-            return f"{summary}\n{details}"
+        # Raised after the successful batches were written, so the checkpoint
+        # stays before this chunk and a rerun only retries the failed calls.
+        if stats["errors"]:
+            raise CommandError("; ".join(stats["errors"]))
 
-        except Exception as e:
-            return self.style.ERROR(f"OpenAI Call Failed: {e}")
+        return stats
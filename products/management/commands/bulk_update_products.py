@@ -0,0 +1,184 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.models import Category, Collection, Product, ProductVariant
+from products.services import bulk_product_service
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk product edits as set-based updates: change the status of "
+        "products, reprice their variants by a percentage, import stock levels "
+        "from a CSV file, or add products to a category or collection."
+    )
+
+    def add_arguments(self, parser):
+        operations = parser.add_subparsers(dest="operation", required=True)
+
+        status = operations.add_parser("set-status", help="Change product status")
+        status.add_argument("status", choices=Product.Status.values)
+        self.add_selection_arguments(status)
+
+        reprice = operations.add_parser(
+            "reprice", help="Change variant prices by a percentage"
+        )
+        reprice.add_argument(
+            "percent", type=Decimal, help="10 raises prices by 10%%, -15 lowers them"
+        )
+        reprice.add_argument(
+            "--compare-at-price",
+            action="store_true",
+            help="Move the compare-at prices too",
+        )
+        reprice.add_argument(
+            "--sku",
+            action="append",
+            default=[],
+            help="Only reprice this variant (repeatable)",
+        )
+        self.add_selection_arguments(reprice)
+
+        stock = operations.add_parser(
+            "import-stock", help="Set stock levels from a sku,stock_quantity CSV"
+        )
+        stock.add_argument("csv_file", help="Path to the CSV file")
+
+        category = operations.add_parser(
+            "add-to-category", help="Add products to a category"
+        )
+        category.add_argument("category", help="Category slug")
+        self.add_selection_arguments(category)
+
+        collection = operations.add_parser(
+            "add-to-collection", help="Add products to a collection"
+        )
+        collection.add_argument("collection", help="Collection slug")
+        self.add_selection_arguments(collection)
+
+    def add_selection_arguments(self, parser):
+        parser.add_argument(
+            "--slug", action="append", default=[], help="Product slug (repeatable)"
+        )
+        parser.add_argument(
+            "--in-category", help="Products in this category slug, or its children"
+        )
+        parser.add_argument("--in-collection", help="Products in this collection slug")
+        parser.add_argument("--product-type", help="Products of this product type name")
+        parser.add_argument(
+            "--current-status",
+            choices=Product.Status.values,
+            help="Products that currently have this status",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Select every product when no other filter is given",
+        )
+
+    def get_products(self, options):
+        products = Product.objects.all()
+        filtered = False
+
+        if options["slug"]:
+            products = products.filter(slug__in=options["slug"])
+            filtered = True
+        if options["in_category"]:
+            category = self.get_object(Category, options["in_category"])
+            products = products.filter(
+                categories__in=category.get_descendants(include_self=True)
+            )
+            filtered = True
+        if options["in_collection"]:
+            collection = self.get_object(Collection, options["in_collection"])
+            products = products.filter(collections=collection)
+            filtered = True
+        if options["product_type"]:
+            products = products.filter(product_type__name=options["product_type"])
+            filtered = True
+        if options["current_status"]:
+            products = products.filter(status=options["current_status"])
+            filtered = True
+
+        if not filtered and not options["all"]:
+            raise CommandError(
+                "Select products with --slug, --in-category, --in-collection, "
+                "--product-type or --current-status, or pass --all."
+            )
+        return products
+
+    def get_object(self, model, slug):
+        try:
+            return model.objects.get(slug=slug)
+        except model.DoesNotExist:
+            raise CommandError(f'{model._meta.verbose_name} "{slug}" not found.')
+
+    def handle(self, *args, **options):
+        operation = options["operation"]
+
+        if operation == "import-stock":
+            self.import_stock(options["csv_file"])
+            return
+
+        products = self.get_products(options)
+
+        if operation == "set-status":
+            updated = bulk_product_service.set_status(products, options["status"])
+            self.stdout.write(
+                self.style.SUCCESS(f"{updated} products set to {options['status']}.")
+            )
+
+        elif operation == "reprice":
+            variants = ProductVariant.objects.filter(product__in=products.values("pk"))
+            if options["sku"]:
+                variants = variants.filter(sku__in=options["sku"])
+            try:
+                repriced = bulk_product_service.adjust_prices(
+                    variants,
+                    options["percent"],
+                    compare_at_price=options["compare_at_price"],
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{repriced} variants repriced by {options['percent']}%."
+                )
+            )
+
+        elif operation == "add-to-category":
+            category = self.get_object(Category, options["category"])
+            added = bulk_product_service.add_to_category(products, category)
+            self.stdout.write(
+                self.style.SUCCESS(f'{added} products added to "{category}".')
+            )
+
+        elif operation == "add-to-collection":
+            collection = self.get_object(Collection, options["collection"])
+            added = bulk_product_service.add_to_collection(products, collection)
+            self.stdout.write(
+                self.style.SUCCESS(f'{added} products added to "{collection}".')
+            )
+
+    def import_stock(self, path):
+        try:
+            with open(path, encoding="utf-8-sig", newline="") as file:
+                quantities, errors = bulk_product_service.parse_stock_csv(file)
+        except OSError as e:
+            raise CommandError(f"Could not read {path}: {e}")
+
+        if errors:
+            for error in errors:
+                self.stderr.write(error)
+            raise CommandError("Nothing was imported; fix the file and try again.")
+
+        stats = bulk_product_service.import_stock(quantities)
+        for sku in stats["unknown"]:
+            self.stderr.write(f"Unknown sku: {sku}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stock updated for {stats['updated']} variants, "
+                f"{stats['unchanged']} already up to date, "
+                f"{len(stats['unknown'])} unknown."
+            )
+        )
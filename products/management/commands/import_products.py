@@ -1,30 +1,58 @@
-import io
-import json
 from pathlib import Path
 
-from django.core.files import File
-from django.core.files.base import ContentFile
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
-from django.utils.text import slugify
-from PIL import Image
 
-# Replace 'your_app_name' with your actual app name
-from products.models import Category, Product, ProductType, ProductVariant
+from common.jobs import CheckpointedJob, CheckpointMismatch, iter_batches
+from products.models import Category, ProductType
+from products.services.product_import_service import (
+    ProductImportService,
+    iter_json_items,
+)
 
 
 class Command(BaseCommand):
-    help = "Import products. Resolves image paths relative to JSON file location."
+    help = (
+        "Import products from a JSON array or JSON Lines file, in batches. "
+        "Resolves image paths relative to the file location. Rows whose "
+        "product, attributes and image are unchanged are skipped. An "
+        "interrupted import resumes after the last committed batch."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument("json_file", type=str, help="Path to the JSON file")
-
-    def get_placeholder_image(self):
-        """Generates a simple 100x100 grey image in memory."""
-        img = Image.new("RGB", (100, 100), color=(200, 200, 200))
-        img_io = io.BytesIO()
-        img.save(img_io, format="JPEG")
-        return ContentFile(img_io.getvalue(), name="placeholder.jpg")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Items upserted per transaction",
+        )
+        parser.add_argument(
+            "--image-workers",
+            type=int,
+            default=8,
+            help="Threads storing the images of a batch",
+        )
+        parser.add_argument(
+            "--category", default="Animals", help="Category title to attach"
+        )
+        parser.add_argument(
+            "--product-type", default="Sculpture", help="Product type name"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would change without writing anything",
+        )
+        parser.add_argument(
+            "--diff",
+            action="store_true",
+            help="List every created (+) and updated (~) SKU",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the checkpoint of an interrupted import and start over",
+        )
 
     def handle(self, *args, **options):
         json_path = Path(options["json_file"]).resolve()
@@ -35,121 +63,90 @@ class Command(BaseCommand):
 
         # 1. Fetch Prerequisites
         try:
-            category = Category.objects.get(title="Animals")
+            category = Category.objects.get(title=options["category"])
         except Category.DoesNotExist:
-            raise CommandError("Category 'Animals' does not exist.")
+            raise CommandError(f"Category '{options['category']}' does not exist.")
 
         try:
-            product_type = ProductType.objects.get(name="Sculpture")
-            allowed_attribute_slugs = list(
-                product_type.allowed_attributes.values_list("slug", flat=True)
-            )
+            product_type = ProductType.objects.get(name=options["product_type"])
         except ProductType.DoesNotExist:
-            raise CommandError("ProductType 'Sculpture' does not exist.")
-
-        # 2. Load Data
-        with open(json_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        self.stdout.write(f"Importing {len(data)} products from {json_dir}...")
-        success_count = 0
-
-        for item in data:
-            try:
-                with transaction.atomic():
-                    clean_title = item.get("clean_title") or item.get("title")
-                    sku = item.get("sku")
-
-                    # --- FIX: Resolve Image Path Relative to JSON Directory ---
-                    relative_img_path = item.get("local_image_path")
-                    full_img_path = None
-
-                    if relative_img_path:
-                        # Combine JSON dir with relative path
-                        full_img_path = json_dir / relative_img_path
-
-                    # Check if file exists at that resolved path
-                    has_image = full_img_path and full_img_path.exists()
-
-                    if not has_image and relative_img_path:
-                        self.stdout.write(
-                            self.style.WARNING(f"Image not found at: {full_img_path}")
-                        )
-
-                    # --- Product Creation ---
-                    product, created = Product.objects.get_or_create(
-                        slug=slugify(clean_title),
-                        defaults={
-                            "title": clean_title,
-                            "product_type": product_type,
-                            "status": Product.Status.PUBLISHED,
-                            "description": item.get("title", ""),
-                            "base_price": 0.00,
-                            # Use placeholder initially to satisfy NOT NULL constraint
-                            "thumbnail": self.get_placeholder_image(),
-                        },
-                    )
-
-                    product.categories.add(category)
-
-                    # Save Real Product Image
-                    if has_image:
-                        # Update if it's a new product OR the current one is just a placeholder
-                        if created or "placeholder" in str(product.thumbnail):
-                            with open(full_img_path, "rb") as img_file:
-                                product.thumbnail.save(
-                                    full_img_path.name, File(img_file), save=True
-                                )
-
-                    # --- Attribute Logic ---
-                    variant_attributes = {}
-
-                    if "width_cm" in item and item["width_cm"]:
-                        variant_attributes["width"] = item["width_cm"]
-                    if "height_cm" in item and item["height_cm"]:
-                        variant_attributes["height"] = item["height_cm"]
-                    if "depth_cm" in item and item["depth_cm"]:
-                        variant_attributes["depth"] = item["depth_cm"]
-
-                    # Autofill missing required attributes
-                    for required_slug in allowed_attribute_slugs:
-                        if required_slug not in variant_attributes:
-                            variant_attributes[required_slug] = "null"
-
-                    # --- Variant Creation ---
-                    variant, v_created = ProductVariant.objects.update_or_create(
-                        sku=sku,
-                        defaults={
-                            "product": product,
-                            "price": 0.00,
-                            "stock_quantity": 0,
-                            "attributes": variant_attributes,
-                            # Use placeholder initially
-                            "image": self.get_placeholder_image(),
-                        },
-                    )
-
-                    # Save Real Variant Image
-                    if has_image:
-                        with open(full_img_path, "rb") as img_file:
-                            variant.image.save(
-                                full_img_path.name, File(img_file), save=True
-                            )
-
-                    variant.full_clean()
-                    variant.save()
-
-                    success_count += 1
-                    status_msg = "Created" if v_created else "Updated"
-                    self.stdout.write(self.style.SUCCESS(f"[{status_msg}] {sku}"))
-
-            except Exception as e:
+            raise CommandError(
+                f"ProductType '{options['product_type']}' does not exist."
+            )
+
+        service = ProductImportService(
+            category=category,
+            product_type=product_type,
+            source_dir=json_dir,
+            image_workers=options["image_workers"],
+            dry_run=options["dry_run"],
+        )
+
+        # A checkpoint only applies to the same file, unmodified.
+        stat = json_path.stat()
+        try:
+            job = CheckpointedJob(
+                f"import_products:{json_path}",
+                params={
+                    "category": category.pk,
+                    "product_type": product_type.pk,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                },
+                restart=options["restart"],
+                persist=not options["dry_run"],
+            )
+        except CheckpointMismatch as e:
+            raise CommandError(f"{e} (--restart)")
+
+        # 2. Stream and import the data
+        if options["dry_run"]:
+            self.stdout.write(f"Dry run: comparing {json_path} with the catalogue...")
+        else:
+            self.stdout.write(f"Importing products from {json_path}...")
+        if job.resumed:
+            self.stdout.write(f"Resuming after item {job.position}.")
+
+        totals = {
+            "products_created": 0,
+            "variants_created": 0,
+            "variants_updated": 0,
+            "variants_unchanged": 0,
+            "failed": 0,
+        }
+        batches = iter_batches(
+            iter_json_items(json_path), options["batch_size"], start=job.position
+        )
+
+        for stats in job.run(batches, service.import_batch):
+            for warning in stats["warnings"]:
+                self.stdout.write(self.style.WARNING(warning))
+            for sku, error in stats["errors"]:
                 self.stdout.write(
-                    self.style.ERROR(
-                        f"Failed to import item {item.get('sku', 'Unknown')}: {e}"
-                    )
+                    self.style.ERROR(f"Failed to import item {sku}: {error}")
                 )
-
+            if options["diff"]:
+                for sku, change, fields in stats["changes"]:
+                    if change == "created":
+                        self.stdout.write(self.style.SUCCESS(f"+ {sku}"))
+                    else:
+                        self.stdout.write(f"~ {sku}: {', '.join(fields)}")
+
+            totals["products_created"] += stats["products_created"]
+            totals["variants_created"] += stats["variants_created"]
+            totals["variants_updated"] += stats["variants_updated"]
+            totals["variants_unchanged"] += stats["variants_unchanged"]
+            totals["failed"] += len(stats["errors"])
+            self.stdout.write(job.progress())
+
+        verb = "Would import" if options["dry_run"] else "Imported"
         self.stdout.write(
-            self.style.SUCCESS(f"Successfully imported {success_count} products.")
+            self.style.SUCCESS(
+                f"{verb} {job.processed - totals['failed']} items: "
+                f"{totals['products_created']} products created, "
+                f"{totals['variants_created']} variants created, "
+                f"{totals['variants_updated']} variants updated, "
+                f"{totals['variants_unchanged']} unchanged, "
+                f"{totals['failed']} failed."
+            )
         )
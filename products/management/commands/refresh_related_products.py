@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+
+from common.workers import run_worker_pool
+from products.services.related_products_service import RelatedProductsService
+from products.tasks import process_related_refresh_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Keeps the related-products table up to date: recomputes the lists "
+        "affected by queued product changes, or every list with --rebuild."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Changed products refreshed per index build",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=60.0,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=3,
+            help="Attempts before a change is dead-lettered",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help=(
+                "Recompute every list first (e.g. after changing the weights); "
+                "refreshes also rebuild once the text IDF weights are a day old"
+            ),
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is drained instead of polling forever",
+        )
+
+    def handle(self, *args, **options):
+        # One service for the whole run, so it keeps its index between batches.
+        service = RelatedProductsService()
+        if options["rebuild"]:
+            indexed = service.rebuild()
+            self.stdout.write(f"Rebuilt the related products of {indexed} products.")
+
+        batch_size = options["batch_size"]
+        max_attempts = options["max_attempts"]
+
+        self.stdout.write("Refreshing related products...")
+
+        # One worker: batches update the same index, and concurrent batches
+        # would race on the lists they share.
+        processed = run_worker_pool(
+            lambda: process_related_refresh_batch(
+                batch_size, max_attempts, service=service
+            ),
+            workers=1,
+            poll_interval=options["poll_interval"],
+            run_once=options["once"],
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} changes."))
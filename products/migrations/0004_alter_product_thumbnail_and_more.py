@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:51
+
+from django.db import migrations, models
+
+import common.storage
+import products.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0003_category_seo_metadata_collection_seo_metadata_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="product",
+            name="thumbnail",
+            field=models.ImageField(
+                storage=common.storage.get_content_addressed_storage,
+                upload_to=products.models.product_thumbnail_upload_to,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="productgalleryimage",
+            name="image",
+            field=models.ImageField(
+                storage=common.storage.get_content_addressed_storage,
+                upload_to=products.models.product_gallery_upload_to,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="productvariant",
+            name="image",
+            field=models.ImageField(
+                storage=common.storage.get_content_addressed_storage,
+                upload_to=products.models.variant_image_upload_to,
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0004_alter_product_thumbnail_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategorySuggestion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("content_hash", models.CharField(max_length=64)),
+                ("tree_version", models.CharField(max_length=64)),
+                ("category_ids", models.JSONField(default=list)),
+                ("source", models.CharField(max_length=50)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("content_hash", "tree_version"),
+                        name="unique_category_suggestion",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:08
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently, so the tables stay writable.
+    atomic = False
+
+    dependencies = [
+        ("products", "0006_relatedproductsrefresh_relatedproduct"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name="product",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("title"), name="gin_trgm_ops"
+                ),
+                name="product_title_trgm",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="productvariant",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("sku"), name="gin_trgm_ops"
+                ),
+                name="variant_sku_trgm",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 07:24
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently, so the tables stay writable.
+    atomic = False
+
+    dependencies = [
+        ("products", "0007_product_product_title_trgm_and_more"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="product",
+            index=models.Index(fields=["thumbnail"], name="product_thumbnail_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="productgalleryimage",
+            index=models.Index(fields=["image"], name="gallery_image_idx"),
+        ),
+        AddIndexConcurrently(
+            model_name="productvariant",
+            index=models.Index(fields=["image"], name="variant_image_idx"),
+        ),
+    ]
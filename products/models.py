@@ -1,15 +1,18 @@
 import uuid
 
 from django.conf import settings
-from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
 from mptt.fields import TreeForeignKey
 from mptt.models import MPTTModel
 
-from common.models import SeoModel, TimestampedModel
+from common.models import QueuedTaskModel, SeoModel, TimestampedModel
+from common.storage import get_content_addressed_storage
 from common.utils import get_unique_slug
 
 
@@ -142,7 +145,9 @@ class Product(SeoModel, TimestampedModel):
         Category, related_name="products", blank=True, verbose_name=_("Categories")
     )
 
-    thumbnail = models.ImageField(upload_to=product_thumbnail_upload_to)
+    thumbnail = models.ImageField(
+        upload_to=product_thumbnail_upload_to, storage=get_content_addressed_storage
+    )
     specifications = models.JSONField(default=dict, blank=True)
     base_price = models.DecimalField(max_digits=10, decimal_places=2, default="0.00")
 
@@ -150,6 +155,13 @@ class Product(SeoModel, TimestampedModel):
         indexes = [
             models.Index(fields=["slug"]),
             models.Index(fields=["status"]),
+            # Admin search runs `icontains`, i.e. UPPER(...) LIKE '%...%'.
+            GinIndex(
+                OpClass(Upper("title"), name="gin_trgm_ops"),
+                name="product_title_trgm",
+            ),
+            # Shared image files are looked up by name before deletion.
+            models.Index(fields=["thumbnail"], name="product_thumbnail_idx"),
         ]
 
     def save(self, *args, **kwargs):
@@ -178,7 +190,9 @@ class ProductVariant(TimestampedModel):
     )
     stock_quantity = models.PositiveIntegerField(default=0)
 
-    image = models.ImageField(upload_to=variant_image_upload_to)
+    image = models.ImageField(
+        upload_to=variant_image_upload_to, storage=get_content_addressed_storage
+    )
 
     attributes = models.JSONField(default=dict)
 
@@ -192,6 +206,10 @@ class ProductVariant(TimestampedModel):
         indexes = [
             GinIndex(fields=["attributes"], name="variant_attributes_gin"),
             models.Index(fields=["price"]),
+            GinIndex(
+                OpClass(Upper("sku"), name="gin_trgm_ops"), name="variant_sku_trgm"
+            ),
+            models.Index(fields=["image"], name="variant_image_idx"),
         ]
 
     def __str__(self):
@@ -246,10 +264,103 @@ class ProductGalleryImage(TimestampedModel):
         null=True,
         blank=True,
     )
-    image = models.ImageField(upload_to=product_gallery_upload_to)
+    image = models.ImageField(
+        upload_to=product_gallery_upload_to, storage=get_content_addressed_storage
+    )
     alt_text = models.CharField(max_length=255, blank=True)
     is_feature = models.BooleanField(default=False)
 
     class Meta:
         verbose_name = _("Gallery Image")
         verbose_name_plural = _("Gallery Images")
+        indexes = [
+            models.Index(fields=["image"], name="gallery_image_idx"),
+        ]
+
+
+class CategorySuggestion(TimestampedModel):
+    """
+    Cached categorization of a product's content, so unchanged products are
+    not sent to the LLM again. Entries are only valid for the category tree
+    they were made against, identified by `tree_version`.
+    """
+
+    content_hash = models.CharField(max_length=64)
+    tree_version = models.CharField(max_length=64)
+    category_ids = models.JSONField(default=list)
+    source = models.CharField(max_length=50)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_hash", "tree_version"],
+                name="unique_category_suggestion",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.source}) -> {self.category_ids}"
+
+
+class RelatedProduct(models.Model):
+    """
+    One of a product's precomputed nearest neighbours, see
+    `RelatedProductsService`. A product has up to K rows, ranked from 1.
+    """
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="related_entries"
+    )
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ["product", "rank"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "rank"], name="unique_related_product_rank"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} #{self.rank} -> {self.related_id} ({self.score:.3f})"
+
+
+class RelatedProductsRefresh(QueuedTaskModel):
+    """
+    A product whose neighbours have to be recomputed because its content,
+    categories, collections, variants or status changed.
+
+    There is one row per product, so repeated edits coalesce; `changed_at`
+    tells the refresher whether the product changed again mid-batch.
+    """
+
+    product_id = models.BigIntegerField(unique=True)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "available_at"], name="related_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} - {self.status}"
+
+
+class RelatedProductsIdf(TimestampedModel):
+    """
+    The text IDF weights of the last `RelatedProductsService.rebuild()`.
+    Refreshes reuse them rather than recomputing them from the current
+    products, so their scores stay comparable with the stored lists. There
+    is a single row.
+    """
+
+    # float32 weights, one per hashed text feature.
+    weights = models.BinaryField()
+    product_count = models.PositiveIntegerField()
+
+    def __str__(self):
+        return (
+            f"IDF of {self.product_count} products ({self.updated_at:%Y-%m-%d %H:%M})"
+        )
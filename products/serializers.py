@@ -1,5 +1,7 @@
 from rest_framework import serializers
 
+from common.serializers import SrcsetField
+
 from .models import (
     Attribute,
     Category,
@@ -14,6 +16,7 @@ from .models import (
 
 
 class CategorySerializer(serializers.ModelSerializer):
+    image_srcset = SrcsetField(source="image")
     seo_metadata = serializers.SerializerMethodField()
 
     class Meta:
@@ -24,6 +27,7 @@ class CategorySerializer(serializers.ModelSerializer):
             "slug",
             "description",
             "image",
+            "image_srcset",
             "parent",
             "seo_metadata",
         ]
@@ -33,12 +37,21 @@ class CategorySerializer(serializers.ModelSerializer):
 
 
 class CategoryTreeSerializer(serializers.ModelSerializer):
+    image_srcset = SrcsetField(source="image")
     children = serializers.SerializerMethodField()
     seo_metadata = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
-        fields = ["id", "title", "slug", "image", "children", "seo_metadata"]
+        fields = [
+            "id",
+            "title",
+            "slug",
+            "image",
+            "image_srcset",
+            "children",
+            "seo_metadata",
+        ]
 
     def get_children(self, obj):
         if hasattr(obj, "children_prefetched"):
@@ -60,6 +73,7 @@ class CategoryTreeSerializer(serializers.ModelSerializer):
 
 
 class CollectionSerializer(serializers.ModelSerializer):
+    image_srcset = SrcsetField(source="image")
     product_count = serializers.IntegerField(source="products.count", read_only=True)
 
     class Meta:
@@ -70,6 +84,7 @@ class CollectionSerializer(serializers.ModelSerializer):
             "slug",
             "description",
             "image",
+            "image_srcset",
             "is_active",
             "product_count",
         ]
@@ -95,13 +110,16 @@ class ProductTypeSerializer(serializers.ModelSerializer):
 
 
 class ProductGalleryImageSerializer(serializers.ModelSerializer):
+    image_srcset = SrcsetField(source="image")
+
     class Meta:
         model = ProductGalleryImage
-        fields = ["id", "image", "alt_text", "is_feature", "variant"]
+        fields = ["id", "image", "image_srcset", "alt_text", "is_feature", "variant"]
 
 
 class ProductVariantSerializer(serializers.ModelSerializer):
     is_in_stock = serializers.SerializerMethodField()
+    image_srcset = SrcsetField(source="image")
 
     class Meta:
         model = ProductVariant
@@ -113,6 +131,7 @@ class ProductVariantSerializer(serializers.ModelSerializer):
             "stock_quantity",
             "is_in_stock",
             "image",
+            "image_srcset",
             "attributes",
         ]
 
@@ -122,6 +141,7 @@ class ProductVariantSerializer(serializers.ModelSerializer):
 
 class ProductListSerializer(serializers.ModelSerializer):
     category_names = serializers.StringRelatedField(source="categories", many=True)
+    thumbnail_srcset = SrcsetField(source="thumbnail")
 
     class Meta:
         model = Product
@@ -131,6 +151,7 @@ class ProductListSerializer(serializers.ModelSerializer):
             "slug",
             "status",
             "thumbnail",
+            "thumbnail_srcset",
             "base_price",
             "category_names",
             "created_at",
@@ -142,6 +163,7 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     variants = ProductVariantSerializer(many=True, read_only=True)
     gallery_images = ProductGalleryImageSerializer(many=True, read_only=True)
     categories = CategorySerializer(many=True, read_only=True)
+    thumbnail_srcset = SrcsetField(source="thumbnail")
     seo_metadata = serializers.SerializerMethodField()
 
     class Meta:
@@ -154,6 +176,7 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             "description",
             "base_price",
             "thumbnail",
+            "thumbnail_srcset",
             "specifications",
             "product_type",
             "categories",
@@ -0,0 +1,259 @@
+import csv
+import io
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import connection, transaction
+from django.db.models import F, Max, Min, Q
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from products.models import Category, Collection, Product, ProductVariant
+from products.signals import catalogue_bulk_changed
+
+STOCK_CSV_COLUMNS = ("sku", "stock_quantity")
+MAX_PRICE_CHANGE_PERCENT = Decimal(1000)
+
+
+def _notify(product_ids: List[int], variant_ids: List[int], fields: Iterable[str]):
+    """
+    Sends `catalogue_bulk_changed` for the products and variants once the
+    transaction commits; the UPDATEs above bypass model signals.
+    """
+    skus = list(
+        ProductVariant.objects.filter(
+            Q(pk__in=variant_ids) | Q(product_id__in=product_ids)
+        ).values_list("sku", flat=True)
+    )
+    slugs = list(
+        Product.objects.filter(pk__in=product_ids).values_list("slug", flat=True)
+    )
+    fields = set(fields)
+    transaction.on_commit(
+        lambda: catalogue_bulk_changed.send(
+            sender=Product, skus=skus, slugs=slugs, fields=fields
+        )
+    )
+
+
+def set_status(products, status: str) -> int:
+    """
+    Moves `products` to `status` in one UPDATE. Returns the number of
+    products whose status actually changed.
+    """
+    if status not in Product.Status.values:
+        raise ValueError(f"Unknown product status: {status}")
+
+    with transaction.atomic():
+        product_ids = list(
+            products.exclude(status=status)
+            .order_by()
+            .values_list("pk", flat=True)
+            .distinct()
+        )
+        if not product_ids:
+            return 0
+        Product.objects.filter(pk__in=product_ids).update(
+            status=status, updated_at=timezone.now()
+        )
+        _notify(product_ids, [], fields={"status"})
+    return len(product_ids)
+
+
+def adjust_prices(variants, percent: Decimal, compare_at_price: bool = False) -> int:
+    """
+    Changes the price of `variants` by `percent` (10 raises prices by 10%,
+    -15 lowers them by 15%), rounded to cents, in one UPDATE. With
+    `compare_at_price`, the compare-at prices that are set move with them.
+    Returns the number of variants repriced.
+
+    Raises ValueError, and changes nothing, when a price would drop to zero
+    or no longer fit the price column.
+    """
+    percent = Decimal(percent)
+    if not -100 < percent <= MAX_PRICE_CHANGE_PERCENT:
+        raise ValueError(
+            f"The price change must be above -100% and at most "
+            f"{MAX_PRICE_CHANGE_PERCENT}%."
+        )
+    factor = (100 + percent) / 100
+
+    changes = {"price": Round(F("price") * factor, 2)}
+    fields = {"price"}
+    if compare_at_price:
+        # NULL stays NULL.
+        changes["compare_at_price"] = Round(F("compare_at_price") * factor, 2)
+        fields.add("compare_at_price")
+
+    with transaction.atomic():
+        variant_ids = list(variants.order_by().values_list("pk", flat=True).distinct())
+        if not variant_ids:
+            return 0
+        repriced = ProductVariant.objects.filter(pk__in=variant_ids)
+        _check_price_range(repriced, factor, compare_at_price)
+        repriced.update(**changes, updated_at=timezone.now())
+        _notify([], variant_ids, fields=fields)
+    return len(variant_ids)
+
+
+def _check_price_range(variants, factor: Decimal, compare_at_price: bool):
+    field = ProductVariant._meta.get_field("price")
+    cent = Decimal(1).scaleb(-field.decimal_places)
+    highest_price = Decimal(10) ** (field.max_digits - field.decimal_places) - cent
+
+    bounds = variants.aggregate(
+        low=Min("price"), high=Max("price"), high_compare_at=Max("compare_at_price")
+    )
+    highs = [bounds["high"]]
+    if compare_at_price and bounds["high_compare_at"] is not None:
+        highs.append(bounds["high_compare_at"])
+
+    # The same rounding as ROUND() in Postgres.
+    low = (bounds["low"] * factor).quantize(cent, ROUND_HALF_UP)
+    if low <= 0:
+        raise ValueError(f"The change would lower a price of {bounds['low']} to {low}.")
+    high = (max(highs) * factor).quantize(cent, ROUND_HALF_UP)
+    if high > highest_price:
+        raise ValueError(
+            f"The change would raise a price of {max(highs)} to {high}, above "
+            f"the maximum of {highest_price}."
+        )
+
+
+def parse_stock_csv(file) -> Tuple[Dict[str, int], List[str]]:
+    """
+    Reads `sku,stock_quantity` rows from a text or binary file. Returns
+    ({sku: quantity}, errors); a sku listed twice keeps its last quantity.
+    """
+    content = file.read()
+    if isinstance(content, bytes):
+        content = content.decode("utf-8-sig")
+    reader = csv.DictReader(io.StringIO(content))
+
+    missing = set(STOCK_CSV_COLUMNS) - set(reader.fieldnames or [])
+    if missing:
+        return {}, [f"Missing columns: {', '.join(sorted(missing))}"]
+
+    quantities = {}
+    errors = []
+    for line, row in enumerate(reader, start=2):
+        sku = (row["sku"] or "").strip()
+        if not sku:
+            errors.append(f"Line {line}: missing sku")
+            continue
+        try:
+            quantity = int((row["stock_quantity"] or "").strip())
+        except ValueError:
+            errors.append(f"Line {line}: invalid stock_quantity for {sku}")
+            continue
+        if quantity < 0:
+            errors.append(f"Line {line}: negative stock_quantity for {sku}")
+            continue
+        quantities[sku] = quantity
+    return quantities, errors
+
+
+def import_stock(quantities: Dict[str, int], batch_size: int = 5000) -> Dict:
+    """
+    Sets the stock of the variants in {sku: quantity}, one UPDATE ... FROM
+    unnest() per batch, in one transaction. Variants whose stock is already
+    right are not touched. Returns the numbers of updated and unchanged
+    variants and the unknown skus.
+    """
+    table = ProductVariant._meta.db_table
+    items = list(quantities.items())
+    updated_skus = []
+    unknown = []
+    now = timezone.now()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(items), batch_size):
+            batch = items[start : start + batch_size]
+            skus = [sku for sku, _ in batch]
+            known = set(
+                ProductVariant.objects.filter(sku__in=skus).values_list(
+                    "sku", flat=True
+                )
+            )
+            unknown.extend(sku for sku in skus if sku not in known)
+
+            cursor.execute(
+                f"""
+                UPDATE {table} AS variant
+                SET stock_quantity = stock.quantity, updated_at = %s
+                FROM unnest(%s::text[], %s::integer[]) AS stock(sku, quantity)
+                WHERE variant.sku = stock.sku
+                  AND variant.stock_quantity <> stock.quantity
+                RETURNING variant.sku
+                """,
+                [now, skus, [quantity for _, quantity in batch]],
+            )
+            updated_skus.extend(sku for (sku,) in cursor.fetchall())
+
+        if updated_skus:
+            transaction.on_commit(
+                lambda: catalogue_bulk_changed.send(
+                    sender=ProductVariant,
+                    skus=updated_skus,
+                    slugs=[],
+                    fields={"stock_quantity"},
+                )
+            )
+
+    return {
+        "updated": len(updated_skus),
+        "unchanged": len(items) - len(updated_skus) - len(unknown),
+        "unknown": unknown,
+    }
+
+
+def _add_memberships(through, products, owner_field: str, owner_id: int, field: str):
+    with transaction.atomic():
+        product_ids = list(
+            products.exclude(
+                pk__in=through.objects.filter(**{owner_field: owner_id}).values(
+                    "product_id"
+                )
+            )
+            .order_by()
+            .values_list("pk", flat=True)
+            .distinct()
+        )
+        if not product_ids:
+            return 0
+        through.objects.bulk_create(
+            [
+                through(product_id=product_id, **{owner_field: owner_id})
+                for product_id in product_ids
+            ],
+            batch_size=5000,
+            ignore_conflicts=True,
+        )
+        # The bulk insert bypasses m2m_changed.
+        Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+        _notify(product_ids, [], fields={field})
+    return len(product_ids)
+
+
+def add_to_category(products, category: Category) -> int:
+    """
+    Adds `products` to `category` in one bulk insert. Returns the number of
+    products that were not in it yet.
+    """
+    return _add_memberships(
+        Product.categories.through, products, "category_id", category.pk, "categories"
+    )
+
+
+def add_to_collection(products, collection: Collection) -> int:
+    """
+    Adds `products` to `collection` in one bulk insert. Returns the number
+    of products that were not in it yet.
+    """
+    return _add_memberships(
+        Collection.products.through,
+        products,
+        "collection_id",
+        collection.pk,
+        "collections",
+    )
@@ -0,0 +1,397 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import openai
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import Category, CategorySuggestion, Product
+from products.services.category_classifier import CategoryClassifier
+from products.signals import catalogue_bulk_changed
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Async token bucket: refills at `rate` tokens per second and holds at most
+    `capacity`. `acquire()` waits until enough tokens are available.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1):
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class CategoryTree:
+    """
+    The category tree as sent to the model, with an id per line, and a
+    `version` that changes whenever a category is added, renamed or moved.
+    """
+
+    def __init__(self, categories: Iterable[Category]):
+        self.categories = {category.pk: category for category in categories}
+        self.lookup = {
+            category.title.strip().lower(): category.pk
+            for category in self.categories.values()
+        }
+        self.text = "\n".join(
+            f"{'  ' * category.level}- {category.pk}: {category.title}"
+            for category in self.categories.values()
+        )
+        self.version = hashlib.sha256(self.text.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def load(cls) -> "CategoryTree":
+        # Tree order (depth-first), so children follow their parent; the
+        # model's default ordering is alphabetical.
+        return cls(Category.objects.order_by("tree_id", "lft"))
+
+    def resolve(self, values: Iterable[Any]) -> List[int]:
+        """Maps category ids, or exact titles, to known category ids."""
+        ids = []
+        for value in values:
+            if isinstance(value, str) and not value.strip().isdigit():
+                category_id = self.lookup.get(value.strip().lower())
+            else:
+                category_id = int(value)
+            if category_id in self.categories and category_id not in ids:
+                ids.append(category_id)
+        return ids
+
+
+class CategorizationService:
+    """
+    Assigns categories to products with an LLM.
+
+    With a trained `classifier`, products are first classified locally and
+    only low-confidence ones are sent to the LLM (never, without `use_llm`).
+
+    Products are hashed by the content sent to the model; a product whose
+    hash already has a `CategorySuggestion` for the current category tree is
+    not sent again. The remaining products are categorized in concurrent
+    batches through one shared async client, throttled by request and token
+    buckets and retried with backoff. The resulting assignments are written
+    in one bulk insert per call to `categorize()`.
+
+    Call `close()` when done, to release the client and its event loop.
+    """
+
+    SOURCE = "llm"
+
+    SYSTEM_PROMPT = """You are an inventory assistant and a precise JSON generator.
+Assign the most relevant categories from the CATEGORY TREE below to each product you are given.
+
+RULES:
+1. Use ONLY category ids from the CATEGORY TREE.
+2. A product can have multiple categories (Poly-hierarchy).
+3. Example: A "Garden Truck" goes in "Vehicles" AND "Garden Statues".
+4. Example: A "Mini Astronaut" goes in "Astronauts" AND "Accents".
+5. Return ONLY valid JSON in this format: {{"<product id>": [<category id>, ...]}}
+
+CATEGORY TREE:
+{tree}"""
+
+    RETRYABLE_ERRORS = (
+        openai.RateLimitError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+        json.JSONDecodeError,
+    )
+
+    def __init__(
+        self,
+        tree: Optional[CategoryTree] = None,
+        batch_size: int = 20,
+        concurrency: int = 4,
+        max_retries: int = 5,
+        backoff_seconds: float = 1.0,
+        classifier: Optional[CategoryClassifier] = None,
+        use_llm: bool = True,
+    ):
+        self.tree = tree or CategoryTree.load()
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.classifier = classifier
+        self.use_llm = use_llm
+
+        # The tree is a stable prompt prefix, which the API caches.
+        self.system_prompt = self.SYSTEM_PROMPT.format(tree=self.tree.text)
+
+        # One loop for the service's lifetime, so the client and its
+        # connection pool are shared by every batch of every call.
+        self.loop = asyncio.new_event_loop()
+        self.client = None
+        self.request_bucket = None
+        self.token_bucket = None
+
+    def close(self):
+        if self.client is not None:
+            self.loop.run_until_complete(self.client.close())
+        self.loop.close()
+
+    # --- Product content ---
+
+    @staticmethod
+    def get_payload(product: Product) -> Dict[str, Any]:
+        return {
+            "id": product.pk,
+            "title": product.title,
+            "description": product.description[:200],
+            "specs": (product.specifications or {}).get("dimensions", "") or "",
+        }
+
+    @staticmethod
+    def get_content_hash(payload: Dict[str, Any]) -> str:
+        content = {key: value for key, value in payload.items() if key != "id"}
+        return hashlib.sha256(
+            json.dumps(content, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    # --- LLM calls ---
+
+    def _setup(self):
+        # Created inside the loop: the buckets' locks and the client's
+        # connection pool bind to it.
+        if self.client is None:
+            self.client = openai.AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL,
+                timeout=settings.OPENAI_TIMEOUT,
+                max_retries=0,
+            )
+            self.request_bucket = TokenBucket(
+                rate=settings.OPENAI_REQUESTS_PER_MINUTE / 60,
+                capacity=max(self.concurrency, 1),
+            )
+            self.token_bucket = TokenBucket(
+                rate=settings.OPENAI_TOKENS_PER_MINUTE / 60,
+                capacity=settings.OPENAI_TOKENS_PER_MINUTE / 6,
+            )
+
+    def get_retry_delay(self, attempt: int, error: Exception) -> float:
+        response = getattr(error, "response", None)
+        retry_after = (
+            response.headers.get("retry-after") if response is not None else None
+        )
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff_seconds * 2**attempt * (1 + random.random())
+
+    async def _request(self, payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+        prompt = f"PRODUCTS:\n{json.dumps(payloads)}"
+        # Roughly 4 characters per token, plus the answer.
+        estimated_tokens = (len(self.system_prompt) + len(prompt)) // 4 + 20 * len(
+            payloads
+        )
+
+        for attempt in range(self.max_retries + 1):
+            await self.request_bucket.acquire()
+            await self.token_bucket.acquire(estimated_tokens)
+            try:
+                response = await self.client.chat.completions.create(
+                    model=settings.OPENAI_MODEL,
+                    messages=[
+                        {"role": "system", "content": self.system_prompt},
+                        {"role": "user", "content": prompt},
+                    ],
+                    response_format={"type": "json_object"},
+                )
+                return json.loads(response.choices[0].message.content)
+            except self.RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.get_retry_delay(attempt, e)
+                logger.warning(
+                    f"OpenAI call failed ({e}), retrying in {delay:.1f}s "
+                    f"(attempt {attempt + 1}/{self.max_retries})"
+                )
+                await asyncio.sleep(delay)
+
+    async def _categorize_batches(self, batches: List[List[Dict[str, Any]]]):
+        self._setup()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(batch):
+            async with semaphore:
+                return await self._request(batch)
+
+        return await asyncio.gather(
+            *(run(batch) for batch in batches), return_exceptions=True
+        )
+
+    def suggest(self, products: List[Product]) -> tuple:
+        """
+        Returns ({content hash: category ids}, number of contents classified
+        locally, number sent to the LLM, errors) for `products`, and caches
+        the new LLM answers.
+        """
+        payloads = {}
+        sources = {}
+        for product in products:
+            payload = self.get_payload(product)
+            content_hash = self.get_content_hash(payload)
+            payloads.setdefault(content_hash, payload)
+            sources.setdefault(content_hash, product)
+
+        suggestions = dict(
+            CategorySuggestion.objects.filter(
+                tree_version=self.tree.version, content_hash__in=list(payloads)
+            ).values_list("content_hash", "category_ids")
+        )
+
+        # Products with identical content are only classified once.
+        pending = [
+            (content_hash, payload)
+            for content_hash, payload in payloads.items()
+            if content_hash not in suggestions
+        ]
+
+        # Confident local predictions are cheap to redo, so they are not
+        # cached; the LLM only sees the rest.
+        classified = 0
+        if self.classifier is not None and pending:
+            predictions, _ = self.classifier.predict(
+                [sources[content_hash] for content_hash, _ in pending]
+            )
+            for content_hash, payload in pending:
+                if payload["id"] in predictions:
+                    suggestions[content_hash] = predictions[payload["id"]]
+                    classified += 1
+            pending = [
+                (content_hash, payload)
+                for content_hash, payload in pending
+                if content_hash not in suggestions
+            ]
+        if not self.use_llm:
+            pending = []
+        batches = [
+            pending[i : i + self.batch_size]
+            for i in range(0, len(pending), self.batch_size)
+        ]
+        results = self.loop.run_until_complete(
+            self._categorize_batches(
+                [[payload for _, payload in batch] for batch in batches]
+            )
+        )
+
+        errors = []
+        new_suggestions = []
+        for batch, result in zip(batches, results):
+            if isinstance(result, Exception):
+                errors.append(f"OpenAI Call Failed: {result}")
+                continue
+
+            for content_hash, payload in batch:
+                category_ids = self.tree.resolve(result.get(str(payload["id"])) or [])
+                suggestions[content_hash] = category_ids
+                new_suggestions.append(
+                    CategorySuggestion(
+                        content_hash=content_hash,
+                        tree_version=self.tree.version,
+                        category_ids=category_ids,
+                        source=self.SOURCE,
+                    )
+                )
+
+        CategorySuggestion.objects.bulk_create(new_suggestions, ignore_conflicts=True)
+        return suggestions, classified, len(pending), errors
+
+    # --- Assignment ---
+
+    def assign(self, assignments: Dict[int, List[int]]) -> Dict[int, List[int]]:
+        """
+        Adds categories to products, {product id: category ids}, in one bulk
+        insert. Returns the categories that were actually new per product.
+        """
+        through = Product.categories.through
+        existing = set(
+            through.objects.filter(product_id__in=list(assignments)).values_list(
+                "product_id", "category_id"
+            )
+        )
+        added = {}
+        for product_id, category_ids in assignments.items():
+            new_ids = [
+                category_id
+                for category_id in category_ids
+                if (product_id, category_id) not in existing
+            ]
+            if new_ids:
+                added[product_id] = new_ids
+
+        if not added:
+            return added
+
+        with transaction.atomic():
+            through.objects.bulk_create(
+                [
+                    through(product_id=product_id, category_id=category_id)
+                    for product_id, category_ids in added.items()
+                    for category_id in category_ids
+                ],
+                ignore_conflicts=True,
+            )
+            # The bulk insert bypasses m2m_changed.
+            products = Product.objects.filter(pk__in=list(added))
+            products.update(updated_at=timezone.now())
+            slugs = list(products.values_list("slug", flat=True))
+            transaction.on_commit(
+                lambda: catalogue_bulk_changed.send(
+                    sender=Product, skus=[], slugs=slugs
+                )
+            )
+
+        return added
+
+    def categorize(self, products: List[Product]) -> Dict[str, Any]:
+        """
+        Categorizes `products` and adds the suggested categories. Returns
+        statistics, and the `added` categories per product for logging.
+        """
+        suggestions, classified, requested, errors = self.suggest(products)
+
+        assignments = {}
+        for product in products:
+            content_hash = self.get_content_hash(self.get_payload(product))
+            if suggestions.get(content_hash):
+                assignments[product.pk] = suggestions[content_hash]
+
+        added = self.assign(assignments)
+        return {
+            "products": len(products),
+            "classified": classified,
+            "requested": requested,
+            "suggested": len(assignments),
+            "updated": len(added),
+            "added": added,
+            "errors": errors,
+        }
@@ -0,0 +1,210 @@
+import re
+import zlib
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from common.jobs import iter_keyset_batches
+from products.models import Product
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+class HashedNgramVectorizer:
+    """
+    Turns product text into sparse vectors of hashed word unigrams and
+    bigrams and character trigrams, so no vocabulary has to be built or
+    stored. crc32 is used rather than `hash()`, which is salted per process.
+    """
+
+    def __init__(self, n_features: int = 2**18):
+        self.n_features = n_features
+
+    @staticmethod
+    def get_text(product: Product) -> str:
+        specifications = product.specifications or {}
+        return " ".join(
+            [
+                product.title,
+                product.title,  # Titles are short and the most telling.
+                product.description or "",
+                " ".join(f"{key} {value}" for key, value in specifications.items()),
+            ]
+        )
+
+    def get_features(self, text: str) -> List[str]:
+        words = TOKEN_RE.findall(text.lower())
+        features = list(words)
+        features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f"<{word}>"
+            features.extend(f"#{padded[i : i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def transform(self, texts: Iterable[str]) -> sparse.csr_matrix:
+        """Sublinear term frequencies, L2-normalized per row."""
+        indptr = [0]
+        indices = []
+        counts = []
+        for text in texts:
+            row = {}
+            for feature in self.get_features(text):
+                index = zlib.crc32(feature.encode("utf-8")) % self.n_features
+                row[index] = row.get(index, 0) + 1
+            indices.extend(row.keys())
+            counts.extend(row.values())
+            indptr.append(len(indices))
+
+        matrix = sparse.csr_matrix(
+            (
+                1 + np.log(np.asarray(counts, dtype=np.float32)),
+                np.asarray(indices, dtype=np.int32),
+                np.asarray(indptr, dtype=np.int64),
+            ),
+            shape=(len(indptr) - 1, self.n_features),
+        )
+        return normalize_rows(matrix)
+
+
+def normalize_rows(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+
+class CategoryClassifier:
+    """
+    Nearest-centroid category classifier, learned from the products that
+    already have categories.
+
+    Every category is represented by the TF-IDF weighted mean of its
+    products' vectors, and a product is scored against all categories with
+    one sparse matrix product. A product can get several categories: all
+    whose cosine similarity reaches `min_confidence` and is within
+    `relative_margin` of the best one.
+    """
+
+    def __init__(
+        self,
+        vectorizer: HashedNgramVectorizer = None,
+        min_confidence: float = 0.35,
+        relative_margin: float = 0.8,
+        min_examples: int = 3,
+    ):
+        self.vectorizer = vectorizer or HashedNgramVectorizer()
+        self.min_confidence = min_confidence
+        self.relative_margin = relative_margin
+        self.min_examples = min_examples
+        self.category_ids = np.empty(0, dtype=np.int64)
+        self.centroids = None
+        self.idf = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None and len(self.category_ids) > 0
+
+    def train(self, products=None, batch_size: int = 2000) -> int:
+        """
+        Learns the centroids in one keyset pass over the categorized
+        products, accumulating per-category sums, so memory does not grow
+        with the catalogue. Returns the number of products used.
+        """
+        if products is None:
+            products = Product.objects.filter(categories__isnull=False).distinct()
+        products = products.only(
+            "id", "title", "description", "specifications"
+        ).prefetch_related("categories")
+
+        n_features = self.vectorizer.n_features
+        document_frequency = np.zeros(n_features, dtype=np.float64)
+        sums: Dict[int, sparse.csr_matrix] = {}
+        examples: Dict[int, int] = {}
+        n_documents = 0
+
+        for _, batch in iter_keyset_batches(products, batch_size):
+            vectors = self.vectorizer.transform(
+                self.vectorizer.get_text(product) for product in batch
+            )
+            document_frequency += np.bincount(vectors.indices, minlength=n_features)
+            n_documents += len(batch)
+
+            # Category x product indicator, so each category's sum is one
+            # sparse product per batch.
+            rows, cols = [], []
+            for col, product in enumerate(batch):
+                for category in product.categories.all():
+                    rows.append(category.pk)
+                    cols.append(col)
+            if not rows:
+                continue
+
+            batch_ids, row_index = np.unique(rows, return_inverse=True)
+            indicator = sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.float32), (row_index, cols)),
+                shape=(len(batch_ids), len(batch)),
+            )
+            batch_sums = indicator @ vectors
+            counts = np.asarray(indicator.sum(axis=1)).ravel()
+
+            for i, category_id in enumerate(batch_ids.tolist()):
+                row = batch_sums[i]
+                sums[category_id] = (
+                    sums[category_id] + row if category_id in sums else row
+                )
+                examples[category_id] = examples.get(category_id, 0) + int(counts[i])
+
+        category_ids = sorted(
+            category_id
+            for category_id, count in examples.items()
+            if count >= self.min_examples
+        )
+        if not category_ids:
+            self.category_ids = np.empty(0, dtype=np.int64)
+            self.centroids = None
+            return n_documents
+
+        self.idf = (np.log((1 + n_documents) / (1 + document_frequency)) + 1).astype(
+            np.float32
+        )
+        self.category_ids = np.asarray(category_ids, dtype=np.int64)
+        centroids = sparse.vstack([sums[category_id] for category_id in category_ids])
+        self.centroids = normalize_rows(
+            sparse.csr_matrix(centroids @ sparse.diags(self.idf))
+        )
+        return n_documents
+
+    def score(self, products: List[Product]) -> np.ndarray:
+        """Cosine similarity of every product to every category centroid."""
+        vectors = self.vectorizer.transform(
+            self.vectorizer.get_text(product) for product in products
+        )
+        vectors = normalize_rows(sparse.csr_matrix(vectors @ sparse.diags(self.idf)))
+        return (vectors @ self.centroids.T).toarray()
+
+    def predict(
+        self, products: List[Product]
+    ) -> Tuple[Dict[int, List[int]], Dict[int, float]]:
+        """
+        Returns ({product id: category ids} for confidently classified
+        products, {product id: best score} for all of them).
+        """
+        if not self.is_trained or not products:
+            return {}, {}
+
+        scores = self.score(products)
+        best = scores.max(axis=1)
+        threshold = np.maximum(self.min_confidence, best * self.relative_margin)
+        selected = scores >= threshold[:, None]
+
+        predictions: Dict[int, List[int]] = {}
+        confidence: Dict[int, float] = {}
+        for i, product in enumerate(products):
+            confidence[product.pk] = float(best[i])
+            if best[i] < self.min_confidence:
+                continue
+            order = np.argsort(-scores[i])
+            predictions[product.pk] = [
+                int(self.category_ids[j]) for j in order if selected[i, j]
+            ]
+        return predictions, confidence
@@ -0,0 +1,532 @@
+import hashlib
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils.text import slugify
+from PIL import Image
+
+from common.renditions import queue_renditions
+from products.models import Category, Product, ProductType, ProductVariant
+from products.signals import catalogue_bulk_changed
+
+
+def iter_json_items(path: Path, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    Yields the items of a JSON array file, or of a JSON Lines file
+    (.jsonl/.ndjson), without loading the whole file into memory.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.suffix.lower() in (".jsonl", ".ndjson"):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+            return
+
+        decoder = json.JSONDecoder()
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError("Expected a JSON array or a JSON Lines file.")
+        buffer = buffer[1:]
+        eof = False
+
+        while True:
+            buffer = buffer.lstrip()
+            if buffer.startswith(","):
+                buffer = buffer[1:].lstrip()
+            if buffer.startswith("]"):
+                return
+
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                # The next item is not complete yet; read more.
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+
+            yield item
+            buffer = buffer[end:]
+
+
+class ProductImportService:
+    """
+    Imports supplier items ({"sku", "title", "clean_title", "local_image_path",
+    "width_cm", ...}) into products and variants, a batch at a time.
+
+    Each batch is prepared in Python, its images are stored in parallel, and
+    its rows are copied into a temporary table and upserted with a handful of
+    set-based statements in one transaction.
+    """
+
+    STAGE_TABLE = "product_import_stage"
+
+    def __init__(
+        self,
+        category: Category,
+        product_type: ProductType,
+        source_dir: Path,
+        image_workers: int = 8,
+        dry_run: bool = False,
+    ):
+        self.category = category
+        self.product_type = product_type
+        self.source_dir = source_dir
+        self.image_workers = image_workers
+        self.dry_run = dry_run
+
+        self.allowed_attributes = {
+            attr.slug: attr.choices for attr in product_type.allowed_attributes.all()
+        }
+        self.image_storage = ProductVariant._meta.get_field("image").storage
+        self._image_names = {}
+        self._placeholder = None
+
+    # --- Preparation ---
+
+    def get_placeholder_name(self) -> str:
+        """
+        Name of a simple 100x100 grey image. The storage is content-addressed,
+        so every run resolves to the same file; see `save_images`.
+        """
+        if self._placeholder is None:
+            img = Image.new("RGB", (100, 100), color=(200, 200, 200))
+            img_io = io.BytesIO()
+            img.save(img_io, format="JPEG")
+            content = ContentFile(img_io.getvalue())
+            name = self.image_storage.get_content_name(
+                "products/placeholder.jpg", content
+            )
+            self._placeholder = (name, content)
+        return self._placeholder[0]
+
+    def build_attributes(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Maps the supplier dimensions onto variant attributes and enforces the
+        same rules as `ProductVariant.clean`.
+        """
+        attributes = {}
+        if item.get("width_cm"):
+            attributes["width"] = item["width_cm"]
+        if item.get("height_cm"):
+            attributes["height"] = item["height_cm"]
+        if item.get("depth_cm"):
+            attributes["depth"] = item["depth_cm"]
+
+        # Autofill missing required attributes
+        for required_slug in self.allowed_attributes:
+            attributes.setdefault(required_slug, "null")
+
+        invalid_keys = set(attributes) - set(self.allowed_attributes)
+        if invalid_keys:
+            raise ValueError(
+                f"Attributes {invalid_keys} are not allowed for this product type."
+            )
+
+        for key, value in attributes.items():
+            valid_choices = self.allowed_attributes.get(key)
+            if valid_choices and value not in valid_choices:
+                raise ValueError(
+                    f"Value '{value}' is not valid for '{key}'. Allowed: {valid_choices}"
+                )
+
+        return attributes
+
+    def prepare_row(self, ordinal: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        clean_title = item.get("clean_title") or item.get("title")
+        sku = item.get("sku")
+        if not clean_title or not sku:
+            raise ValueError("Item has no title or sku.")
+        sku = str(sku)
+
+        slug = slugify(clean_title)
+        if not slug or len(slug) > 255 or len(clean_title) > 255 or len(sku) > 255:
+            raise ValueError("Title or sku is empty or longer than 255 characters.")
+
+        image_path = None
+        if item.get("local_image_path"):
+            image_path = self.source_dir / item["local_image_path"]
+
+        return {
+            "ordinal": ordinal,
+            "sku": sku,
+            "slug": slug,
+            "title": clean_title,
+            "description": item.get("title", ""),
+            "attributes": self.build_attributes(item),
+            "image_path": image_path,
+        }
+
+    def prepare_rows(self, items: Iterable[tuple]) -> tuple:
+        """
+        Returns (rows, errors) for a batch of (ordinal, item) pairs. Later
+        items win over earlier items with the same sku, and a variant that
+        would duplicate the attributes of another sku of the same product is
+        rejected like `unique_variant_attributes` would reject it.
+        """
+        errors = []
+        rows_by_sku = {}
+        for ordinal, item in items:
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError("Item is not an object.")
+                row = self.prepare_row(ordinal, item)
+            except Exception as e:
+                sku = item.get("sku") if isinstance(item, dict) else None
+                errors.append((sku or "Unknown", str(e)))
+                continue
+            rows_by_sku[row["sku"]] = row
+
+        rows = []
+        seen_attributes = {}
+        for row in rows_by_sku.values():
+            key = (row["slug"], json.dumps(row["attributes"], sort_keys=True))
+            if key in seen_attributes:
+                errors.append(
+                    (
+                        row["sku"],
+                        f"Same attributes as {seen_attributes[key]} in this batch.",
+                    )
+                )
+                continue
+            seen_attributes[key] = row["sku"]
+            rows.append(row)
+
+        return rows, errors
+
+    # --- Images ---
+
+    def resolve_image(self, path: Path) -> str:
+        """Checksums a source image into its content-addressed name."""
+        with open(path, "rb") as img_file:
+            return self.image_storage.get_content_name(
+                f"products/{path.name}", File(img_file)
+            )
+
+    def store_image(self, path: Path) -> str:
+        with open(path, "rb") as img_file:
+            return self.image_storage.save(f"products/{path.name}", File(img_file))
+
+    def _store_image_in_thread(self, path: Path) -> str:
+        # Saving takes a database lock, so each executor thread opens its own
+        # connection; close it before the thread goes away.
+        try:
+            return self.store_image(path)
+        finally:
+            connection.close()
+
+    def resolve_images(self, rows: List[Dict[str, Any]]) -> List[str]:
+        """
+        Checksums the distinct source images of a batch with a thread pool
+        (the work is file I/O and hashing) and sets each row's `image` to the
+        name it will be stored under, or to the placeholder. Nothing is
+        written yet. Returns warnings.
+        """
+        warnings = []
+        pending = set()
+        for row in rows:
+            path = row["image_path"]
+            if path is None or path in self._image_names:
+                continue
+            if path.exists():
+                pending.add(path)
+            else:
+                warnings.append(f"Image not found at: {path}")
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.image_workers) as executor:
+                paths = list(pending)
+                for path, name in zip(paths, executor.map(self.resolve_image, paths)):
+                    self._image_names[path] = name
+
+        placeholder = self.get_placeholder_name()
+        for row in rows:
+            row["image"] = self._image_names.get(row["image_path"], placeholder)
+            row["has_image"] = row["image"] != placeholder
+
+        return warnings
+
+    def save_images(self, rows: List[Dict[str, Any]]):
+        """
+        Stores the images of `rows` that are not in storage yet. Images whose
+        checksum matches a stored file are skipped without being read again.
+        """
+        missing = {}
+        for row in rows:
+            if not self.image_storage.exists(row["image"]):
+                missing[row["image"]] = row["image_path"] if row["has_image"] else None
+
+        placeholder_name, placeholder_content = self._placeholder
+        if missing.pop(placeholder_name, False) is None:
+            self.image_storage.save("products/placeholder.jpg", placeholder_content)
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.image_workers) as executor:
+                list(executor.map(self._store_image_in_thread, set(missing.values())))
+
+    # --- Change detection ---
+
+    @staticmethod
+    def fingerprint(slug: str, attributes: Dict[str, Any], image: str) -> str:
+        """Hash of everything the importer writes to an existing variant."""
+        payload = json.dumps([slug, attributes, image], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def classify(self, rows: List[Dict[str, Any]]):
+        """
+        Compares the batch with the stored variants in one query and sets
+        each row's `change` to "created", "updated" or "unchanged", and its
+        `changed_fields` for updates.
+        """
+        stored = {
+            sku: {"product": slug, "attributes": attributes, "image": image}
+            for sku, slug, attributes, image in ProductVariant.objects.filter(
+                sku__in=[row["sku"] for row in rows]
+            ).values_list("sku", "product__slug", "attributes", "image")
+        }
+
+        for row in rows:
+            current = stored.get(row["sku"])
+            row["changed_fields"] = []
+            if current is None:
+                row["change"] = "created"
+                continue
+
+            incoming = {
+                "product": row["slug"],
+                "attributes": row["attributes"],
+                "image": row["image"],
+            }
+            if self.fingerprint(*incoming.values()) == self.fingerprint(
+                *current.values()
+            ):
+                row["change"] = "unchanged"
+            else:
+                row["change"] = "updated"
+                row["changed_fields"] = [
+                    field
+                    for field, value in incoming.items()
+                    if json.dumps(value, sort_keys=True, default=str)
+                    != json.dumps(current[field], sort_keys=True, default=str)
+                ]
+
+    # --- Database ---
+
+    def _stage(self, cursor, rows: List[Dict[str, Any]]):
+        cursor.execute(f"DROP TABLE IF EXISTS {self.STAGE_TABLE}")
+        cursor.execute(
+            f"""
+            CREATE TEMPORARY TABLE {self.STAGE_TABLE} (
+                ordinal integer,
+                sku text,
+                slug text,
+                title text,
+                description text,
+                attributes jsonb,
+                image text,
+                has_image boolean
+            ) ON COMMIT DROP
+            """
+        )
+        with cursor.copy(
+            f"COPY {self.STAGE_TABLE} "
+            "(ordinal, sku, slug, title, description, attributes, image, has_image) "
+            "FROM STDIN"
+        ) as copy:
+            for row in rows:
+                copy.write_row(
+                    (
+                        row["ordinal"],
+                        row["sku"],
+                        row["slug"],
+                        row["title"],
+                        row["description"],
+                        json.dumps(row["attributes"]),
+                        row["image"],
+                        row["has_image"],
+                    )
+                )
+
+    def _upsert_products(self, cursor) -> int:
+        """
+        Creates missing products. Existing products keep their data, except
+        that a placeholder thumbnail is replaced once a real image shows up.
+        Only products of changed variants are staged.
+        Returns the number of products created.
+        """
+        product_table = Product._meta.db_table
+        cursor.execute(
+            f"""
+            INSERT INTO {product_table} (
+                product_type_id, status, title, slug, description, thumbnail,
+                specifications, base_price, seo_metadata, created_at, updated_at
+            )
+            SELECT DISTINCT ON (slug)
+                %(product_type_id)s, %(status)s, title, slug, description, image,
+                '{{}}'::jsonb, 0, '{{}}'::jsonb, now(), now()
+            FROM {self.STAGE_TABLE}
+            ORDER BY slug, has_image DESC, ordinal
+            ON CONFLICT (slug) DO UPDATE
+                SET thumbnail = EXCLUDED.thumbnail, updated_at = EXCLUDED.updated_at
+                WHERE EXCLUDED.thumbnail <> %(placeholder)s
+                AND (
+                    {product_table}.thumbnail = %(placeholder)s
+                    OR {product_table}.thumbnail LIKE '%%placeholder%%'
+                )
+            RETURNING (xmax = 0) AS inserted
+            """,
+            {
+                "product_type_id": self.product_type.pk,
+                "status": Product.Status.PUBLISHED,
+                "placeholder": self.get_placeholder_name(),
+            },
+        )
+        return sum(1 for (inserted,) in cursor.fetchall() if inserted)
+
+    def _attach_categories(self, cursor):
+        through = Product.categories.through
+        cursor.execute(
+            f"""
+            INSERT INTO {through._meta.db_table} (product_id, category_id)
+            SELECT p.id, %s
+            FROM {Product._meta.db_table} p
+            WHERE p.slug IN (SELECT slug FROM {self.STAGE_TABLE})
+            ON CONFLICT DO NOTHING
+            """,
+            [self.category.pk],
+        )
+
+    def _reject_attribute_conflicts(self, cursor) -> List[tuple]:
+        """
+        Removes staged variants whose attributes already belong to another
+        sku of the same product, and returns them as errors.
+        """
+        variant_table = ProductVariant._meta.db_table
+        cursor.execute(
+            f"""
+            DELETE FROM {self.STAGE_TABLE} s
+            USING {Product._meta.db_table} p, {variant_table} v
+            WHERE p.slug = s.slug
+            AND v.product_id = p.id
+            AND v.attributes = s.attributes
+            AND v.sku <> s.sku
+            RETURNING s.sku, v.sku
+            """
+        )
+        return [
+            (sku, f"Same attributes as existing variant {other_sku}.")
+            for sku, other_sku in cursor.fetchall()
+        ]
+
+    def _upsert_variants(self, cursor) -> tuple:
+        """
+        Creates new variants with zero price and stock, and updates the
+        product, attributes and image of changed ones. Price and stock are
+        managed in the shop, not by the supplier feed, so updates keep them.
+
+        Returns (created, updated).
+        """
+        cursor.execute(
+            f"""
+            INSERT INTO {ProductVariant._meta.db_table} (
+                product_id, sku, price, compare_at_price, stock_quantity, image,
+                attributes, created_at, updated_at
+            )
+            SELECT p.id, s.sku, 0, NULL, 0, s.image, s.attributes, now(), now()
+            FROM {self.STAGE_TABLE} s
+            JOIN {Product._meta.db_table} p ON p.slug = s.slug
+            ON CONFLICT (sku) DO UPDATE SET
+                product_id = EXCLUDED.product_id,
+                attributes = EXCLUDED.attributes,
+                image = EXCLUDED.image,
+                updated_at = EXCLUDED.updated_at
+            RETURNING (xmax = 0) AS inserted
+            """
+        )
+        inserted = [row[0] for row in cursor.fetchall()]
+        created = sum(inserted)
+        return created, len(inserted) - created
+
+    def import_batch(self, items: Iterable[tuple]) -> Dict[str, Any]:
+        """
+        Imports a batch of (ordinal, item) pairs in one transaction and
+        returns its statistics, including the `changes` (created and updated
+        rows with their changed fields). Unchanged rows are not written, and
+        with `dry_run` nothing is.
+        """
+        rows, errors = self.prepare_rows(items)
+        warnings = self.resolve_images(rows)
+        self.classify(rows)
+        changed = [row for row in rows if row["change"] != "unchanged"]
+
+        stats = {
+            "products_created": 0,
+            "variants_created": 0,
+            "variants_updated": 0,
+            "variants_unchanged": len(rows) - len(changed),
+            "changes": [
+                (row["sku"], row["change"], row["changed_fields"]) for row in changed
+            ],
+            "errors": errors,
+            "warnings": warnings,
+        }
+        if not changed:
+            return stats
+
+        if self.dry_run:
+            existing_slugs = set(
+                Product.objects.filter(
+                    slug__in={row["slug"] for row in changed}
+                ).values_list("slug", flat=True)
+            )
+            stats["products_created"] = len(
+                {row["slug"] for row in changed} - existing_slugs
+            )
+            stats["variants_created"] = sum(
+                1 for row in changed if row["change"] == "created"
+            )
+            stats["variants_updated"] = len(changed) - stats["variants_created"]
+            return stats
+
+        self.save_images(changed)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            self._stage(cursor, changed)
+            stats["products_created"] = self._upsert_products(cursor)
+            self._attach_categories(cursor)
+            conflicts = self._reject_attribute_conflicts(cursor)
+            created, updated = self._upsert_variants(cursor)
+
+            # The statements above bypass model signals.
+            rejected = {sku for sku, _ in conflicts}
+            imported = [row for row in changed if row["sku"] not in rejected]
+            skus = [row["sku"] for row in imported]
+            slugs = list({row["slug"] for row in imported})
+            queue_renditions(
+                "products.ProductVariant.image", [row["image"] for row in imported]
+            )
+            queue_renditions(
+                "products.Product.thumbnail", [row["image"] for row in imported]
+            )
+            transaction.on_commit(
+                lambda: catalogue_bulk_changed.send(
+                    sender=ProductVariant, skus=skus, slugs=slugs
+                )
+            )
+
+        stats["errors"].extend(conflicts)
+        stats["changes"] = [
+            change for change in stats["changes"] if change[0] not in rejected
+        ]
+        stats["variants_created"] = created
+        stats["variants_updated"] = updated
+        return stats
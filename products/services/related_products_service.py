@@ -0,0 +1,438 @@
+import math
+from datetime import timedelta
+from itertools import islice
+from statistics import median
+from typing import Dict, Iterable, List, Set
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+from scipy import sparse
+
+from common.jobs import iter_keyset_batches
+from products.models import (
+    Collection,
+    Product,
+    ProductVariant,
+    RelatedProduct,
+    RelatedProductsIdf,
+)
+from products.services.category_classifier import (
+    HashedNgramVectorizer,
+    normalize_rows,
+)
+
+
+def _widen(matrix: sparse.csr_matrix, width: int) -> sparse.csr_matrix:
+    return sparse.csr_matrix(
+        (matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], width)
+    )
+
+
+class ProductIndex:
+    """
+    Feature matrix of the published products, in product id order: one
+    L2-normalized block per signal, each scaled by the square root of its
+    weight, so the dot product of two rows is the weighted sum of the
+    per-signal cosine similarities.
+
+    `thresholds` holds, per row, the score another product must beat to
+    enter the product's stored list: its weakest score once the list is
+    full, 0 until then.
+    """
+
+    def __init__(
+        self,
+        product_ids: List[int],
+        blocks: Dict[str, sparse.csr_matrix],
+        idf: np.ndarray = None,
+        thresholds: np.ndarray = None,
+    ):
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.blocks = blocks
+        self.idf = idf
+        self.rows = {
+            int(product_id): row for row, product_id in enumerate(self.product_ids)
+        }
+        if thresholds is None:
+            thresholds = np.zeros(len(self.product_ids), dtype=np.float64)
+        self.thresholds = thresholds
+        if blocks:
+            self.matrix = sparse.hstack(list(blocks.values())).tocsr()
+        else:
+            self.matrix = sparse.csr_matrix((len(self.product_ids), 0))
+        self.matrix_t = sparse.csr_matrix(self.matrix.T)
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def updated(self, changed: Set[int], index: "ProductIndex") -> "ProductIndex":
+        """
+        Returns a copy with the rows of the `changed` products replaced by
+        the rows of `index`, built for those of them still published.
+        Every row is scored on its own, so the other rows stay valid.
+        """
+        keep = np.flatnonzero(~np.isin(self.product_ids, list(changed)))
+        product_ids = np.concatenate([self.product_ids[keep], index.product_ids])
+        order = np.argsort(product_ids, kind="stable")
+
+        blocks = {}
+        for name in dict.fromkeys([*self.blocks, *index.blocks]):
+            parts = []
+            if name in self.blocks:
+                parts.append(self.blocks[name][keep])
+            if name in index.blocks:
+                parts.append(index.blocks[name])
+            # One-hot blocks are as wide as the largest id seen so far.
+            width = max(part.shape[1] for part in parts)
+            blocks[name] = sparse.vstack(
+                [_widen(part, width) for part in parts]
+            ).tocsr()[order]
+
+        thresholds = np.concatenate([self.thresholds[keep], index.thresholds])
+        return ProductIndex(product_ids[order], blocks, self.idf, thresholds[order])
+
+    def similarities(self, rows: List[int]) -> np.ndarray:
+        """Dense (len(rows), len(self)) similarities, self-matches excluded."""
+        scores = (self.matrix[rows] @ self.matrix_t).toarray()
+        scores[np.arange(len(rows)), rows] = -np.inf
+        return scores
+
+
+class RelatedProductsService:
+    """
+    Maintains the `RelatedProduct` table: the top-K most similar published
+    products of every published product, by category overlap, collection
+    membership, variant dimensions and text.
+
+    `rebuild()` recomputes every list and freezes the text IDF weights.
+    `refresh(product_ids)` recomputes the lists of the changed products and
+    only of the other products whose lists they enter or leave, scoring with
+    the frozen weights. The result matches a rebuild with those weights as
+    long as every change is reported. The weights drift from the catalogue as
+    products change, so `refresh()` rebuilds once they are older than
+    `rebuild_after`.
+
+    The index is kept between refreshes of the same service, and each
+    refresh only rebuilds the rows of the changed products. A rebuild, here
+    or in another process, replaces the frozen weights and with them the
+    kept index.
+    """
+
+    WEIGHTS = {
+        "categories": 0.35,
+        "collections": 0.15,
+        "dimensions": 0.1,
+        "text": 0.4,
+    }
+
+    DIMENSIONS = ["width", "height", "depth"]
+    # Sizes are binned on a log scale, three bins per doubling, with the
+    # neighbouring bins half set so close sizes still overlap.
+    DIMENSION_BINS = 40
+    BINS_PER_DOUBLING = 3
+
+    def __init__(
+        self,
+        k: int = 12,
+        chunk_size: int = 256,
+        rebuild_after: timedelta = timedelta(days=1),
+    ):
+        self.k = k
+        self.chunk_size = chunk_size
+        self.rebuild_after = rebuild_after
+        self.vectorizer = HashedNgramVectorizer()
+        # The kept index and the id of the frozen weights it was built with.
+        self._index = None
+        self._index_idf_id = None
+
+    # --- Features ---
+
+    def _one_hot(
+        self, pairs: Iterable[tuple], rows: Dict[int, int]
+    ) -> sparse.csr_matrix:
+        row_index, col_index = [], []
+        for product_id, value_id in pairs:
+            if product_id in rows:
+                row_index.append(rows[product_id])
+                col_index.append(value_id)
+        return sparse.csr_matrix(
+            (np.ones(len(row_index), dtype=np.float32), (row_index, col_index)),
+            shape=(len(rows), max(col_index, default=0) + 1),
+        )
+
+    def _dimension_bin(self, value) -> int:
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+        if value <= 0 or math.isnan(value):
+            return None
+        return min(
+            max(round(math.log2(max(value, 1)) * self.BINS_PER_DOUBLING), 0),
+            self.DIMENSION_BINS - 1,
+        )
+
+    def _dimensions(self, rows: Dict[int, int], published: Q) -> sparse.csr_matrix:
+        values: Dict[int, Dict[str, list]] = {}
+        for product_id, attributes in ProductVariant.objects.filter(
+            published
+        ).values_list("product_id", "attributes"):
+            if product_id not in rows:
+                continue
+            for dimension in self.DIMENSIONS:
+                if dimension in (attributes or {}):
+                    values.setdefault(product_id, {}).setdefault(dimension, []).append(
+                        attributes[dimension]
+                    )
+
+        row_index, col_index, data = [], [], []
+        for product_id, dimensions in values.items():
+            for offset, dimension in enumerate(self.DIMENSIONS):
+                bins = [self._dimension_bin(v) for v in dimensions.get(dimension, [])]
+                bins = [b for b in bins if b is not None]
+                if not bins:
+                    continue
+                center = round(median(bins))
+                for delta, weight in ((-1, 0.5), (0, 1.0), (1, 0.5)):
+                    if 0 <= center + delta < self.DIMENSION_BINS:
+                        row_index.append(rows[product_id])
+                        col_index.append(offset * self.DIMENSION_BINS + center + delta)
+                        data.append(weight)
+
+        return sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), (row_index, col_index)),
+            shape=(len(rows), len(self.DIMENSIONS) * self.DIMENSION_BINS),
+        )
+
+    def _text(self, products, idf: np.ndarray = None) -> tuple:
+        """
+        Returns the product ids, in pk order, their text vectors and the IDF
+        weights applied, computed from `products` unless `idf` is given.
+        """
+        product_ids = []
+        blocks = []
+        for _, batch in iter_keyset_batches(products, 2000):
+            product_ids.extend(product.pk for product in batch)
+            blocks.append(
+                self.vectorizer.transform(
+                    self.vectorizer.get_text(product) for product in batch
+                )
+            )
+        if not blocks:
+            return product_ids, None, idf
+        matrix = sparse.vstack(blocks).tocsr()
+
+        if idf is None:
+            document_frequency = np.bincount(
+                matrix.indices, minlength=self.vectorizer.n_features
+            )
+            idf = np.log((1 + matrix.shape[0]) / (1 + document_frequency)) + 1
+            idf = idf.astype(np.float32)
+        return product_ids, sparse.csr_matrix(matrix @ sparse.diags(idf)), idf
+
+    def build_index(
+        self, idf: np.ndarray = None, only: Iterable[int] = None
+    ) -> ProductIndex:
+        """
+        Indexes the published products, or those of them in `only`. The
+        thresholds are left at 0.
+        """
+        products = Product.objects.filter(status=Product.Status.PUBLISHED)
+        published = Q(product__status=Product.Status.PUBLISHED)
+        if only is not None:
+            only = list(only)
+            products = products.filter(pk__in=only)
+            published &= Q(product_id__in=only)
+
+        # The text pass decides which products are in the index; the other
+        # signals are looked up for exactly those rows.
+        product_ids, text, idf = self._text(
+            products.only("id", "title", "description", "specifications"),
+            idf=idf,
+        )
+        if not product_ids:
+            return ProductIndex([], {}, idf)
+        rows = {product_id: row for row, product_id in enumerate(product_ids)}
+
+        blocks = {
+            "categories": self._one_hot(
+                Product.categories.through.objects.filter(published).values_list(
+                    "product_id", "category_id"
+                ),
+                rows,
+            ),
+            "collections": self._one_hot(
+                Collection.products.through.objects.filter(
+                    published, collection__is_active=True
+                ).values_list("product_id", "collection_id"),
+                rows,
+            ),
+            "dimensions": self._dimensions(rows, published),
+            "text": text,
+        }
+
+        return ProductIndex(
+            product_ids,
+            {
+                name: sparse.csr_matrix(
+                    normalize_rows(block.tocsr()) * math.sqrt(self.WEIGHTS[name])
+                )
+                for name, block in blocks.items()
+            },
+            idf,
+        )
+
+    def _load_thresholds(self, index: ProductIndex, product_ids: List[int] = None):
+        """
+        Reads the thresholds of the stored lists of `product_ids` (default:
+        all) into `index`.
+        """
+        lists = RelatedProduct.objects.all()
+        if product_ids is not None:
+            lists = lists.filter(product_id__in=product_ids)
+            for product_id in product_ids:
+                if product_id in index.rows:
+                    index.thresholds[index.rows[product_id]] = 0
+
+        for product_id, weakest, count in (
+            lists.values("product_id")
+            .annotate(weakest=Min("score"), count=Count("pk"))
+            .values_list("product_id", "weakest", "count")
+        ):
+            if product_id in index.rows and count >= self.k:
+                index.thresholds[index.rows[product_id]] = weakest
+
+    # --- Neighbours ---
+
+    def _neighbours(self, index: ProductIndex, product_ids: List[int]):
+        """Yields RelatedProduct rows for `product_ids`, a chunk at a time."""
+        rows = [index.rows[product_id] for product_id in product_ids]
+        k = min(self.k, len(index) - 1)
+        if k <= 0:
+            return
+
+        for start in range(0, len(rows), self.chunk_size):
+            chunk = rows[start : start + self.chunk_size]
+            scores = index.similarities(chunk)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+            for i, row in enumerate(chunk):
+                order = top[i][np.argsort(-scores[i, top[i]])]
+                rank = 0
+                for j in order:
+                    if scores[i, j] <= 0:
+                        break
+                    rank += 1
+                    yield RelatedProduct(
+                        product_id=int(index.product_ids[row]),
+                        related_id=int(index.product_ids[j]),
+                        rank=rank,
+                        score=float(scores[i, j]),
+                    )
+
+    @staticmethod
+    def _write(related: Iterable[RelatedProduct], batch_size: int = 5000):
+        # bulk_create() would materialize the whole generator.
+        related = iter(related)
+        while batch := list(islice(related, batch_size)):
+            RelatedProduct.objects.bulk_create(batch)
+
+    def _replace(self, index: ProductIndex, product_ids: Set[int]):
+        live = sorted(
+            product_id for product_id in product_ids if product_id in index.rows
+        )
+        with transaction.atomic():
+            RelatedProduct.objects.filter(product_id__in=list(product_ids)).delete()
+            self._write(self._neighbours(index, live))
+
+    def rebuild(self) -> int:
+        """
+        Recomputes every list and freezes the IDF weights for later refreshes.
+        Returns the number of products indexed.
+        """
+        self._index = None
+        index = self.build_index()
+        with transaction.atomic():
+            RelatedProduct.objects.all().delete()
+            self._write(self._neighbours(index, list(index.product_ids)))
+            RelatedProductsIdf.objects.all().delete()
+            if index.idf is None:
+                return len(index)
+            frozen = RelatedProductsIdf.objects.create(
+                weights=index.idf.tobytes(), product_count=len(index)
+            )
+
+        self._load_thresholds(index)
+        self._index, self._index_idf_id = index, frozen.pk
+        return len(index)
+
+    def _get_frozen(self) -> tuple:
+        """
+        (id, weights) of the IDF weights of the last rebuild, or None if
+        they are too old.
+        """
+        frozen = RelatedProductsIdf.objects.first()
+        if frozen is None or frozen.updated_at < timezone.now() - self.rebuild_after:
+            return None
+        idf = np.frombuffer(bytes(frozen.weights), dtype=np.float32)
+        if len(idf) != self.vectorizer.n_features:
+            return None
+        return frozen.pk, idf
+
+    def get_frozen_idf(self) -> np.ndarray:
+        """The IDF weights of the last rebuild, or None if they are too old."""
+        frozen = self._get_frozen()
+        return None if frozen is None else frozen[1]
+
+    def _get_index(self, idf_id: int, idf: np.ndarray) -> ProductIndex:
+        """The kept index, or a full one if the frozen weights changed."""
+        if self._index is None or self._index_idf_id != idf_id:
+            self._index = self.build_index(idf=idf)
+            self._index_idf_id = idf_id
+            self._load_thresholds(self._index)
+        return self._index
+
+    def refresh(self, product_ids: Iterable[int]) -> int:
+        """
+        Recomputes the lists affected by changes to `product_ids` (edited,
+        unpublished or deleted products), or every list when the frozen IDF
+        weights are missing or stale. Returns the number of lists recomputed.
+        """
+        changed = set(product_ids)
+        if not changed:
+            return 0
+
+        frozen = self._get_frozen()
+        if frozen is None:
+            return self.rebuild()
+        idf_id, idf = frozen
+        index = self._get_index(idf_id, idf).updated(
+            changed, self.build_index(idf=idf, only=changed)
+        )
+        # Until the lists are written, the kept index is ahead of them.
+        self._index = None
+
+        # Lists that contain a changed product may lose it or reorder.
+        affected = set(changed)
+        affected.update(
+            RelatedProduct.objects.filter(related_id__in=list(changed)).values_list(
+                "product_id", flat=True
+            )
+        )
+
+        # Lists a changed product now scores high enough to enter: those
+        # not full yet, or whose weakest neighbour it beats.
+        live = [product_id for product_id in changed if product_id in index.rows]
+        if live and len(index) > 1:
+            rows = [index.rows[product_id] for product_id in live]
+            for start in range(0, len(rows), self.chunk_size):
+                scores = index.similarities(rows[start : start + self.chunk_size])
+                entered = (scores > index.thresholds[None, :]).any(axis=0)
+                affected.update(index.product_ids[entered].tolist())
+
+        self._replace(index, affected)
+        self._load_thresholds(index, sorted(affected))
+        self._index, self._index_idf_id = index, idf_id
+        return len(affected)
@@ -0,0 +1,182 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from products.cache import invalidate_product_summaries, invalidate_variant_summaries
+from products.models import (
+    Category,
+    Collection,
+    Product,
+    ProductGalleryImage,
+    ProductVariant,
+    RelatedProduct,
+)
+from products.tasks import record_related_changes
+
+# Fields that feed the related-products similarity index.
+RELATED_PRODUCT_FIELDS = {"title", "description", "specifications", "status"}
+RELATED_BULK_FIELDS = RELATED_PRODUCT_FIELDS | {
+    "attributes",
+    "categories",
+    "collections",
+}
+
+# Sent after set-based writes that bypass model signals (bulk imports and
+# admin actions), with the `skus` and product `slugs` that changed, and
+# optionally the names of the `fields` that changed (None means any).
+catalogue_bulk_changed = Signal()
+
+
+@receiver([post_save, post_delete], sender=ProductVariant)
+def invalidate_variant_cache(sender, instance, **kwargs):
+    invalidate_variant_summaries([instance.sku])
+
+
+@receiver(pre_save, sender=ProductVariant)
+def invalidate_renamed_variant_cache(sender, instance, update_fields=None, **kwargs):
+    """Summaries are keyed by sku, so a rename leaves one under the old sku."""
+    if instance.pk is None or (
+        update_fields is not None and "sku" not in update_fields
+    ):
+        return
+    previous_sku = (
+        ProductVariant.objects.filter(pk=instance.pk)
+        .values_list("sku", flat=True)
+        .first()
+    )
+    if previous_sku and previous_sku != instance.sku:
+        invalidate_variant_summaries([previous_sku])
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    invalidate_product_summaries([instance.slug])
+    # Variant summaries embed the product's slug and title.
+    invalidate_variant_summaries(instance.variants.values_list("sku", flat=True))
+
+
+@receiver(pre_save, sender=Product)
+def invalidate_renamed_product_cache(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (
+        update_fields is not None and "slug" not in update_fields
+    ):
+        return
+    previous_slug = (
+        Product.objects.filter(pk=instance.pk).values_list("slug", flat=True).first()
+    )
+    if previous_slug and previous_slug != instance.slug:
+        invalidate_product_summaries([previous_slug])
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def touch_product_on_category_change(sender, instance, action, pk_set, **kwargs):
+    """
+    Category changes don't save the product, so bump `updated_at` for
+    consumers (like the catalogue feed) that track changes by timestamp.
+    """
+    if isinstance(instance, Product):
+        if action in ("post_add", "post_remove", "post_clear"):
+            Product.objects.filter(pk=instance.pk).update(updated_at=timezone.now())
+    elif action == "pre_clear":
+        # Clearing a category doesn't report its products; it runs in the
+        # same transaction as the touch.
+        instance.products.update(updated_at=timezone.now())
+    elif action in ("post_add", "post_remove"):
+        Product.objects.filter(pk__in=pk_set or []).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Category)
+def touch_products_on_category_save(sender, instance, created, **kwargs):
+    """The catalogue feed renders the title of a product's first category."""
+    if not created:
+        instance.products.update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Category)
+def touch_products_on_category_delete(sender, instance, **kwargs):
+    # The membership rows are deleted without m2m_changed.
+    instance.products.update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=ProductGalleryImage)
+def touch_product_on_gallery_delete(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver(catalogue_bulk_changed)
+def invalidate_bulk_changed_cache(sender, skus=(), slugs=(), **kwargs):
+    invalidate_variant_summaries(skus)
+    invalidate_product_summaries(slugs)
+
+
+@receiver(post_save, sender=Product)
+def queue_related_refresh(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not RELATED_PRODUCT_FIELDS & set(update_fields):
+        return
+    record_related_changes([instance.pk])
+
+
+@receiver(pre_delete, sender=Product)
+def queue_related_removal(sender, instance, **kwargs):
+    """The lists that contain the product lose a row when it is deleted."""
+    record_related_changes(
+        [
+            instance.pk,
+            *RelatedProduct.objects.filter(related=instance).values_list(
+                "product_id", flat=True
+            ),
+        ]
+    )
+
+
+@receiver([post_save, post_delete], sender=ProductVariant)
+def queue_related_refresh_for_variant(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and "attributes" not in update_fields:
+        return
+    record_related_changes([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+@receiver(m2m_changed, sender=Collection.products.through)
+def queue_related_refresh_for_membership(sender, instance, action, pk_set, **kwargs):
+    if isinstance(instance, Product):
+        if action in ("post_add", "post_remove", "post_clear"):
+            record_related_changes([instance.pk])
+    elif action == "pre_clear":
+        # Clearing a category or collection doesn't report its products.
+        record_related_changes(instance.products.values_list("pk", flat=True))
+    elif action in ("post_add", "post_remove"):
+        record_related_changes(pk_set or [])
+
+
+@receiver(post_save, sender=Collection)
+def queue_related_refresh_for_collection(sender, instance, created, **kwargs):
+    # Only active collections are a similarity signal, so toggling
+    # `is_active` changes the features of every product in it.
+    if not created:
+        record_related_changes(instance.products.values_list("pk", flat=True))
+
+
+@receiver(pre_delete, sender=Collection)
+def queue_related_refresh_for_collection_removal(sender, instance, **kwargs):
+    # The membership rows are deleted without m2m_changed.
+    record_related_changes(instance.products.values_list("pk", flat=True))
+
+
+@receiver(catalogue_bulk_changed)
+def queue_bulk_related_refresh(sender, skus=(), slugs=(), fields=None, **kwargs):
+    if fields is not None and not RELATED_BULK_FIELDS & set(fields):
+        return
+    product_ids = set(
+        Product.objects.filter(slug__in=slugs).values_list("pk", flat=True)
+    )
+    product_ids.update(
+        ProductVariant.objects.filter(sku__in=skus).values_list("product_id", flat=True)
+    )
+    record_related_changes(product_ids)
@@ -0,0 +1,69 @@
+import logging
+
+from django.utils import timezone
+
+from products.models import RelatedProductsRefresh
+from products.services.related_products_service import RelatedProductsService
+
+logger = logging.getLogger(__name__)
+
+
+def record_related_changes(product_ids):
+    """
+    Queues products whose related-product lists must be recomputed. A
+    product that is already queued is re-armed rather than duplicated.
+
+    Bulk writes that bypass model signals must send `catalogue_bulk_changed`
+    or call this themselves.
+    """
+    now = timezone.now()
+    RelatedProductsRefresh.objects.bulk_create(
+        [
+            RelatedProductsRefresh(
+                product_id=product_id, changed_at=now, available_at=now
+            )
+            for product_id in set(product_ids)
+        ],
+        update_conflicts=True,
+        unique_fields=["product_id"],
+        update_fields=["status", "attempts", "available_at", "changed_at"],
+    )
+
+
+def process_related_refresh_batch(
+    batch_size=500, max_attempts=3, backoff_seconds=60, service=None
+):
+    """
+    Claims up to `batch_size` changed products and refreshes the related
+    lists they affect. Pass the same `service` to every batch so it keeps
+    its similarity index between them. Returns the number of products
+    handled.
+    """
+    items = RelatedProductsRefresh.objects.claim(batch_size, max_attempts=max_attempts)
+    if not items:
+        return 0
+
+    claimed_at = items[0].locked_at
+
+    try:
+        service = service or RelatedProductsService()
+        refreshed = service.refresh(item.product_id for item in items)
+    except Exception as e:
+        for item in items:
+            status = item.mark_failed(
+                e, max_attempts=max_attempts, backoff_seconds=backoff_seconds
+            )
+        logger.error(
+            f"Failed to refresh related products of {len(items)} products "
+            f"(attempt {items[0].attempts}, now {status}): {e}"
+        )
+        return len(items)
+
+    # Products changed again while the batch ran were re-armed by
+    # `record_related_changes` and must stay queued.
+    RelatedProductsRefresh.objects.filter(
+        pk__in=[item.pk for item in items], changed_at__lte=claimed_at
+    ).mark_completed()
+
+    logger.info(f"Related products: {len(items)} changes, {refreshed} lists refreshed.")
+    return len(items)
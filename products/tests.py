@@ -1 +1,331 @@
-# Create your tests here.
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from products.cache import get_product_summary
+from products.models import (
+    Attribute,
+    Category,
+    Collection,
+    Product,
+    ProductGalleryImage,
+    ProductType,
+    ProductVariant,
+    RelatedProduct,
+    RelatedProductsIdf,
+    RelatedProductsRefresh,
+)
+from products.services.bulk_product_service import adjust_prices
+from products.services.related_products_service import RelatedProductsService
+
+
+class AdminChangelistQueryCountTestCase(TestCase):
+    """
+    Change lists must run a fixed number of queries, however many rows they
+    show: a per-row query (N+1) makes the count grow with the rows.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            username="admin", email="admin@example.com", password="password"
+        )
+        size = Attribute.objects.create(
+            name="Size", slug="size", choices=["S", "M", "L"]
+        )
+        cls.product_type = ProductType.objects.create(name="Statue")
+        cls.product_type.allowed_attributes.add(size)
+        cls.root = Category.objects.create(title="Garden")
+        cls.rows = 0
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_product(self):
+        AdminChangelistQueryCountTestCase.rows += 1
+        n = self.rows
+        product = Product.objects.create(
+            product_type=self.product_type,
+            title=f"Statue {n}",
+            thumbnail=f"products/statue-{n}.jpg",
+        )
+        product.categories.add(self.root)
+        variant = ProductVariant.objects.create(
+            product=product,
+            sku=f"STATUE-{n}",
+            price="10.00",
+            image=f"products/statue-{n}.jpg",
+            attributes={"size": "S"},
+        )
+        ProductGalleryImage.objects.create(
+            product=product, variant=variant, image=f"products/statue-{n}-1.jpg"
+        )
+        Category.objects.create(title=f"Garden {n}", parent=self.root)
+
+    def assertChangelistQueriesConstant(self, model):
+        url = reverse(f"admin:products_{model._meta.model_name}_changelist")
+        self.create_product()
+        with CaptureQueriesContext(connection) as baseline:
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+        for _ in range(4):
+            self.create_product()
+        with self.assertNumQueries(len(baseline)):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def search(self, model, term):
+        url = reverse(f"admin:products_{model._meta.model_name}_changelist")
+        response = self.client.get(url, {"q": term})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context["cl"].result_list)
+
+    def test_search_by_slug_and_product_title(self):
+        self.create_product()
+        product = Product.objects.get(title=f"Statue {self.rows}")
+        self.assertEqual(self.search(Product, product.slug), [product])
+        self.assertEqual(
+            self.search(ProductVariant, product.title),
+            list(product.variants.all()),
+        )
+
+    def test_product_changelist(self):
+        self.assertChangelistQueriesConstant(Product)
+
+    def test_product_variant_changelist(self):
+        self.assertChangelistQueriesConstant(ProductVariant)
+
+    def test_product_gallery_image_changelist(self):
+        self.assertChangelistQueriesConstant(ProductGalleryImage)
+
+    def test_category_changelist(self):
+        self.assertChangelistQueriesConstant(Category)
+
+
+class AdjustPricesTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            username="admin", email="admin@example.com", password="password"
+        )
+        size = Attribute.objects.create(name="Size", slug="size", choices=["S"])
+        product_type = ProductType.objects.create(name="Statue")
+        product_type.allowed_attributes.add(size)
+        product = Product.objects.create(
+            product_type=product_type, title="Statue", thumbnail="products/s.jpg"
+        )
+        cls.variant = ProductVariant.objects.create(
+            product=product,
+            sku="STATUE",
+            price="10.00",
+            compare_at_price="12.00",
+            image="products/s.jpg",
+            attributes={"size": "S"},
+        )
+
+    def assertPrices(self, price, compare_at_price):
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.price, Decimal(price))
+        self.assertEqual(self.variant.compare_at_price, Decimal(compare_at_price))
+
+    def test_adjust_prices(self):
+        variants = ProductVariant.objects.all()
+        self.assertEqual(adjust_prices(variants, Decimal("12.5")), 1)
+        self.assertPrices("11.25", "12.00")
+        adjust_prices(variants, Decimal("-20"), compare_at_price=True)
+        self.assertPrices("9.00", "9.60")
+
+    def test_out_of_range_prices_are_rejected(self):
+        variants = ProductVariant.objects.all()
+        for percent in ["-100", "-99.99", "1000.01"]:
+            with self.assertRaises(ValueError):
+                adjust_prices(variants, Decimal(percent))
+        ProductVariant.objects.update(price="50000000.00")
+        with self.assertRaises(ValueError):
+            adjust_prices(variants, Decimal("100"))
+        self.assertPrices("50000000.00", "12.00")
+
+    def test_admin_action_reports_errors(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("admin:products_productvariant_changelist"),
+            {
+                "action": "reprice_variants",
+                "_selected_action": [self.variant.pk],
+                "percent": "9999",
+            },
+            follow=True,
+        )
+        self.assertContains(response, "at most 1000%")
+        self.assertPrices("10.00", "12.00")
+
+
+class RelatedProductsTestCase(TestCase):
+    TITLES = [
+        "Marble lion statue",
+        "Bronze lion statue",
+        "Marble garden fountain",
+        "Stone garden bench",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product_type = ProductType.objects.create(name="Statue")
+
+    def create_product(self, title):
+        return Product.objects.create(
+            product_type=self.product_type,
+            title=title,
+            description=f"A {title.lower()} for the garden.",
+            status=Product.Status.PUBLISHED,
+            thumbnail="products/s.jpg",
+        )
+
+    def stored_lists(self):
+        return {
+            (entry.product_id, entry.related_id): round(entry.score, 6)
+            for entry in RelatedProduct.objects.all()
+        }
+
+    def test_refresh_matches_a_rebuild_with_the_frozen_idf(self):
+        service = RelatedProductsService(k=2)
+        for title in self.TITLES:
+            self.create_product(title)
+        service.rebuild()
+
+        # Changes the document frequencies of "marble" and "lion".
+        added = self.create_product("Marble lion bust")
+        service.refresh([added.pk])
+
+        index = service.build_index(idf=service.get_frozen_idf())
+        expected = {
+            (entry.product_id, entry.related_id): round(entry.score, 6)
+            for entry in service._neighbours(index, list(index.product_ids))
+        }
+        self.assertEqual(self.stored_lists(), expected)
+
+    def test_kept_index_follows_changes(self):
+        service = RelatedProductsService(k=2)
+        products = [self.create_product(title) for title in self.TITLES]
+        service.rebuild()
+
+        garden = Category.objects.create(title="Garden")
+        products[0].categories.add(garden)
+        products[2].categories.add(garden)
+        products[1].title = "Stone garden lion"
+        products[1].save()
+        products[3].status = Product.Status.DRAFT
+        products[3].save()
+        added = self.create_product("Marble lion bust")
+
+        texts = []
+        get_text = service.vectorizer.get_text
+        with mock.patch.object(
+            service.vectorizer,
+            "get_text",
+            lambda product: texts.append(product.pk) or get_text(product),
+        ):
+            service.refresh([products[0].pk, products[1].pk, products[2].pk])
+            service.refresh([products[3].pk, added.pk])
+
+        # Only the changed products were indexed again.
+        self.assertEqual(
+            sorted(texts),
+            sorted([products[0].pk, products[1].pk, products[2].pk, added.pk]),
+        )
+        index = service.build_index(idf=service.get_frozen_idf())
+        expected = {
+            (entry.product_id, entry.related_id): round(entry.score, 6)
+            for entry in service._neighbours(index, list(index.product_ids))
+        }
+        self.assertEqual(self.stored_lists(), expected)
+
+    def test_stale_idf_triggers_a_rebuild(self):
+        service = RelatedProductsService(k=2)
+        products = [self.create_product(title) for title in self.TITLES]
+        service.rebuild()
+        RelatedProductsIdf.objects.update(updated_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(service.refresh([products[0].pk]), len(products))
+        self.assertIsNotNone(service.get_frozen_idf())
+
+    def test_toggling_a_collection_queues_its_products(self):
+        products = [self.create_product(title) for title in self.TITLES[:2]]
+        collection = Collection.objects.create(title="Lions")
+        collection.products.add(*products)
+        RelatedProductsRefresh.objects.all().delete()
+
+        collection.is_active = False
+        collection.save()
+
+        self.assertEqual(
+            set(RelatedProductsRefresh.objects.values_list("product_id", flat=True)),
+            {product.pk for product in products},
+        )
+
+
+class CategoryChangeTouchesProductsTestCase(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(title="Garden")
+        self.product = Product.objects.create(
+            product_type=ProductType.objects.create(name="Statue"),
+            title="Statue",
+            thumbnail="products/s.jpg",
+        )
+        self.product.categories.add(self.category)
+        self.long_ago = timezone.now() - timedelta(days=1)
+        Product.objects.update(updated_at=self.long_ago)
+
+    def assertTouched(self):
+        self.product.refresh_from_db()
+        self.assertGreater(self.product.updated_at, self.long_ago)
+
+    def test_renaming_a_category_touches_its_products(self):
+        self.category.title = "Outdoor"
+        self.category.save()
+        self.assertTouched()
+
+    def test_clearing_a_category_touches_its_products(self):
+        self.category.products.clear()
+        self.assertTouched()
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class ProductSummaryCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            product_type=ProductType.objects.create(name="Statue"),
+            title="Statue",
+            slug="statue",
+            thumbnail="products/s.jpg",
+        )
+
+    def test_summary_is_invalidated_on_commit(self):
+        get_product_summary("statue")
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.title = "Bust"
+            self.product.save()
+            self.assertEqual(get_product_summary("statue")["title"], "Statue")
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_product_summary("statue")["title"], "Bust")
+
+    def test_renamed_slug_is_invalidated(self):
+        get_product_summary("statue")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.slug = "bust"
+            self.product.save()
+
+        self.assertIsNone(get_product_summary("statue"))
@@ -1,10 +1,13 @@
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
+from rest_framework.decorators import action
 from rest_framework.generics import ListAPIView, RetrieveAPIView
+from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
+from orders.bought_together import get_companions
 from products.filters import ProductFilter
-from products.models import Category, Collection, Product
+from products.models import Category, Collection, Product, RelatedProduct
 from products.serializers import (
     CategorySerializer,
     CategoryTreeSerializer,
@@ -66,4 +69,38 @@ class ProductViewSet(ReadOnlyModelViewSet):
                 "collections",
             )
 
+        if self.action in ("related", "bought_together"):
+            return queryset
+
         return queryset.prefetch_related("categories")
+
+    @action(detail=True, methods=["get"])
+    def related(self, request, slug=None):
+        """
+        Similar products, read from the precomputed neighbour table (see
+        `refresh_related_products`).
+        """
+        product = self.get_object()
+        entries = (
+            RelatedProduct.objects.filter(
+                product=product, related__status=Product.Status.PUBLISHED
+            )
+            .select_related("related")
+            .prefetch_related("related__categories")
+            .order_by("rank")
+        )
+        serializer = ProductListSerializer(
+            [entry.related for entry in entries],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return Response(serializer.data)
+
+    @action(detail=True, methods=["get"], url_path="bought-together")
+    def bought_together(self, request, slug=None):
+        """
+        Variants often bought with this product's variants, from the cached
+        companions mined by `mine_bought_together`.
+        """
+        product = self.get_object()
+        return Response(get_companions(product.variants.values_list("pk", flat=True)))
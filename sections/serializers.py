@@ -1,20 +1,23 @@
 from rest_framework import serializers
 
+from common.serializers import SrcsetField
 from products.serializers import CategorySerializer, ProductListSerializer
 from sections.models import FeaturedCategory, FeaturedProduct
 
 
 class FeaturedProductSerializer(serializers.ModelSerializer):
     product = ProductListSerializer()
+    image_srcset = SrcsetField(source="image")
 
     class Meta:
         model = FeaturedProduct
-        fields = ["product", "image"]
+        fields = ["product", "image", "image_srcset"]
 
 
 class FeaturedCategorySerializer(serializers.ModelSerializer):
     category = CategorySerializer()
+    image_srcset = SrcsetField(source="image")
 
     class Meta:
         model = FeaturedCategory
-        fields = ["category", "image"]
+        fields = ["category", "image", "image_srcset"]
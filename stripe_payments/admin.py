@@ -1 +1,27 @@
-# Register your models here.
+from django.contrib import admin
+
+from .models import StripeWebhookEvent
+
+
+@admin.register(StripeWebhookEvent)
+class StripeWebhookEventAdmin(admin.ModelAdmin):
+    list_display = [
+        "stripe_event_id",
+        "event_type",
+        "status",
+        "attempts",
+        "available_at",
+        "processed_at",
+    ]
+    list_filter = ["status", "event_type"]
+    search_fields = ["stripe_event_id"]
+    readonly_fields = ["stripe_event_id", "event_type", "payload", "last_error"]
+
+    @admin.action(description="Retry selected events")
+    def retry_events(self, request, queryset):
+        updated = queryset.update(
+            status=StripeWebhookEvent.Status.PENDING, attempts=0, locked_at=None
+        )
+        self.message_user(request, f"{updated} events re-queued.")
+
+    actions = [retry_events]
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from common.workers import run_worker_pool
+from stripe_payments.services.stripe_event_queue_service import (
+    StripeEventQueueService,
+)
+
+
+class Command(BaseCommand):
+    help = "Processes queued Stripe webhook events with a pool of workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Worker threads")
+        parser.add_argument(
+            "--batch-size", type=int, default=50, help="Events claimed per batch"
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=8,
+            help="Attempts before an event is dead-lettered",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is drained instead of polling forever",
+        )
+
+    def handle(self, *args, **options):
+        service = StripeEventQueueService(max_attempts=options["max_attempts"])
+        batch_size = options["batch_size"]
+
+        self.stdout.write(
+            f"Processing Stripe events with {options['workers']} workers..."
+        )
+
+        processed = run_worker_pool(
+            lambda: service.process_batch(batch_size),
+            workers=options["workers"],
+            poll_interval=options["poll_interval"],
+            run_once=options["once"],
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} events."))
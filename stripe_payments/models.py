@@ -1 +1,26 @@
-# Create your models here.
+from django.db import models
+
+from common.models import QueuedTaskModel
+
+
+class StripeWebhookEvent(QueuedTaskModel):
+    """
+    Durable inbox for Stripe webhook deliveries.
+
+    Stripe delivers at-least-once, so the event id is unique and a redelivery
+    of an event we already stored is simply ignored.
+    """
+
+    stripe_event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100, db_index=True)
+    payload = models.JSONField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "available_at"], name="stripe_event_queue_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} ({self.stripe_event_id}) - {self.status}"
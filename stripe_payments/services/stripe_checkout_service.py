@@ -5,8 +5,7 @@ from rest_framework.exceptions import APIException
 from carts.constants import CART_SESSION_COOKIE_LABEL
 from common.utils import get_session_key
 from orders.models import Order
-
-stripe.api_key = settings.STRIPE_SECRET_KEY
+from stripe_payments.services.stripe_client import get_stripe_client
 
 
 class StripeCheckoutService:
@@ -20,7 +19,7 @@ class StripeCheckoutService:
         """
         line_items = []
 
-        for item in self.order.items.all():
+        for item in self.order.items.select_related("product_variant"):
             unit_amount = int(item.unit_price * 100)
 
             item_data = {
@@ -46,26 +45,38 @@ class StripeCheckoutService:
 
         return line_items
 
+    def _get_idempotency_key(self):
+        """
+        Derived from the order so that network retries (ours or the SDK's)
+        can never open a second session for the same order.
+        """
+        return f"checkout-session-{self.order.id}"
+
     def create_checkout_session(self):
         """
         Creates a Stripe Checkout Session and returns the URL.
         """
         try:
-            checkout_session = stripe.checkout.Session.create(
-                payment_method_types=["card"],
-                line_items=self._get_line_items(),
-                mode="payment",
-                customer_email=self.order.email,
-                metadata={
-                    "order_number": self.order.order_number,
-                    "order_id": str(self.order.id),
-                    "cart_session_key": str(
-                        get_session_key(self.request, CART_SESSION_COOKIE_LABEL, False)
-                    ),
+            checkout_session = get_stripe_client().v1.checkout.sessions.create(
+                params={
+                    "payment_method_types": ["card"],
+                    "line_items": self._get_line_items(),
+                    "mode": "payment",
+                    "customer_email": self.order.email,
+                    "metadata": {
+                        "order_number": self.order.order_number,
+                        "order_id": str(self.order.id),
+                        "cart_session_key": str(
+                            get_session_key(
+                                self.request, CART_SESSION_COOKIE_LABEL, False
+                            )
+                        ),
+                    },
+                    "success_url": f"{settings.FRONTEND_BASE_URL}/thank-you/{self.order.id}",
+                    "cancel_url": f"{settings.FRONTEND_BASE_URL}/checkout",
+                    "client_reference_id": str(self.order.id),
                 },
-                success_url=f"{settings.FRONTEND_BASE_URL}/thank-you/{self.order.id}",
-                cancel_url=f"{settings.FRONTEND_BASE_URL}/checkout",
-                client_reference_id=str(self.order.id),
+                options={"idempotency_key": self._get_idempotency_key()},
             )
 
             return checkout_session.url
@@ -0,0 +1,53 @@
+import threading
+
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _build_http_session() -> requests.Session:
+    """
+    A single keep-alive session shared by every thread of the worker process,
+    so TLS connections to Stripe are pooled instead of re-established per call.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.STRIPE_HTTP_POOL_SIZE,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_stripe_client() -> stripe.StripeClient:
+    """
+    Returns the process-wide Stripe client, creating it on first use.
+
+    Creation is lazy so that gunicorn workers forked from a preloaded master
+    each open their own connection pool.
+    """
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = stripe.RequestsClient(
+                    timeout=(
+                        settings.STRIPE_CONNECT_TIMEOUT,
+                        settings.STRIPE_READ_TIMEOUT,
+                    ),
+                    session=_build_http_session(),
+                )
+                _client = stripe.StripeClient(
+                    settings.STRIPE_SECRET_KEY,
+                    base_addresses={"api": settings.STRIPE_API_BASE},
+                    max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+                    http_client=http_client,
+                )
+
+    return _client
@@ -0,0 +1,79 @@
+import logging
+from collections import defaultdict
+
+from stripe_payments.models import StripeWebhookEvent
+from stripe_payments.services.stripe_webhook_service import StripeWebhookService
+
+logger = logging.getLogger(__name__)
+
+
+class StripeEventQueueService:
+    """
+    Stores verified webhook events and processes them outside the request.
+    """
+
+    def __init__(self, max_attempts=8, backoff_seconds=30):
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.webhook_service = StripeWebhookService()
+
+    def enqueue(self, event_id, event_type, payload):
+        """
+        Persists the event, ignoring redeliveries of an already stored id.
+        """
+        created = StripeWebhookEvent.objects.bulk_create(
+            [
+                StripeWebhookEvent(
+                    stripe_event_id=event_id,
+                    event_type=event_type,
+                    payload=payload,
+                )
+            ],
+            ignore_conflicts=True,
+        )
+
+        logger.info(f"Stripe event {event_id} ({event_type}) queued.")
+        return created
+
+    def process_batch(self, batch_size=50):
+        """
+        Claims a batch of due events and applies each event type in one go.
+        Returns the number of events handled.
+        """
+        events = StripeWebhookEvent.objects.claim(
+            batch_size, max_attempts=self.max_attempts
+        )
+
+        events_by_type = defaultdict(list)
+        for webhook_event in events:
+            events_by_type[webhook_event.event_type].append(webhook_event)
+
+        for event_type, group in events_by_type.items():
+            try:
+                self.webhook_service.process_events([e.payload for e in group])
+                StripeWebhookEvent.objects.filter(
+                    pk__in=[e.pk for e in group]
+                ).mark_completed()
+            except Exception as e:
+                logger.warning(
+                    f"Batch of {len(group)} {event_type} events failed ({e}), "
+                    f"retrying them one by one."
+                )
+                for webhook_event in group:
+                    self._process_single(webhook_event)
+
+        return len(events)
+
+    def _process_single(self, webhook_event):
+        try:
+            self.webhook_service.process_event(webhook_event.payload)
+            webhook_event.mark_completed()
+        except Exception as e:
+            status = webhook_event.mark_failed(
+                e, self.max_attempts, self.backoff_seconds
+            )
+            logger.error(
+                f"Stripe event {webhook_event.stripe_event_id} failed "
+                f"(attempt {webhook_event.attempts}, now {status}): {e}",
+                exc_info=True,
+            )
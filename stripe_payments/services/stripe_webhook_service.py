@@ -1,89 +1,175 @@
 import logging
+from collections import defaultdict
 
-from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction
+from django.db.models import Case, F, Value, When
 
 from carts.models import Cart
 from orders.models import Order
 
 logger = logging.getLogger(__name__)
 
+EVENT_HANDLERS = {}
+
+
+def register_event_handler(*event_types):
+    """
+    Registers a handler for one or more Stripe event types.
+
+    Handlers receive the list of `data.object` payloads of every event of that
+    type in the current batch, so they can apply them with set-based updates.
+    """
+
+    def decorator(func):
+        for event_type in event_types:
+            EVENT_HANDLERS[event_type] = func
+        return func
+
+    return decorator
+
 
 class StripeWebhookService:
-    def process_event(self, event, request):
+    def process_event(self, event):
         """
-        Dispatcher that routes the Stripe Event to the specific handler.
+        Processes a single Stripe Event.
         """
-        event_type = event["type"]
+        self.process_events([event])
 
-        if event_type == "checkout.session.completed":
-            return self._handle_checkout_session_completed(
-                event["data"]["object"], request
-            )
-
-        logger.info(f"Unhandled Stripe event type: {event_type}")
-        return None
-
-    def _handle_checkout_session_completed(self, session, request):
+    def process_events(self, events):
         """
-        Handles successful payment.
+        Dispatcher that groups Stripe Events by type and routes each group
+        to its registered handler in a single call.
         """
-        metadata = session.get("metadata", {})
+        objects_by_type = defaultdict(list)
+        for event in events:
+            objects_by_type[event["type"]].append(event["data"]["object"])
+
+        for event_type, objects in objects_by_type.items():
+            handler = EVENT_HANDLERS.get(event_type)
+
+            if handler is None:
+                logger.info(f"Unhandled Stripe event type: {event_type}")
+                continue
 
-        order_id = metadata.get("order_id")
-        cart_session_key = metadata.get("cart_session_key")
-        stripe_payment_intent = session.get("payment_intent")
+            with transaction.atomic():
+                handler(objects)
 
+
+def _get_order_ids(sessions):
+    order_ids = []
+    for session in sessions:
+        order_id = session.get("metadata", {}).get("order_id")
+        if not order_id:
+            logger.error(f"Stripe Session {session.get('id')} missing order_id")
+            continue
+        order_ids.append(order_id)
+    return order_ids
+
+
+@register_event_handler(
+    "checkout.session.completed", "checkout.session.async_payment_succeeded"
+)
+def handle_checkout_sessions_paid(sessions):
+    """
+    Marks the orders of paid sessions as PAID and completes their carts.
+    """
+    paid_sessions = [
+        session
+        for session in sessions
+        if session.get("payment_status") in ("paid", "no_payment_required")
+    ]
+
+    payment_intents = {}
+    cart_session_keys = []
+    for session in paid_sessions:
+        metadata = session.get("metadata", {})
+        if not metadata.get("order_id"):
+            logger.error(f"Stripe Session {session.get('id')} missing order_id")
+            continue
+
+        payment_intents[metadata["order_id"]] = session.get("payment_intent") or ""
+        if metadata.get("cart_session_key"):
+            cart_session_keys.append(metadata["cart_session_key"])
+
+    if payment_intents:
+        updated = Order.objects.filter(
+            id__in=payment_intents.keys(), is_paid=False
+        ).update(
+            is_paid=True,
+            status=Order.Status.PAID,
+            stripe_payment_intent_id=Case(
+                *[
+                    When(id=order_id, then=Value(payment_intent))
+                    for order_id, payment_intent in payment_intents.items()
+                ],
+                default=F("stripe_payment_intent_id"),
+            ),
+        )
         logger.info(
-            f"Processing checkout success for Order ID: {order_id} and Cart Session Key: {cart_session_key}"
+            f"{updated}/{len(payment_intents)} orders marked as PAID via Webhook."
         )
 
-        if not order_id:
-            logger.error("Stripe Session missing client_reference_id")
-            return
-
-        with transaction.atomic():
-            self._save_paid_order(order_id, payment_intent_id=stripe_payment_intent)
-
-        self._save_paid_cart(cart_session_key, request)
-
-    def _save_paid_order(self, order_id, payment_intent_id):
-        try:
-            order = Order.objects.select_for_update().get(id=order_id)
-
-            if order.is_paid:
-                logger.info(
-                    f"Order {order.order_number} is already marked as paid. Skipping."
-                )
-                return
-
-            order.is_paid = True
-            order.status = Order.Status.PAID
-            order.stripe_payment_intent_id = payment_intent_id
-            order.save()
-
-            logger.info(f" Order {order.id} marked as PAID via Webhook.")
-
-        except ObjectDoesNotExist:
-            logger.error(f"Order {order_id} not found during webhook processing.")
-        except Exception as e:
-            logger.error(f"Error updating Order {order_id}: {str(e)}", exc_info=True)
-            raise e
-
-    def _save_paid_cart(self, cart_session_key, request):
-        try:
-            cart = Cart.objects.get(session_key=cart_session_key)
-            cart.status = Cart.Status.COMPLETED
-            cart.save()
-
-            logger.info(f"Cart: {cart.id} marked as COMPLETED via Webhook.")
-        except ObjectDoesNotExist:
-            logger.error(
-                f"Cart with session key: {cart_session_key} not found during webhook processing."
-            )
-        except Exception as e:
-            logger.error(
-                f"Error updating Cart with session key: {cart_session_key}: {str(e)}",
-                exc_info=True,
-            )
-            raise e
+    if cart_session_keys:
+        updated = Cart.objects.filter(
+            session_key__in=cart_session_keys, status=Cart.Status.ACTIVE
+        ).update(status=Cart.Status.COMPLETED)
+        logger.info(
+            f"{updated}/{len(cart_session_keys)} carts marked as COMPLETED via Webhook."
+        )
+
+
+@register_event_handler(
+    "checkout.session.expired", "checkout.session.async_payment_failed"
+)
+def handle_checkout_sessions_cancelled(sessions):
+    """
+    Cancels the still-unpaid orders of expired or failed sessions. Their carts
+    stay ACTIVE so the customer can simply check out again.
+    """
+    order_ids = _get_order_ids(sessions)
+    if not order_ids:
+        return
+
+    updated = Order.objects.filter(
+        id__in=order_ids, status=Order.Status.PENDING, is_paid=False
+    ).update(status=Order.Status.CANCELLED)
+
+    logger.info(f"{updated}/{len(order_ids)} orders marked as CANCELLED via Webhook.")
+
+
+@register_event_handler("charge.refunded")
+def handle_charges_refunded(charges):
+    """
+    Marks orders as REFUNDED once their charge has been refunded in full.
+    """
+    payment_intent_ids = [
+        charge["payment_intent"]
+        for charge in charges
+        if charge.get("refunded") and charge.get("payment_intent")
+    ]
+    if not payment_intent_ids:
+        return
+
+    updated = (
+        Order.objects.filter(stripe_payment_intent_id__in=payment_intent_ids)
+        .exclude(status=Order.Status.REFUNDED)
+        .update(status=Order.Status.REFUNDED)
+    )
+
+    logger.info(
+        f"{updated}/{len(payment_intent_ids)} orders marked as REFUNDED via Webhook."
+    )
+
+
+@register_event_handler("payment_intent.payment_failed")
+def handle_payment_intents_failed(payment_intents):
+    """
+    A declined attempt leaves the Checkout Session open for another try, so
+    the order is left PENDING and the failure is only recorded.
+    """
+    for payment_intent in payment_intents:
+        error = payment_intent.get("last_payment_error") or {}
+        logger.warning(
+            f"Payment failed for PaymentIntent {payment_intent.get('id')}: "
+            f"{error.get('code')} {error.get('message')}"
+        )
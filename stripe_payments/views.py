@@ -1,5 +1,6 @@
 # stripe_payments/views.py
 
+import json
 import logging
 
 import stripe
@@ -8,7 +9,9 @@ from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
-from stripe_payments.services.stripe_webhook_service import StripeWebhookService
+from stripe_payments.services.stripe_event_queue_service import (
+    StripeEventQueueService,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +21,9 @@ logger = logging.getLogger(__name__)
 def stripe_webhook(request):
     """
     Endpoint to receive updates from Stripe.
+
+    Events are only verified and stored here; `process_stripe_events` does the
+    actual work so Stripe gets its acknowledgement immediately.
     """
     payload = request.body
     sig_header = request.META.get("HTTP_STRIPE_SIGNATURE")
@@ -35,11 +41,10 @@ def stripe_webhook(request):
         return HttpResponse(status=400)
 
     try:
-        service = StripeWebhookService()
-        service.process_event(event, request)
+        StripeEventQueueService().enqueue(event.id, event.type, json.loads(payload))
 
         return HttpResponse(status=200)
 
     except Exception as e:
-        logger.error(f"Webhook Processing Error: {str(e)}", exc_info=True)
+        logger.error(f"Webhook Enqueue Error: {str(e)}", exc_info=True)
         return HttpResponse(status=500)